@@ -0,0 +1,242 @@
+"""
+Cache interface used by the models and the indexing layer.
+
+Backends, selected with CACHE_BACKEND (see get_cache):
+
+    memory  LRU in this process (default); every worker has its own copy
+    redis   any Redis-compatible server, shared by all workers and nodes
+
+Values are encoded as BSON on both backends, so a cached document comes
+back as a fresh copy with the same types MongoDB returns (ObjectId,
+datetime; tuples become lists).
+
+Code uses a Namespace rather than the backend: keys are prefixed with the
+namespace name and its version, and bump() invalidates every key of the
+namespace at once by moving to a new version. Versions are timestamps
+written only if absent, so an evicted version key can never bring old
+entries back. Workers re-read the version at most every CACHE_VERSION_TTL
+seconds, which bounds how long another worker's bump goes unnoticed.
+
+Writers call Namespace.invalidate() rather than delete() or bump(), so the
+change also reaches other workers' copies (see app.cache.bus).
+"""
+import logging
+import time
+
+import bson
+
+from app import config
+from app.metrics import registry
+from app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+
+def encode(value) -> bytes:
+    return bson.encode({"v": value})
+
+
+def decode(data: bytes):
+    return bson.decode(data)["v"]
+
+
+class Cache:
+    # Whether every worker sees the same entries
+    shared = False
+
+    async def get(self, key: str):
+        """Value for key, or None when missing or expired"""
+        raise NotImplementedError
+
+    async def get_many(self, keys) -> dict:
+        """{key: value} for the keys that are cached"""
+        raise NotImplementedError
+
+    async def set(self, key: str, value, ttl: float = None):
+        """Store value; ttl in seconds, None keeps it until evicted"""
+        raise NotImplementedError
+
+    async def set_many(self, values: dict, ttl: float = None):
+        raise NotImplementedError
+
+    async def add(self, key: str, value, ttl: float = None) -> bool:
+        """Store value only if key is absent; returns whether it was stored"""
+        raise NotImplementedError
+
+    async def delete(self, *keys) -> int:
+        raise NotImplementedError
+
+    async def clear(self):
+        """Drop every key of this application"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class Namespace:
+    """Versioned key space on the configured cache; failures count as misses"""
+
+    def __init__(self, name: str, ttl: float = None):
+        self.name = name
+        self.ttl = ttl if ttl is not None else settings.cache_default_ttl
+        self._version = None
+        self._version_read_at = 0.0
+        self._flights = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.name}:version"
+
+    async def version(self) -> str:
+        now = time.monotonic()
+        if self._version is not None and now - self._version_read_at < settings.cache_version_ttl:
+            return self._version
+        cache = get_cache()
+        version = await cache.get(self.version_key)
+        if version is None:
+            version = str(time.time_ns())
+            if not await cache.add(self.version_key, version):
+                version = await cache.get(self.version_key) or version
+        self._version, self._version_read_at = version, now
+        return version
+
+    async def bump(self):
+        """Invalidate every key of the namespace, in all workers sharing the cache"""
+        version = str(time.time_ns())
+        try:
+            await get_cache().set(self.version_key, version)
+        except Exception as e:
+            self._failed("bump", e)
+        self._version, self._version_read_at = version, time.monotonic()
+
+    def forget_version(self):
+        """Re-read the version on next use (another worker may have bumped it)"""
+        self._version = None
+
+    async def invalidate(self, *keys):
+        """Drop keys (every key when none are given) here and, through the
+        invalidation bus, in every other worker"""
+        from .bus import invalidation_bus
+        await invalidation_bus.publish(self.name, keys or None)
+
+    def key(self, version: str, key: str) -> str:
+        return f"{self.name}:{version}:{key}"
+
+    async def get(self, key: str):
+        try:
+            value = await get_cache().get(self.key(await self.version(), key))
+        except Exception as e:
+            self._failed("get", e)
+            return None
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def get_many(self, keys) -> dict:
+        keys = list(dict.fromkeys(keys))
+        try:
+            version = await self.version()
+            found = await get_cache().get_many([self.key(version, key) for key in keys])
+        except Exception as e:
+            self._failed("get_many", e)
+            return {}
+        prefix = len(self.key(version, ""))
+        values = {full_key[prefix:]: value for full_key, value in found.items()}
+        self.stats["hits"] += len(values)
+        self.stats["misses"] += len(keys) - len(values)
+        return values
+
+    async def set(self, key: str, value, ttl: float = None):
+        try:
+            await get_cache().set(self.key(await self.version(), key), value, ttl or self.ttl)
+        except Exception as e:
+            self._failed("set", e)
+
+    async def set_many(self, values: dict, ttl: float = None):
+        if not values:
+            return
+        try:
+            version = await self.version()
+            await get_cache().set_many({self.key(version, key): value for key, value in values.items()}, ttl or self.ttl)
+        except Exception as e:
+            self._failed("set_many", e)
+
+    async def delete(self, *keys):
+        try:
+            version = await self.version()
+            await get_cache().delete(*(self.key(version, key) for key in keys))
+        except Exception as e:
+            self._failed("delete", e)
+
+    async def get_or_load(self, key: str, loader, ttl: float = None):
+        """Cached value, or `await loader()` stored unless it returns None
+
+        Concurrent misses for the same key in this process share one load.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        async def load():
+            value = await loader()
+            if value is None:
+                return None
+            await self.set(key, value, ttl)
+            # Every caller decodes its own copy, as from the cache
+            return encode(value)
+
+        data, _ = await self._flights.do(key, load)
+        return decode(data) if data is not None else None
+
+    def _failed(self, operation: str, error: Exception):
+        self.stats["errors"] += 1
+        logger.warning("Cache %s in namespace %s failed: %r", operation, self.name, error)
+
+
+_cache = None
+_namespaces = {}
+
+
+def get_cache() -> Cache:
+    """Cache selected by CACHE_BACKEND: "memory" (default) or "redis" """
+    global _cache
+    if _cache is None:
+        if settings.cache_backend == "memory":
+            from .memory import MemoryCache
+            _cache = MemoryCache(max_entries=settings.cache_max_entries)
+        elif settings.cache_backend == "redis":
+            from .redis import RedisCache
+            _cache = RedisCache(settings.cache_url, prefix=settings.cache_key_prefix, timeout=settings.cache_timeout)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {settings.cache_backend!r}, use 'memory' or 'redis'")
+    return _cache
+
+
+async def close_cache():
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
+
+
+def namespace(name: str, ttl: float = None) -> Namespace:
+    """The namespace called name, created on first use"""
+    if name not in _namespaces:
+        _namespaces[name] = Namespace(name, ttl)
+    return _namespaces[name]
+
+
+def namespaces() -> dict:
+    return _namespaces
+
+
+registry.counter(
+    "cache_lookups_total", "Cache lookups per namespace", ("namespace", "result")
+).set_function(lambda: {
+    (name, result): count
+    for name, space in _namespaces.items()
+    for result, count in space.stats.items()
+})
@@ -0,0 +1,225 @@
+"""
+Invalidation bus: tells every worker, on every node, to drop cached copies
+after a write.
+
+A message names a topic and the keys that changed (no keys: everything in
+the topic). Topics named after a cache Namespace evict its keys; other
+code can subscribe() handlers, e.g. to refresh in-process search indexes.
+
+publish() applies the message in this worker right away, so the writer
+reads its own write, then queues it for a background task that hands it
+to the transport for the others (selected with INVALIDATION_TRANSPORT, see
+get_transport); writes never wait on the transport:
+
+    local   in-process only (default); enough for a single worker
+    redis   a Redis stream every worker reads from
+
+Delivery is at least once: messages that fail to publish stay in an outbox
+and are retried, and handlers must be idempotent. When messages may have
+been lost (outbox overflow, or a stream trimmed past what a worker has
+read) the bus falls back to the namespace versions: every namespace moves
+to a new version in this worker and handlers get keys=None. Entry TTLs
+bound staleness if everything else fails.
+"""
+import asyncio
+import logging
+import uuid
+
+from app import config
+from app.metrics import registry
+
+from .base import get_cache, namespaces
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+# Topic of the message a transport yields when messages may have been lost
+EVERYTHING = "*"
+
+
+class Transport:
+    async def start(self):
+        """Start receiving; messages published before this may be skipped"""
+
+    async def publish(self, messages: list):
+        """Send messages to every worker; raises when they were not sent"""
+        raise NotImplementedError
+
+    async def receive(self) -> list:
+        """Next messages from any worker, waiting until there are some"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InvalidationBus:
+    def __init__(self, outbox_size: int = 1000, retry_interval: float = 1.0):
+        self.outbox_size = outbox_size
+        self.retry_interval = retry_interval
+        self.origin = uuid.uuid4().hex
+        self.transport = None
+        self._handlers = {}
+        self._outbox = []
+        self._flush_lock = asyncio.Lock()
+        self._receiver = None
+        self._flusher = None
+        self._closing = False
+        self.stats = {"published": 0, "received": 0, "publish_failed": 0, "receive_failed": 0, "lost": 0}
+
+    def subscribe(self, topic: str, handler):
+        """Call `await handler(keys, remote)` for every message on topic
+
+        keys is None when the whole topic is invalidated; remote is False for
+        this worker's own writes, which the handler may already have applied.
+        """
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def start(self, transport: Transport = None):
+        """Start receiving other workers' messages; called once per worker"""
+        # A fresh origin per worker: with preload the module is imported before fork
+        self.origin = uuid.uuid4().hex
+        self.transport = transport or get_transport()
+        self._closing = False
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def close(self):
+        # Client libraries may turn a cancelled read into their own error
+        self._closing = True
+        for task in (self._receiver, self._flusher):
+            if task is not None:
+                task.cancel()
+        self._receiver = self._flusher = None
+        if self.transport is not None:
+            await self._flush()
+            if self._outbox:
+                logger.warning("Dropping %s unpublished invalidations", len(self._outbox))
+                self._outbox = []
+            await self.transport.close()
+            self.transport = None
+
+    async def publish(self, topic: str, keys=None):
+        """Invalidate keys of topic (all of them when keys is None) in every worker"""
+        message = {"topic": topic, "keys": list(keys) if keys is not None else None, "origin": self.origin}
+        await self._dispatch(message, remote=False)
+        if self.transport is None:
+            return
+        if len(self._outbox) >= self.outbox_size:
+            self._collapse_outbox()
+        self._outbox.append(message)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_pending())
+
+    async def _flush_pending(self):
+        """Publish the outbox until it is empty, retrying after failures"""
+        while self._outbox:
+            if not await self._flush():
+                await asyncio.sleep(self.retry_interval)
+
+    async def _flush(self) -> bool:
+        """Publish what is in the outbox; False if that failed"""
+        async with self._flush_lock:
+            if not self._outbox:
+                return True
+            batch = list(self._outbox)
+            try:
+                await self.transport.publish(batch)
+            except Exception as e:
+                self.stats["publish_failed"] += 1
+                logger.warning("Publishing %s invalidations failed, will retry: %r", len(batch), e)
+                return False
+            # The outbox may have grown or been collapsed meanwhile
+            sent = {id(message) for message in batch}
+            self._outbox = [message for message in self._outbox if id(message) not in sent]
+            self.stats["published"] += len(batch)
+            return True
+
+    def _collapse_outbox(self):
+        """Replace the queued messages by one whole-topic message per topic"""
+        self.stats["lost"] += 1
+        topics = dict.fromkeys(message["topic"] for message in self._outbox)
+        logger.warning("Invalidation outbox full, invalidating whole topics: %s", ", ".join(topics))
+        self._outbox = [{"topic": topic, "keys": None, "origin": self.origin} for topic in topics]
+
+    async def _receive(self):
+        started = False
+        while not self._closing:
+            try:
+                if not started:
+                    await self.transport.start()
+                    started = True
+                messages = await self.transport.receive()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._closing:
+                    return
+                self.stats["receive_failed"] += 1
+                logger.warning("Receiving invalidations failed: %r", e)
+                await asyncio.sleep(self.retry_interval)
+                continue
+            for message in messages:
+                if message.get("origin") == self.origin:
+                    continue
+                self.stats["received"] += 1
+                await self._dispatch(message, remote=True)
+
+    async def _dispatch(self, message: dict, remote: bool):
+        topic, keys = message["topic"], message["keys"]
+        if topic == EVERYTHING:
+            self.stats["lost"] += 1
+            logger.warning("Invalidations may have been lost, invalidating every namespace")
+            topics = set(namespaces()) | set(self._handlers)
+        else:
+            topics = [topic]
+        for topic in topics:
+            space = namespaces().get(topic)
+            if space is not None:
+                await self._evict(space, keys, remote)
+            for handler in self._handlers.get(topic, ()):
+                try:
+                    await handler(keys, remote)
+                except Exception:
+                    logger.exception("Invalidation handler for %s failed", topic)
+
+    async def _evict(self, space, keys, remote: bool):
+        if remote and get_cache().shared:
+            # The writer already changed the shared cache; only drop the
+            # version this worker remembers so it sees a bump at once
+            if keys is None:
+                space.forget_version()
+        elif keys is None:
+            await space.bump()
+        else:
+            await space.delete(*keys)
+
+
+def get_transport() -> Transport:
+    """Transport selected by INVALIDATION_TRANSPORT: "local" (default) or "redis" """
+    if settings.invalidation_transport == "local":
+        from .memory import LocalTransport
+        return LocalTransport()
+    if settings.invalidation_transport == "redis":
+        from .redis import RedisStreamTransport
+        return RedisStreamTransport(
+            settings.invalidation_url or settings.cache_url,
+            stream=settings.cache_key_prefix + "invalidations",
+            max_length=settings.invalidation_stream_length,
+            block=settings.invalidation_poll_timeout,
+            timeout=settings.cache_timeout,
+        )
+    raise ValueError(f"Unknown INVALIDATION_TRANSPORT {settings.invalidation_transport!r}, use 'local' or 'redis'")
+
+
+invalidation_bus = InvalidationBus(
+    outbox_size=settings.invalidation_outbox_size,
+    retry_interval=settings.invalidation_retry_interval
+)
+
+registry.counter(
+    "cache_invalidations_total", "Invalidation bus messages by outcome", ("event",)
+).set_function(lambda: {(event,): count for event, count in invalidation_bus.stats.items()})
+registry.gauge(
+    "cache_invalidations_pending", "Invalidations waiting to be published"
+).set_function(lambda: len(invalidation_bus._outbox))
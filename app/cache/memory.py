@@ -0,0 +1,103 @@
+"""
+In-process cache backend: a bounded LRU of encoded values with per-key expiry,
+and the in-process invalidation transport.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+from .base import Cache, decode, encode
+from .bus import EVERYTHING, Transport
+
+
+class MemoryCache(Cache):
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at or None, encoded value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _store(self, key: str, value, ttl: float = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, encode(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        data = self._lookup(key)
+        return decode(data) if data is not None else None
+
+    async def get_many(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            data = self._lookup(key)
+            if data is not None:
+                found[key] = decode(data)
+        return found
+
+    async def set(self, key: str, value, ttl: float = None):
+        self._store(key, value, ttl)
+
+    async def set_many(self, values: dict, ttl: float = None):
+        for key, value in values.items():
+            self._store(key, value, ttl)
+
+    async def add(self, key: str, value, ttl: float = None) -> bool:
+        if self._lookup(key) is not None:
+            return False
+        self._store(key, value, ttl)
+        return True
+
+    async def delete(self, *keys) -> int:
+        return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class LocalTransport(Transport):
+    """Delivers to every bus started in this process; other workers see nothing"""
+
+    # Queues of the started transports, shared by all instances
+    _queues = set()
+
+    def __init__(self, max_pending: int = 10000):
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._overflowed = False
+
+    async def start(self):
+        self._queues.add(self)
+
+    async def publish(self, messages: list):
+        for transport in list(self._queues):
+            for message in messages:
+                try:
+                    transport._queue.put_nowait(encode(message))
+                except asyncio.QueueFull:
+                    transport._overflowed = True
+                    break
+
+    async def receive(self) -> list:
+        messages = [decode(await self._queue.get())]
+        while not self._queue.empty():
+            messages.append(decode(self._queue.get_nowait()))
+        if self._overflowed:
+            self._overflowed = False
+            messages.append({"topic": EVERYTHING, "keys": None, "origin": None})
+        return messages
+
+    async def close(self):
+        self._queues.discard(self)
@@ -0,0 +1,147 @@
+"""
+Shared cache backend on any Redis-compatible server (Redis, Valkey, KeyDB,
+Dragonfly), through redis-py's asyncio client.
+
+All keys carry CACHE_KEY_PREFIX so clear() only drops this application's
+keys. Entries always get a TTL and version keys none, so on a server with
+maxmemory set use `maxmemory-policy volatile-lru`.
+
+RedisStreamTransport carries the invalidation bus over a stream, which
+unlike pub/sub keeps messages for workers that briefly lose the connection.
+"""
+from .base import Cache, decode, encode
+from .bus import EVERYTHING, Transport
+
+
+class RedisCache(Cache):
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "", timeout: float = 0.25):
+        # Optional dependency, only needed with CACHE_BACKEND=redis
+        import redis.asyncio
+
+        self.prefix = prefix
+        self._client = redis.asyncio.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get(self, key: str):
+        data = await self._client.get(self.prefix + key)
+        return decode(data) if data is not None else None
+
+    async def get_many(self, keys) -> dict:
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = await self._client.mget([self.prefix + key for key in keys])
+        return {key: decode(data) for key, data in zip(keys, found) if data is not None}
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self._client.set(self.prefix + key, encode(value), px=int(ttl * 1000) if ttl else None)
+
+    async def set_many(self, values: dict, ttl: float = None):
+        async with self._client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(self.prefix + key, encode(value), px=int(ttl * 1000) if ttl else None)
+            await pipe.execute()
+
+    async def add(self, key: str, value, ttl: float = None) -> bool:
+        stored = await self._client.set(self.prefix + key, encode(value), px=int(ttl * 1000) if ttl else None, nx=True)
+        return bool(stored)
+
+    async def delete(self, *keys) -> int:
+        if not keys:
+            return 0
+        return await self._client.delete(*(self.prefix + key for key in keys))
+
+    async def clear(self):
+        batch = []
+        async for key in self._client.scan_iter(match=self.prefix + "*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                await self._client.delete(*batch)
+                batch = []
+        if batch:
+            await self._client.delete(*batch)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def _stream_id(value) -> tuple:
+    if isinstance(value, bytes):
+        value = value.decode()
+    milliseconds, _, sequence = value.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class RedisStreamTransport(Transport):
+    """Invalidations as entries of one capped stream, read by every worker
+
+    Each worker remembers the last entry it read and resumes after it, so a
+    dropped connection loses nothing unless the stream was trimmed past that
+    entry meanwhile; that is detected and reported as possible loss.
+    Reads block for up to `block` seconds, so publishing uses a client of its
+    own that gives up after `timeout`.
+    """
+
+    def __init__(self, url: str, stream: str, max_length: int = 10000, block: float = 5.0, timeout: float = 0.25):
+        # Optional dependency, only needed with INVALIDATION_TRANSPORT=redis
+        import redis.asyncio
+
+        self.stream = stream
+        self.max_length = max_length
+        self.block = block
+        self._client = redis.asyncio.from_url(url, socket_timeout=block + timeout, socket_connect_timeout=timeout)
+        self._publisher = redis.asyncio.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._last_id = None
+        self._check_gap = False
+
+    async def start(self):
+        if self._last_id is not None:
+            return
+        latest = await self._client.xrevrange(self.stream, count=1)
+        self._last_id = latest[0][0] if latest else b"0-0"
+
+    async def publish(self, messages: list):
+        async with self._publisher.pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.xadd(self.stream, {"m": encode(message)}, maxlen=self.max_length, approximate=True)
+            await pipe.execute()
+
+    async def receive(self) -> list:
+        try:
+            lost = self._check_gap and await self._trimmed_unread()
+            self._check_gap = False
+            found = await self._client.xread(
+                {self.stream: self._last_id}, count=1000, block=int(self.block * 1000)
+            )
+        except Exception:
+            # Whatever was trimmed while disconnected is unknown
+            self._check_gap = True
+            raise
+        messages = [{"topic": EVERYTHING, "keys": None, "origin": None}] if lost else []
+        for _, entries in found:
+            for entry_id, fields in entries:
+                self._last_id = entry_id
+                messages.append(decode(fields[b"m"]))
+        # A full batch means this worker is behind and may be overtaken by trimming
+        self._check_gap = sum(len(entries) for _, entries in found) >= 1000
+        return messages
+
+    async def _trimmed_unread(self) -> bool:
+        """Whether entries after the last one read were trimmed"""
+        try:
+            info = await self._client.xinfo_stream(self.stream)
+        except Exception as e:
+            if "no such key" in str(e).lower():
+                return _stream_id(self._last_id) > (0, 0)
+            raise
+        info = {key.decode() if isinstance(key, bytes) else key: value for key, value in info.items()}
+        if info.get("max-deleted-entry-id") is not None:
+            return _stream_id(info["max-deleted-entry-id"]) > _stream_id(self._last_id)
+        # Before Redis 7 only the oldest entry is known; assume the worst
+        first = info.get("first-entry")
+        return first is not None and _stream_id(first[0]) > _stream_id(self._last_id)
+
+    async def close(self):
+        await self._publisher.aclose()
+        await self._client.aclose()
@@ -11,6 +11,7 @@ class Settings(BaseSettings):
     # MongoDB Atlas configuration
     mongodb_uri: str = Field(default="mongodb://localhost:27017", env='MONGODB_URI')
     mongodb_database: str = Field(default="video_membership", env='MONGODB_DATABASE')
+    storage_backend: str = Field(default="mongo")  # "mongo" or "memory"
 
     
     secret_key: str = Field(...)
@@ -19,6 +20,103 @@ class Settings(BaseSettings):
     algolia_app_id: str
     algolia_api_key: str
     algolia_index_name: str
+    # "auto" uses Algolia when configured and the in-process index otherwise
+    search_backend: str = Field(default="auto")  # auto, algolia, local
+    search_cache_size: int = Field(default=1024)
+    search_cache_ttl: float = Field(default=30.0)  # seconds
+    search_timeout: float = Field(default=2.0)  # seconds, per query
+    search_breaker_failures: int = Field(default=5)
+    search_breaker_reset_timeout: float = Field(default=30.0)  # seconds
+    # Keep an in-process index next to Algolia to answer while it is down
+    search_local_fallback: bool = Field(default=True)
+    suggest_enabled: bool = Field(default=True)
+    suggest_top_k: int = Field(default=10)
+    suggest_refresh_interval: float = Field(default=600.0)  # seconds, 0 disables
+    index_upload_timeout: float = Field(default=30.0)  # seconds, per batch
+    index_batch_size: int = Field(default=1000)
+    index_upload_concurrency: int = Field(default=4)
+    index_related_limit: int = Field(default=20)  # related titles per index record, 0 disables
+
+    # Cache for models and search results: "memory" (per worker) or "redis" (shared)
+    cache_backend: str = Field(default="memory")
+    cache_url: str = Field(default="redis://localhost:6379/0")
+    cache_key_prefix: str = Field(default="video_membership:")
+    cache_max_entries: int = Field(default=10000)  # memory backend
+    cache_default_ttl: float = Field(default=300.0)  # seconds
+    cache_version_ttl: float = Field(default=1.0)  # seconds a namespace version is trusted before re-reading
+    cache_timeout: float = Field(default=0.25)  # seconds, per redis call
+    # Invalidation bus between workers: "local" (this process only) or "redis" (a stream)
+    invalidation_transport: str = Field(default="local")
+    invalidation_url: str = Field(default="")  # defaults to CACHE_URL
+    invalidation_stream_length: int = Field(default=10000)  # entries kept for reconnecting workers
+    invalidation_outbox_size: int = Field(default=1000)  # unpublished messages before whole topics are invalidated
+    invalidation_retry_interval: float = Field(default=1.0)  # seconds
+    invalidation_poll_timeout: float = Field(default=5.0)  # seconds a stream read blocks
+
+    # Logging: level and "json" or "text" lines
+    log_level: str = Field(default="INFO")
+    log_format: str = Field(default="json")
+
+    # In-process metrics served at /metrics
+    metrics_enabled: bool = Field(default=True)
+    metrics_window: float = Field(default=60.0)  # seconds covered by latency percentiles
+
+    # Datadog exporter: aggregated DogStatsD over UDP
+    statsd_enabled: bool = Field(default=False)
+    statsd_host: str = Field(default="localhost")
+    statsd_port: int = Field(default=8125)
+    statsd_flush_interval: float = Field(default=10.0)  # seconds
+    statsd_max_tag_sets: int = Field(default=100)  # per metric, then the overflow tag set
+    statsd_timing_samples: int = Field(default=32)  # timing values kept per metric, tags and interval
+
+    # Operational endpoints (profiler, memory); disabled while unset
+    admin_token: str = Field(default="")
+    profiler_interval: float = Field(default=0.01)  # seconds between samples of the whole process
+    profiler_request_interval: float = Field(default=0.001)  # seconds between samples of one request
+    profiler_max_seconds: float = Field(default=60.0)
+
+    # tracemalloc instrumentation mode; slows allocations, keep off by default
+    memory_tracking_enabled: bool = Field(default=False)
+    memory_trace_frames: int = Field(default=1)  # frames per trace; raise for traceback diffs
+
+    # Production launcher (python -m app.serve)
+    web_bind: str = Field(default="0.0.0.0:8000")
+    web_concurrency: int = Field(default=0)  # worker processes, 0 sizes to the CPUs available
+    web_keepalive: int = Field(default=5)  # seconds; keep above the load balancer's idle timeout
+    web_backlog: int = Field(default=2048)  # pending connections queued by the kernel
+    web_graceful_timeout: int = Field(default=30)  # seconds to drain on SIGTERM before workers are killed
+    web_max_requests: int = Field(default=0)  # recycle a worker after this many requests, 0 never
+
+    # Startup warm-up
+    startup_warm_connections: int = Field(default=4)  # pooled connections opened before serving
+    startup_warm_timeout: float = Field(default=10.0)  # seconds
+
+    # Health checks
+    health_cache_ttl: float = Field(default=2.0)  # seconds a readiness probe result is reused
+    health_ping_timeout: float = Field(default=1.0)  # seconds
+
+    # Event-loop lag monitor
+    loop_monitor_enabled: bool = Field(default=True)
+    loop_monitor_interval: float = Field(default=0.1)  # seconds between lag samples
+    loop_block_threshold: float = Field(default=0.25)  # seconds blocked before capturing a stack
+
+    # MongoDB command monitoring
+    mongo_monitoring_enabled: bool = Field(default=True)
+    mongo_slow_query_ms: float = Field(default=100.0)
+    mongo_explain_sample_rate: float = Field(default=0.1)  # share of slow reads explained
+    mongo_explain_interval: float = Field(default=300.0)  # seconds between explains of one shape
+
+    # Watch-event admission control
+    watch_event_max_concurrency: int = Field(default=32)
+    watch_event_max_queue: int = Field(default=64)
+    watch_event_queue_timeout: float = Field(default=0.25)  # seconds
+    watch_event_retry_after: int = Field(default=2)  # seconds
+    watch_event_buffer_size: int = Field(default=10000)
+    watch_event_flush_interval: float = Field(default=1.0)  # seconds
+
+    # Watch-event storage layout: "flat" (one collection) or "monthly" buckets
+    watch_event_layout: str = Field(default="flat")
+    watch_event_bucket_lookback: int = Field(default=24)  # months searched for resume
 
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,284 @@
+"""
+MongoDB command monitoring.
+
+A pymongo CommandListener registered on the client in `app.db` records the
+latency, outcome and number of returned documents of every command, per
+command and collection. Commands slower than MONGO_SLOW_QUERY_MS are logged
+with the shape of their filter (field names and operators, never values).
+A sample of slow reads is explained in a background thread to flag
+probable collection scans. A ConnectionPoolListener keeps connection
+pool usage for readiness checks and /metrics.
+
+Listener callbacks run on pymongo's I/O path, so they only record and hand
+off; they never block or issue commands themselves.
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient, monitoring as pymongo_monitoring
+
+from . import config
+from .metrics import registry
+from .monitoring import track_database_operation
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+# Handshake, auth and session housekeeping, not application traffic
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue",
+    "authenticate", "getnonce", "endSessions", "buildInfo", "killCursors",
+}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+# Command fields that describe what a command matches or does
+SHAPE_FIELDS = ("filter", "query", "sort", "pipeline", "updates", "deletes", "key")
+# Fields explain rejects, or which belong to the original session
+SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+MAX_PENDING = 10000
+MAX_EXPLAINED_SHAPES = 1000  # shapes whose last explain time is remembered
+
+documents_returned = registry.counter(
+    "mongo_documents_returned_total", "Documents returned by MongoDB commands", ("command", "collection")
+)
+slow_commands = registry.counter(
+    "mongo_slow_commands_total", "MongoDB commands over the slow query threshold", ("command", "collection")
+)
+collection_scans = registry.counter(
+    "mongo_collection_scans_total", "Sampled slow commands whose plan is a collection scan", ("collection",)
+)
+
+
+def redact(value):
+    """Shape of a filter or pipeline: keys and operators kept, values replaced by "?" """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    target = command.get(command_name)
+    if command_name == "getMore":
+        target = command.get("collection")
+    return target if isinstance(target, str) else "-"
+
+
+def command_shape(command: dict) -> dict:
+    return {field: redact(command[field]) for field in SHAPE_FIELDS if field in command}
+
+
+def count_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if "values" in reply:  # distinct
+        return len(reply["values"])
+    return 0
+
+
+def find_stages(plan, stage: str) -> bool:
+    """Whether an explain plan tree contains `stage`"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stages(item, stage) for item in plan)
+    return False
+
+
+class CommandMonitor(pymongo_monitoring.CommandListener):
+    def __init__(self, slow_ms: float, explain_sample_rate: float, explain_interval: float):
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self._pending = {}  # (connection_id, request_id) -> (command name, collection, command)
+        self._explained = OrderedDict()  # (collection, shape) -> last explain time, least recent first
+        self._lock = threading.Lock()
+        self._explainer = None
+        self._explain_client = None
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = command_collection(event.command_name, event.command)
+        with self._lock:
+            if len(self._pending) < MAX_PENDING:
+                self._pending[(event.connection_id, event.request_id)] = (
+                    event.command_name, collection, event.command
+                )
+
+    def succeeded(self, event):
+        self._finished(event, reply=event.reply)
+
+    def failed(self, event):
+        self._finished(event, reply=None)
+
+    def _finished(self, event, reply):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        command_name, collection, command = pending
+        duration_ms = event.duration_micros / 1000
+        track_database_operation(command_name, collection, duration_ms, reply is not None)
+        if reply is not None:
+            returned = count_returned(reply)
+            if returned:
+                documents_returned.inc(returned, command=command_name, collection=collection)
+        else:
+            logger.warning(
+                "MongoDB command failed: %s on %s after %.1f ms: %s",
+                command_name, collection, duration_ms, event.failure.get("errmsg", event.failure)
+            )
+        if duration_ms >= self.slow_ms:
+            self._slow(event, command_name, collection, command, duration_ms)
+
+    def _slow(self, event, command_name, collection, command, duration_ms):
+        slow_commands.inc(command=command_name, collection=collection)
+        shape = command_shape(command)
+        logger.warning(
+            "Slow MongoDB command: %s on %s took %.1f ms, shape %s",
+            command_name, collection, duration_ms, shape
+        )
+        if command_name not in EXPLAINABLE_COMMANDS or random.random() >= self.explain_sample_rate:
+            return
+        key = (collection, repr(shape))
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(key, -self.explain_interval) < self.explain_interval:
+                return
+            self._explained[key] = now
+            self._explained.move_to_end(key)
+            if len(self._explained) > MAX_EXPLAINED_SHAPES:
+                self._explained.popitem(last=False)
+        if self._explainer is None:
+            self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+        spec = {field: value for field, value in command.items()
+                if not field.startswith("$") and field not in SESSION_FIELDS}
+        self._explainer.submit(self._explain, event.database_name, collection, spec, shape)
+
+    def _explain(self, database_name: str, collection: str, spec: dict, shape: dict):
+        try:
+            if self._explain_client is None:
+                # A separate client without this listener, so explains are not monitored
+                self._explain_client = MongoClient(settings.mongodb_uri)
+            result = self._explain_client[database_name].command(
+                "explain", spec, verbosity="queryPlanner"
+            )
+        except Exception as e:
+            logger.info("Explain failed for %s on %s: %s", shape, collection, e)
+            return
+        if find_stages(result.get("queryPlanner") or result.get("stages") or result, "COLLSCAN"):
+            collection_scans.inc(collection=collection)
+            logger.warning("Probable collection scan on %s, shape %s", collection, shape)
+
+    def close(self):
+        if self._explainer is not None:
+            self._explainer.shutdown(wait=False)
+            self._explainer = None
+        if self._explain_client is not None:
+            self._explain_client.close()
+            self._explain_client = None
+
+
+class PoolMonitor(pymongo_monitoring.ConnectionPoolListener):
+    """Connections open, checked out and waited for, summed over all servers
+
+    maxPoolSize applies to each server's pool, so saturation is that of the
+    busiest server.
+    """
+
+    def __init__(self):
+        self.max_pool_size = 100  # pymongo's default
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self._in_use_by_server = {}  # address -> connections checked out
+        self._lock = threading.Lock()
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, max(getattr(self, name) + delta, 0))
+
+    def pool_created(self, event):
+        self.max_pool_size = event.options.get("maxPoolSize", self.max_pool_size)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._in_use_by_server.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, in_use=1)
+        self._add_server(event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+        self._add_server(event.address, -1)
+
+    def _add_server(self, address, delta: int):
+        with self._lock:
+            self._in_use_by_server[address] = max(self._in_use_by_server.get(address, 0) + delta, 0)
+
+    @property
+    def saturation(self) -> float:
+        """Share of the busiest server's pool checked out"""
+        if not self.max_pool_size:
+            return 0.0
+        return max(self._in_use_by_server.values(), default=0) / self.max_pool_size
+
+    def get_stats(self) -> dict:
+        return {
+            "max_pool_size": self.max_pool_size,
+            "open": self.open,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkout_failures": self.checkout_failures,
+            "saturation": round(self.saturation, 3),
+        }
+
+
+command_monitor = CommandMonitor(
+    slow_ms=settings.mongo_slow_query_ms,
+    explain_sample_rate=settings.mongo_explain_sample_rate,
+    explain_interval=settings.mongo_explain_interval,
+)
+pool_monitor = PoolMonitor()
+
+registry.gauge("mongo_pool_connections", "MongoDB connection pool usage", ("state",)).set_function(
+    lambda: {("open",): pool_monitor.open, ("in_use",): pool_monitor.in_use, ("waiting",): pool_monitor.waiting}
+)
@@ -0,0 +1,85 @@
+"""
+Liveness and readiness endpoints.
+
+/health/live answers from memory only: if the event loop can run this
+handler, the process is alive. /health/ready checks the dependencies a
+request needs. Its probe result is cached for HEALTH_CACHE_TTL seconds and
+concurrent polls share one probe, so orchestrators polling every second
+cost MongoDB at most one ping per interval.
+
+Only MongoDB being unreachable makes the worker not ready (503). An open
+search breaker, a saturated connection pool or a nearly full watch-event
+buffer report "degraded": the worker still serves, with fallbacks.
+"""
+import asyncio
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from . import config
+from .db import get_storage
+from .db_monitoring import pool_monitor
+from .indexing.breaker import OPEN
+from .indexing.cache import QueryCache
+from .indexing.client import get_search_backend, search_breaker
+from .watch_events.buffer import write_buffer
+
+settings = config.get_settings()
+
+POOL_SATURATION_DEGRADED = 0.9
+BUFFER_DEPTH_DEGRADED = 0.9
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+_probe_cache = QueryCache(maxsize=1, ttl=settings.health_cache_ttl)
+_started_at = time.time()
+
+
+async def ping_mongo() -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(get_storage().ping(), timeout=settings.health_ping_timeout)
+    except Exception as e:
+        return {"ok": False, "error": repr(e)}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+async def probe() -> dict:
+    mongo = await ping_mongo()
+    pool = pool_monitor.get_stats()
+    breaker = search_breaker.get_stats()
+    buffer_depth = len(write_buffer)
+    degraded = []
+    if pool["saturation"] >= POOL_SATURATION_DEGRADED or pool["waiting"]:
+        degraded.append("mongo_pool_saturated")
+    if breaker["state"] == OPEN:
+        degraded.append("search_breaker_open")
+    if buffer_depth >= write_buffer.max_size * BUFFER_DEPTH_DEGRADED:
+        degraded.append("watch_event_buffer_full")
+    if not mongo["ok"]:
+        status = "unavailable"
+    elif degraded:
+        status = "degraded"
+    else:
+        status = "ready"
+    return {
+        "status": status,
+        "degraded": degraded,
+        "checked_at": time.time(),
+        "mongo": {**mongo, "pool": pool},
+        "search": {"backend": get_search_backend(), "breaker": breaker["state"]},
+        "watch_event_buffer": {"depth": buffer_depth, "max_size": write_buffer.max_size},
+    }
+
+
+@router.get("/live", summary="Liveness", description="Process is up and its event loop is running; no I/O")
+async def live_view():
+    return {"status": "alive", "uptime": round(time.time() - _started_at, 1)}
+
+
+@router.get("/ready", summary="Readiness", description="Dependency status, cached for a few seconds")
+async def ready_view():
+    result = await _probe_cache.get_or_load("ready", probe)
+    status_code = 503 if result["status"] == "unavailable" else 200
+    return JSONResponse(status_code=status_code, content=result)
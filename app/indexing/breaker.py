@@ -0,0 +1,103 @@
+"""
+Circuit breaker for calls to the external search backend.
+
+After `failure_threshold` consecutive failures (errors or timeouts) the
+breaker opens and calls fail immediately with CircuitOpenException instead
+of waiting for the client timeout. Once `reset_timeout` seconds have passed
+a limited number of probe calls are let through (half-open); a successful
+probe closes the breaker, a failed one opens it again.
+"""
+import asyncio
+import time
+
+from .exceptions import CircuitOpenException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Numeric state for gauges
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.stats = {
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through right now"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            return True
+        return False
+
+    async def call(self, func, *args, timeout: float = None):
+        """await func(*args) under the breaker, with an optional per-call timeout"""
+        if not self.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenException(f"{self.name} circuit breaker is open")
+        probing = self._state == HALF_OPEN
+        if probing:
+            self._probes += 1
+        try:
+            result = await asyncio.wait_for(func(*args), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        finally:
+            if probing:
+                self._probes -= 1
+        self.record_success()
+        return result
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self._failures = 0
+        self._state = CLOSED
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.stats["opened"] += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        state = self.state
+        return {
+            **self.stats,
+            "name": self.name,
+            "state": state,
+            "state_value": STATE_VALUES[state],
+            "consecutive_failures": self._failures,
+        }
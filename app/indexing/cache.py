@@ -0,0 +1,67 @@
+"""
+Bounded TTL cache for search results.
+
+Keys are normalized queries. Concurrent misses for the same key share one
+upstream call (single flight), so a burst of identical queries costs one
+round trip to the search backend.
+"""
+import time
+from collections import OrderedDict
+
+from app.singleflight import SingleFlight
+
+
+def normalize_query(query) -> str:
+    return " ".join(str(query or "").lower().split())
+
+
+class QueryCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._flights = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "collapsed": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key):
+        """Cached value for key even if it has expired (fallback use only)"""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_load(self, key, loader):
+        """Cached value for key, calling `await loader()` at most once per miss"""
+        value = self.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+
+        async def load():
+            value = await loader()
+            self.set(key, value)
+            return value
+
+        self.stats["collapsed" if key in self._flights else "misses"] += 1
+        value, _ = await self._flights.do(key, load)
+        return value
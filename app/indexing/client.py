@@ -1,106 +1,352 @@
 import asyncio
+import importlib.util
+import logging
+import time
+from datetime import datetime
 
-# Optional Algolia import - app will work without it
-try:
-    from algoliasearch.search_client import SearchClient
-    ALGOLIA_AVAILABLE = True
-except ImportError:
-    print("⚠️  Algolia not installed. Search functionality will be limited.")
-    print("   Install with: pip install algoliasearch>=3.0.0")
-    ALGOLIA_AVAILABLE = False
-    SearchClient = None
+logger = logging.getLogger(__name__)
+
+# Optional Algolia dependency - app will work without it. Only looked up
+# here; the package itself is imported when the first client is created.
+ALGOLIA_AVAILABLE = importlib.util.find_spec("algoliasearch") is not None
+if not ALGOLIA_AVAILABLE:
+    logger.warning("Algolia not installed, search uses the local index. Install with: pip install algoliasearch>=3.0.0")
 
 from app import config
-from app.db import get_database
+from app.cache.base import namespace
+from app.cache.bus import invalidation_bus
+from app.db import get_storage
+from app.memory import track_memory
+from app.metrics import registry
 
 from app.playlists.models import Playlist
 from app.videos.models import Video
 
-from .schemas import (
-    PlaylistIndexSchema,
-    VideoIndexSchema
-)
+from . import pipeline, state
+from .breaker import STATE_VALUES, CircuitBreaker
+from .cache import QueryCache, normalize_query
+from .exceptions import CircuitOpenException
+from .local import local_index
 
 settings = config.get_settings()
 
-def get_index():
-    """Get Algolia search index"""
+# Long-lived Algolia client, see get_client()
+_client = None
+_index = None
+search_cache = QueryCache(maxsize=settings.search_cache_size, ttl=settings.search_cache_ttl)
+# Second level shared by all workers when CACHE_BACKEND is shared
+shared_search_cache = namespace("search", ttl=settings.search_cache_ttl)
+search_breaker = CircuitBreaker(
+    "search",
+    failure_threshold=settings.search_breaker_failures,
+    reset_timeout=settings.search_breaker_reset_timeout
+)
+# Index uploads get their own breaker, so slow syncs never push queries onto the fallback
+index_breaker = CircuitBreaker(
+    "index",
+    failure_threshold=settings.search_breaker_failures,
+    reset_timeout=settings.search_breaker_reset_timeout
+)
+
+# e.g. "0 closed, 1 half open, 2 open", generated so it cannot drift from STATE_VALUES
+_STATE_HELP = ", ".join(
+    f"{value} {state.replace('_', ' ')}" for state, value in sorted(STATE_VALUES.items(), key=lambda item: item[1])
+)
+
+registry.gauge(
+    "search_breaker_state", f"Search circuit breaker state ({_STATE_HELP})"
+).set_function(lambda: search_breaker.get_stats()["state_value"])
+registry.counter(
+    "search_breaker_calls_total", "Search circuit breaker outcomes", ("outcome",)
+).set_function(lambda: {(outcome,): count for outcome, count in search_breaker.stats.items()})
+registry.gauge(
+    "index_breaker_state", f"Index upload circuit breaker state ({_STATE_HELP})"
+).set_function(lambda: index_breaker.get_stats()["state_value"])
+registry.counter(
+    "index_breaker_calls_total", "Index upload circuit breaker outcomes", ("outcome",)
+).set_function(lambda: {(outcome,): count for outcome, count in index_breaker.stats.items()})
+registry.counter(
+    "search_cache_total", "Search cache lookups", ("result",)
+).set_function(lambda: {(result,): count for result, count in search_cache.stats.items()})
+
+
+def get_search_backend():
+    """Backend that serves queries: "algolia" or "local"."""
+    backend = settings.search_backend
+    if backend == "auto":
+        configured = ALGOLIA_AVAILABLE and settings.algolia_app_id and settings.algolia_api_key
+        backend = "algolia" if configured else "local"
+    return backend
+
+
+def get_client():
+    """Get the long-lived Algolia search client (created on first use)"""
+    global _client
+    if _client is not None:
+        return _client
+    
     if not ALGOLIA_AVAILABLE:
-        print("⚠️  Algolia not available. Search functionality will be limited.")
+        logger.debug("Algolia not available")
         return None
         
     try:
         if not settings.algolia_app_id or not settings.algolia_api_key:
-            print("⚠️  Algolia not configured. Search functionality will be limited.")
+            logger.debug("Algolia not configured")
             return None
             
-        client = SearchClient.create(
+        from algoliasearch.search_client import SearchClient
+        _client = SearchClient.create(
                 settings.algolia_app_id, 
                 settings.algolia_api_key
         )
-        index = client.init_index(settings.algolia_index_name)
-        return index
+        return _client
     except Exception as e:
-        print(f"⚠️  Algolia connection failed: {e}")
+        logger.warning("Algolia connection failed: %s", e)
         return None
 
 
-async def get_dataset():
-    """Get dataset from MongoDB collections"""
-    db = get_database()
+def get_index():
+    """Get Algolia search index"""
+    global _index
+    if _index is None:
+        client = get_client()
+        if not client:
+            return None
+        _index = client.init_index(settings.algolia_index_name)
+    return _index
+
+
+async def close_client():
+    """Close the Algolia client's connections"""
+    global _client, _index
+    if _client is None:
+        return
+    try:
+        if hasattr(_client, "close_async"):
+            await _client.close_async()
+        else:
+            _client.close()
+    except Exception as e:
+        logger.warning("Failed to close Algolia client: %s", e)
+    _client = None
+    _index = None
+
+
+async def get_dataset(query: dict = None):
+    """Get dataset from MongoDB collections, optionally only documents matching query
+
+    Materializes everything in memory; prefer pipeline.iter_batches for large catalogs.
+    """
+    return [record async for batch in pipeline.iter_batches(query) for record in batch]
+
+
+def _guarded(blocking, timeout: float):
+    """Run a blocking Algolia indexing call in a worker thread, under the index breaker"""
+    return index_breaker.call(asyncio.to_thread, blocking, timeout=timeout)
+
+
+def _save_records(index):
+    async def upload(records):
+        await _guarded(lambda: index.save_objects(records).wait(), settings.index_upload_timeout)
+    return upload
+
+
+async def _rebuild(client, progress):
+    """Full rebuild: stream into a temporary index, then atomically swap it in
+
+    This is what replace_all_objects does, without materializing the dataset.
+    The live index is left untouched if any batch fails.
+    """
+    index_name = settings.algolia_index_name
+    tmp_name = f"{index_name}_tmp_rebuild"
+    await _guarded(
+        lambda: client.copy_index(index_name, tmp_name, {"scope": ["settings", "synonyms", "rules"]}).wait(),
+        settings.index_upload_timeout
+    )
+    tmp_index = client.init_index(tmp_name)
+    progress.set_phase("uploading")
+    stats = await pipeline.upload_batches(
+        pipeline.iter_batches(), _save_records(tmp_index), stop_on_error=False,
+        on_batch=lambda records: progress.advance(len(records))
+    )
+    if not stats["failed"]:
+        progress.set_phase("swapping")
+        await _guarded(lambda: client.move_index(tmp_name, index_name).wait(), settings.index_upload_timeout)
+    return stats
+
+
+@track_memory("job:build_local_index")
+async def build_local_index(progress: pipeline.Progress = None):
+    """(Re)build the in-process search index from MongoDB
+
+    Writes that reach the index through hooks while the build is running win
+    over the (possibly older) documents read by the build.
+    """
+    progress = progress or pipeline.Progress()
+    started = time.perf_counter()
+    db = get_storage()
+    progress.set_phase("counting")
+    progress.set_total(await db.videos.count() + await db.playlists.count())
+    progress.set_phase("uploading")
+    mark = local_index.generation
+    seen = set()
+    async for records in pipeline.iter_batches(related=False):
+        local_index.save_objects(records, unchanged_since=mark)
+        seen.update(str(record["objectID"]) for record in records)
+        progress.advance(len(records))
+        # Let other requests run between batches
+        await asyncio.sleep(0)
+    deleted = local_index.prune(seen, unchanged_since=mark)
+    local_index.ready = True
+    seconds = time.perf_counter() - started
+    return {
+        "mode": "full",
+        "pushed": len(seen),
+        "deleted": deleted,
+        "skipped": 0,
+        "seconds": round(seconds, 3),
+        "objects_per_second": round(len(seen) / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+async def update_index(full: bool = False, progress: pipeline.Progress = None):
+    """Sync the Algolia search index with MongoDB
+
+    Incremental by default: only documents updated since the last successful
+    sync are pushed and deleted videos/playlists are removed. A full rebuild
+    (full=True, or when no sync has happened yet) replaces the whole index.
+    Phase and object counts are reported to `progress`.
+    """
+    progress = progress or pipeline.Progress()
+    if get_search_backend() == "local":
+        # The local index is kept current by write hooks; an update is a rebuild
+        return await build_local_index(progress)
     
-    # Get playlists
-    playlists_cursor = db.playlists.find({})
-    playlists_dataset = []
-    async for playlist_data in playlists_cursor:
-        try:
-            playlist_schema = PlaylistIndexSchema(**playlist_data)
-            playlists_dataset.append(playlist_schema.model_dump())
-        except Exception as e:
-            print(f"Error processing playlist: {e}")
+    report = {"mode": "full" if full else "incremental", "pushed": 0, "deleted": 0, "skipped": 0}
+    client = get_client()
+    if not client:
+        logger.warning("Algolia not available, skipping index update")
+        return report
+    index = client.init_index(settings.algolia_index_name)
     
-    # Get videos
-    videos_cursor = db.videos.find({})
-    videos_dataset = []
-    async for video_data in videos_cursor:
-        try:
-            video_schema = VideoIndexSchema(**video_data)
-            videos_dataset.append(video_schema.model_dump())
-        except Exception as e:
-            print(f"Error processing video: {e}")
+    db = get_storage()
+    started_at = datetime.utcnow()
+    progress.set_phase("counting")
+    await state.ensure_indexes(db)
+    watermark = None if full else await state.get_watermark(db, settings.algolia_index_name)
+    total = await db.videos.count() + await db.playlists.count()
+    try:
+        if watermark is None:
+            report["mode"] = "full"
+            progress.set_total(total)
+            stats = await _rebuild(client, progress)
+            deletions = set()
+        else:
+            # Changed objects, plus the objects whose related titles they changed
+            query = await pipeline.related_changes(db, {"updated_at": {"$gt": watermark}})
+            progress.set_total(
+                await db.videos.count(query["videos"])
+                + await db.playlists.count(query["playlists"])
+            )
+            progress.set_phase("uploading")
+            pushed_ids = set()
+            
+            def on_batch(records):
+                pushed_ids.update(obj["objectID"] for obj in records)
+                progress.advance(len(records))
+            
+            stats = await pipeline.upload_batches(
+                pipeline.iter_batches(query),
+                _save_records(index),
+                on_batch=on_batch,
+                stop_on_error=False
+            )
+            # Objects deleted and re-created since the last sync stay in the index
+            progress.set_phase("deleting")
+            deletions = await state.deleted_since(db, watermark) - pushed_ids
+            if deletions:
+                await _guarded(lambda: index.delete_objects(list(deletions)).wait(), settings.index_upload_timeout)
+    except Exception as e:
+        logger.exception("Failed to update Algolia index")
+        report["error"] = str(e)
+        return report
     
-    dataset = videos_dataset + playlists_dataset
-    return dataset
+    report["pushed"] = stats["pushed"]
+    report["failed"] = stats["failed"]
+    report["deleted"] = len(deletions)
+    report["skipped"] = max(total - stats["pushed"] - stats["failed"], 0)
+    report["seconds"] = stats["seconds"]
+    report["objects_per_second"] = stats["objects_per_second"]
+    if stats["failed"]:
+        # Keep the old watermark so the next sync retries the failed batches
+        report["error"] = f"{stats['failed']} objects failed to upload"
+        return report
+    await state.set_watermark(db, settings.algolia_index_name, started_at, report)
+    # Drops cached results in every worker, see _drop_search_results
+    await shared_search_cache.invalidate()
+    return report
 
-async def update_index():
-    """Update Algolia search index with MongoDB data"""
-    index = get_index()
-    if not index:
-        print("⚠️  Algolia not available, skipping index update")
-        return 0
-        
-    dataset = await get_dataset()
+
+async def _drop_search_results(keys, remote: bool):
+    search_cache.clear()
+
+
+invalidation_bus.subscribe("search", _drop_search_results)
+
+
+def _fallback_search(query, key):
+    """Results while Algolia is unreachable: stale cache, then the local index"""
+    stale = search_cache.get_stale(key)
+    if stale is not None:
+        return stale
+    if local_index.ready:
+        return local_index.search(query)
+    return {"hits": [], "nbHits": 0}
+
+
+async def search_index(query):
+    """Search Algolia index (or the local index, depending on SEARCH_BACKEND)
+
+    Algolia results are cached per normalized query, in this worker and in
+    the shared cache, and identical concurrent queries share a single
+    upstream request. Calls go through a circuit
+    breaker; while Algolia is failing, results come from _fallback_search.
+    """
+    if get_search_backend() == "local":
+        return local_index.search(query)
     
-    if dataset:
-        try:
-            idx_resp = index.save_objects(dataset).wait()
-            count = len(list(idx_resp)[0]['objectIDs'])
-            return count
-        except Exception as e:
-            print(f"⚠️  Failed to update Algolia index: {e}")
-            return 0
-    return 0
-
-
-def search_index(query):
-    """Search Algolia index"""
+    key = normalize_query(query)
     index = get_index()
     if not index:
-        print("⚠️  Algolia not available, returning empty results")
-        return {"hits": [], "nbHits": 0}
+        logger.debug("Algolia not available, returning fallback results")
+        return _fallback_search(query, key)
+    
+    async def remote_search():
+        if hasattr(index, "search_async"):
+            return await index.search_async(key)
+        return await asyncio.to_thread(index.search, key)
+    
+    async def load():
+        results = await shared_search_cache.get(key)
+        if results is None:
+            results = await search_breaker.call(remote_search, timeout=settings.search_timeout)
+            await shared_search_cache.set(key, results)
+        return results
     
     try:
-        return index.search(query)
+        return await search_cache.get_or_load(key, load)
+    except CircuitOpenException:
+        return _fallback_search(query, key)
     except Exception as e:
-        print(f"⚠️  Search failed: {e}")
-        return {"hits": [], "nbHits": 0}
\ No newline at end of file
+        logger.warning("Search failed: %r", e)
+        return _fallback_search(query, key)
+
+
+def get_search_status() -> dict:
+    return {
+        "backend": get_search_backend(),
+        "breaker": search_breaker.get_stats(),
+        "index_breaker": index_breaker.get_stats(),
+        "cache": {**search_cache.stats, "size": len(search_cache)},
+        "local_index": {"ready": local_index.ready, "objects": len(local_index)},
+    }
@@ -0,0 +1,4 @@
+class CircuitOpenException(Exception):
+    """
+    Call rejected because the circuit breaker is open
+    """
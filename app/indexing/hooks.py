@@ -0,0 +1,120 @@
+"""
+Write hooks that keep search state in step with the models.
+
+Models call these after every write that changes what is searchable.
+They must stay free of model imports so models can import them.
+
+Other workers' writes arrive through the invalidation bus; the changed
+objects are re-read so this worker's in-process indexes follow them.
+"""
+import asyncio
+import logging
+
+from app import config
+from app.cache.bus import invalidation_bus
+from app.db import get_storage
+
+from . import state
+from .local import local_index
+from .suggest import suggest_index
+from .schemas import (
+    PlaylistIndexSchema,
+    VideoIndexSchema
+)
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+_rebuild_task = None
+
+
+def local_index_enabled() -> bool:
+    """Whether this worker maintains the in-process search index"""
+    from .client import get_search_backend
+    return get_search_backend() == "local" or settings.search_local_fallback
+
+
+async def video_saved(video):
+    record = VideoIndexSchema(**video.model_dump()).model_dump()
+    if local_index_enabled():
+        local_index.save_objects([record])
+    if settings.suggest_enabled:
+        # Popularity is kept until the next suggest refresh
+        suggest_index.save(record)
+
+
+async def playlist_saved(playlist):
+    record = PlaylistIndexSchema(**playlist.model_dump()).model_dump()
+    if local_index_enabled():
+        local_index.save_objects([record])
+    if settings.suggest_enabled:
+        suggest_index.save(record, score=len(playlist.host_ids or []))
+
+
+async def object_deleted(object_id: str, object_type: str):
+    """A video or playlist is gone (or its objectID changed)"""
+    await state.record_deletion(object_id, object_type)
+    if local_index_enabled():
+        local_index.delete_objects([object_id])
+    if settings.suggest_enabled:
+        suggest_index.delete(object_id)
+
+
+async def _refresh_objects(collection: str, field: str, object_ids, schema, score=None):
+    """Re-read objects changed by another worker into the in-process indexes"""
+    if not (local_index_enabled() or settings.suggest_enabled):
+        return
+    if object_ids is None:
+        _rebuild_indexes()
+        return
+    documents = await getattr(get_storage(), collection).find_many({field: {"$in": object_ids}})
+    found = set()
+    for document in documents:
+        record = schema(**document).model_dump()
+        found.add(str(record["objectID"]))
+        if local_index_enabled():
+            local_index.save_objects([record])
+        if settings.suggest_enabled:
+            suggest_index.save(record, score=score(document) if score else None)
+    gone = [object_id for object_id in object_ids if object_id not in found]
+    if local_index_enabled():
+        local_index.delete_objects(gone)
+    if settings.suggest_enabled:
+        for object_id in gone:
+            suggest_index.delete(object_id)
+
+
+def _rebuild_indexes():
+    """Rebuild both indexes in the background, once at a time"""
+    global _rebuild_task
+    if _rebuild_task is None or _rebuild_task.done():
+        _rebuild_task = asyncio.create_task(_rebuild())
+
+
+async def _rebuild():
+    from .client import build_local_index
+    from .suggest import build_suggest_index
+    try:
+        if local_index_enabled():
+            await build_local_index()
+        if settings.suggest_enabled:
+            await build_suggest_index()
+    except Exception:
+        logger.exception("Rebuilding search indexes after lost invalidations failed")
+
+
+async def videos_changed(host_ids, remote: bool):
+    if remote:
+        await _refresh_objects("videos", "host_id", host_ids, VideoIndexSchema)
+
+
+async def playlists_changed(db_ids, remote: bool):
+    if remote:
+        await _refresh_objects(
+            "playlists", "db_id", db_ids, PlaylistIndexSchema, score=lambda document: len(document.get("host_ids") or [])
+        )
+
+
+invalidation_bus.subscribe("videos", videos_changed)
+invalidation_bus.subscribe("playlists", playlists_changed)
@@ -0,0 +1,245 @@
+"""
+Background index jobs.
+
+POST /api/update-index submits a job and returns at once; the sync itself
+runs as a task in the submitting worker. Only one job runs at a time: a
+lease in MongoDB, which names the job holding it, keeps other workers from
+starting a parallel rebuild, and a trigger while a job is running returns
+that job.
+
+Jobs are recorded in `index_jobs`, progress included, so any worker can
+report on or cancel any job; a cancel for a job running elsewhere is
+picked up by its worker within PROGRESS_INTERVAL.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+from app.db import get_storage
+from app.memory import memory_tracker
+
+from . import state
+from .client import update_index
+from .pipeline import Progress
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "update-index"
+LOCK_TTL = 120  # seconds, renewed while the job runs
+JOB_COLLECTION = "index_jobs"
+JOB_TTL = 7 * 24 * 3600  # seconds job records are kept
+PROGRESS_INTERVAL = 2.0  # seconds between progress saves
+MAX_LISTED_JOBS = 20
+
+FINISHED_PHASES = ("done", "failed", "cancelled", "skipped")
+
+
+class IndexJob(Progress):
+    def __init__(self, full: bool = False, owner: str = None):
+        self.job_id = str(uuid.uuid4())
+        self.full = full
+        self.owner = owner
+        self.phase = "queued"
+        self.processed = 0
+        self.total = None
+        self.report = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._task = None
+
+    def set_phase(self, phase: str):
+        self.phase = phase
+
+    def set_total(self, total: int):
+        self.total = total
+
+    def advance(self, count: int):
+        self.processed += count
+
+    @property
+    def finished(self) -> bool:
+        return self.phase in FINISHED_PHASES
+
+    @property
+    def rate(self) -> float:
+        """Objects per second so far"""
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Seconds until done, if it can be estimated"""
+        if self.finished:
+            return 0.0
+        if not self.total or not self.rate:
+            return None
+        return max(self.total - self.processed, 0) / self.rate
+
+    def as_data(self):
+        eta = self.eta
+        return {
+            "job_id": self.job_id,
+            "full": self.full,
+            "phase": self.phase,
+            "processed": self.processed,
+            "total": self.total,
+            "rate": round(self.rate, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "report": self.report,
+            "error": self.error,
+            "worker": self.owner,
+        }
+
+    def to_mongo(self) -> dict:
+        data = self.as_data()
+        for computed in ("rate", "eta_seconds"):
+            del data[computed]
+        data["_id"] = data.pop("job_id")
+        data["owner"] = data.pop("worker")
+        return data
+
+    @classmethod
+    def from_mongo(cls, data: dict):
+        job = cls(full=data.get("full", False), owner=data.get("owner"))
+        job.job_id = data["_id"]
+        for field in ("phase", "processed", "total", "report", "error", "created_at", "started_at", "finished_at"):
+            setattr(job, field, data.get(field))
+        return job
+
+
+class IndexJobManager:
+    def __init__(self):
+        self._local = {}  # job_id -> job running in this worker
+        self._indexes_ready = False
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def submit(self, full: bool = False):
+        """Start a job unless one is already running; returns (job, created)
+
+        When any worker is running a job, that job is returned instead.
+        """
+        db = get_storage()
+        job = IndexJob(full=full, owner=self.owner)
+        if not await state.acquire_lock(db, LOCK_NAME, self.owner, LOCK_TTL, job_id=job.job_id):
+            lease = await state.lock_holder(db, LOCK_NAME)
+            running = await self.get(lease["job_id"]) if lease and lease.get("job_id") else None
+            if running is not None:
+                return running, False
+            # The lease changed hands meanwhile; record the attempt
+            job.phase = "skipped"
+            job.error = "Another worker is already updating the index"
+            job.finished_at = time.time()
+            await self._save(db, job)
+            return job, True
+        await self._save(db, job)
+        self._local[job.job_id] = job
+        job._task = asyncio.get_running_loop().create_task(self._run(job))
+        return job, True
+
+    async def get(self, job_id: str):
+        job = self._local.get(job_id)
+        if job is not None:
+            return job
+        data = await get_storage()[JOB_COLLECTION].find_one({"_id": job_id})
+        return IndexJob.from_mongo(data) if data is not None else None
+
+    async def list(self):
+        """Most recent jobs of every worker, newest first"""
+        documents = await get_storage()[JOB_COLLECTION].find_many(
+            {}, sort=[("created_at", -1)], limit=MAX_LISTED_JOBS
+        )
+        return [self._local.get(data["_id"]) or IndexJob.from_mongo(data) for data in documents]
+
+    async def cancel(self, job_id: str) -> bool:
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job_id in self._local:
+            self._local[job_id]._task.cancel()
+        else:
+            await get_storage()[JOB_COLLECTION].update({"_id": job_id}, {"$set": {"cancel_requested": True}})
+        return True
+
+    async def close(self):
+        """Cancel this worker's jobs and wait for them to release the lease"""
+        tasks = [job._task for job in self._local.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Tasks cancelled before they first ran never reached _run's cleanup
+        db = get_storage()
+        for job in list(self._local.values()):
+            job.phase = "cancelled"
+            job.finished_at = time.time()
+            await self._save(db, job)
+            self._local.pop(job.job_id, None)
+            await state.release_lock(db, LOCK_NAME, self.owner)
+
+    async def _run(self, job: IndexJob):
+        db = get_storage()
+        job.started_at = time.time()
+        watcher = asyncio.get_running_loop().create_task(self._watch(db, job, asyncio.current_task()))
+        try:
+            with memory_tracker.track("job:update_index"):
+                job.report = await update_index(full=job.full, progress=job)
+            job.error = job.report.get("error")
+            job.phase = "failed" if job.error else "done"
+        except asyncio.CancelledError:
+            job.phase = "cancelled"
+        except Exception as e:
+            job.phase = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            watcher.cancel()
+            await self._save(db, job)
+            self._local.pop(job.job_id, None)
+            try:
+                await state.release_lock(db, LOCK_NAME, self.owner)
+            except Exception as e:
+                logger.warning("Failed to release index lock: %s", e)
+
+    async def _watch(self, db, job: IndexJob, task):
+        """Save progress, pick up cancel requests from other workers and renew the lease"""
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            try:
+                await self._save(db, job)
+                data = await db[JOB_COLLECTION].find_one({"_id": job.job_id}, projection={"cancel_requested": 1})
+                if data and data.get("cancel_requested"):
+                    task.cancel()
+                    return
+                if time.monotonic() - renewed_at >= LOCK_TTL / 3:
+                    await state.acquire_lock(db, LOCK_NAME, self.owner, LOCK_TTL, job_id=job.job_id)
+                    renewed_at = time.monotonic()
+            except Exception as e:
+                logger.warning("Index job bookkeeping failed: %s", e)
+
+    async def _save(self, db, job: IndexJob):
+        collection = db[JOB_COLLECTION]
+        try:
+            if not self._indexes_ready:
+                await collection.create_index("recorded_at", expire_after=JOB_TTL)
+                await collection.create_index("created_at")
+                self._indexes_ready = True
+            await collection.update(
+                {"_id": job.job_id},
+                {"$set": {**job.to_mongo(), "recorded_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning("Failed to record index job %s: %s", job.job_id, e)
+
+
+job_manager = IndexJobManager()
@@ -0,0 +1,251 @@
+"""
+In-process full-text search backend.
+
+Used when Algolia is not configured (tests, air-gapped deployments) or when
+`SEARCH_BACKEND=local`. Keeps an inverted index over the same records that
+are pushed to Algolia and ranks them with BM25. The last query word is
+matched as a prefix (search-as-you-type) and words of four or more
+characters tolerate one typo. Results use the same shape as Algolia's
+`index.search`, so callers do not care which backend answered.
+"""
+import bisect
+import heapq
+import math
+import re
+import time
+import unicodedata
+from collections import Counter
+
+TOKEN_RE = re.compile(r"\w+")
+SEARCHABLE_ATTRIBUTES = ("title",)
+MIN_TYPO_LENGTH = 4
+MAX_PREFIX_SCAN = 2000
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.5
+
+
+def normalize(text) -> str:
+    """Lowercase and strip accents"""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def _deletes(term: str):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insert, delete, substitution or adjacent swap"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class LocalSearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        self._records = {}
+        self._doc_terms = {}  # objectID -> Counter(term -> tf)
+        self._doc_length = {}
+        self._postings = {}  # term -> {objectID: tf}
+        self._terms = []  # sorted vocabulary, for prefix lookups
+        self._typo_index = {}  # single-deletion variant -> terms
+        self._total_length = 0
+        self._touched = {}  # objectID -> generation of its last save/delete
+        self.generation = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self._records)
+
+    def save_objects(self, records, unchanged_since: int = None):
+        """Add or replace records (by objectID)
+
+        With unchanged_since, records whose object was saved or deleted after
+        that generation are skipped; a rebuild uses this so stale cursor
+        reads never overwrite concurrent writes.
+        """
+        for record in records:
+            object_id = str(record["objectID"])
+            if unchanged_since is not None and self._touched.get(object_id, -1) > unchanged_since:
+                continue
+            self._remove(object_id)
+            tokens = []
+            for attribute in SEARCHABLE_ATTRIBUTES:
+                tokens += tokenize(record.get(attribute))
+            terms = Counter(tokens)
+            self._records[object_id] = record
+            self._doc_terms[object_id] = terms
+            self._doc_length[object_id] = len(tokens)
+            self._total_length += len(tokens)
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[object_id] = tf
+            self._touch(object_id)
+
+    def delete_objects(self, object_ids):
+        for object_id in object_ids:
+            self._remove(str(object_id))
+            self._touch(str(object_id))
+
+    def prune(self, keep_ids, unchanged_since: int):
+        """Delete records not in keep_ids, unless they were written after unchanged_since"""
+        stale = [
+            object_id for object_id in self._records
+            if object_id not in keep_ids and self._touched.get(object_id, -1) <= unchanged_since
+        ]
+        pruned_from = self.generation
+        self.delete_objects(stale)
+        # Only writes made while a rebuild runs matter to it; keep those of
+        # overlapping rebuilds and forget the rest, including these deletions
+        self._touched = {
+            object_id: generation for object_id, generation in self._touched.items()
+            if unchanged_since < generation <= pruned_from
+        }
+        return len(stale)
+
+    def search(self, query: str, limit: int = 20) -> dict:
+        """Algolia-shaped search results"""
+        started = time.perf_counter()
+        tokens = tokenize(query)
+        if tokens:
+            scores = self._score(tokens)
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            num_hits = len(scores)
+        else:
+            ranked = [(object_id, 0.0) for object_id in list(self._records)[:limit]]
+            num_hits = len(self._records)
+        hits = [
+            {**self._records[object_id], "_rankingInfo": {"bm25": round(score, 4)}}
+            for object_id, score in ranked
+        ]
+        return {
+            "hits": hits,
+            "nbHits": num_hits,
+            "query": query,
+            "processingTimeMS": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def _score(self, tokens) -> dict:
+        count = len(self._records)
+        if count == 0:
+            return {}
+        avg_length = self._total_length / count or 1.0
+        expansions = [
+            self._expand(token, prefix=(position == len(tokens) - 1))
+            for position, token in enumerate(tokens)
+        ]
+        # Intersect starting from the most selective word
+        expansions.sort(key=lambda terms: sum(len(self._postings[term]) for term in terms))
+        scores = None
+        for terms in expansions:
+            token_scores = {}
+            for term, weight in terms.items():
+                postings = self._postings[term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if scores is not None and len(postings) > len(scores):
+                    matches = ((oid, postings[oid]) for oid in scores if oid in postings)
+                else:
+                    matches = postings.items()
+                for object_id, tf in matches:
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_length[object_id] / avg_length)
+                    score = weight * idf * tf * (self.k1 + 1) / (tf + norm)
+                    if score > token_scores.get(object_id, 0.0):
+                        token_scores[object_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {oid: score + token_scores[oid] for oid, score in scores.items() if oid in token_scores}
+            if not scores:
+                break
+        return scores or {}
+
+    def _expand(self, token: str, prefix: bool) -> dict:
+        """Index terms a query word matches, with a weight per kind of match"""
+        expansions = {}
+        if token in self._postings:
+            expansions[token] = 1.0
+        if prefix:
+            start = bisect.bisect_left(self._terms, token)
+            candidates = []
+            for term in self._terms[start:start + MAX_PREFIX_SCAN]:
+                if not term.startswith(token):
+                    break
+                candidates.append(term)
+            candidates = heapq.nlargest(MAX_PREFIX_EXPANSIONS, candidates, key=lambda term: len(self._postings[term]))
+            for term in candidates:
+                expansions.setdefault(term, PREFIX_WEIGHT)
+        if len(token) >= MIN_TYPO_LENGTH:
+            candidates = set(self._typo_index.get(token, ()))
+            for variant in _deletes(token):
+                candidates.update(self._typo_index.get(variant, ()))
+            for term in candidates:
+                if term not in expansions and _within_one_edit(token, term):
+                    expansions[term] = TYPO_WEIGHT
+        return expansions
+
+    def _remove(self, object_id: str):
+        terms = self._doc_terms.pop(object_id, None)
+        if terms is None:
+            return
+        del self._records[object_id]
+        self._total_length -= self._doc_length.pop(object_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(object_id, None)
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+
+    def _touch(self, object_id: str):
+        self.generation += 1
+        self._touched[object_id] = self.generation
+
+    def _typo_keys(self, term: str):
+        if len(term) < MIN_TYPO_LENGTH - 1:
+            return set()
+        return _deletes(term) | {term}
+
+    def _add_term(self, term: str):
+        bisect.insort(self._terms, term)
+        for key in self._typo_keys(term):
+            self._typo_index.setdefault(key, set()).add(term)
+
+    def _drop_term(self, term: str):
+        position = bisect.bisect_left(self._terms, term)
+        if position < len(self._terms) and self._terms[position] == term:
+            del self._terms[position]
+        for key in self._typo_keys(term):
+            terms = self._typo_index.get(key)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._typo_index[key]
+
+
+local_index = LocalSearchIndex()
@@ -0,0 +1,185 @@
+"""
+Streaming pipeline that feeds the search index.
+
+Documents are read from MongoDB cursors with a projection, validated in
+fixed-size batches and uploaded with a bounded number of concurrent
+requests, so memory stays flat no matter how large the catalog grows and
+the (synchronous) Algolia client never blocks the event loop.
+"""
+import asyncio
+import logging
+import time
+
+from app import config
+from app.db import get_storage
+
+from . import state
+from .schemas import (
+    PlaylistIndexSchema,
+    VideoIndexSchema
+)
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+# (collection, schema, projection) for every indexed object type
+SOURCES = (
+    ("videos", VideoIndexSchema, {"_id": 0, "host_id": 1, "title": 1}),
+    ("playlists", PlaylistIndexSchema, {"_id": 0, "db_id": 1, "title": 1, "host_ids": 1}),
+)
+
+
+class Progress:
+    """Progress sink for long-running index work; the default ignores everything"""
+
+    def set_phase(self, phase: str):
+        pass
+
+    def set_total(self, total: int):
+        pass
+
+    def advance(self, count: int):
+        pass
+
+
+def validate_batch(Schema, documents):
+    """Convert raw documents into index records, skipping invalid ones"""
+    records = []
+    for document in documents:
+        try:
+            records.append(Schema(**document).model_dump())
+        except Exception as e:
+            logger.warning("Error processing %s: %s", Schema.__name__, e)
+    return records
+
+
+async def add_related(db, collection_name: str, documents, limit: int = None):
+    """Attach the titles of related objects to a batch of raw documents
+
+    Videos get the titles of playlists containing them, playlists the titles
+    of their first videos, at most `limit` each. One query per batch instead
+    of one per document.
+    """
+    limit = settings.index_related_limit if limit is None else limit
+    if not documents or limit <= 0:
+        return documents
+    if collection_name == "videos":
+        host_ids = [document["host_id"] for document in documents if document.get("host_id")]
+        # Capped and sorted by the database, so records only change when titles do
+        groups = await db.playlists.group(
+            "host_ids", {"host_ids": {"$in": host_ids}}, keys=host_ids, collect="title", limit=limit
+        )
+        related = {host_id: [title for title in group["values"] if title] for host_id, group in groups.items()}
+        for document in documents:
+            document["related"] = related.get(document.get("host_id"), [])
+    elif collection_name == "playlists":
+        members = {}
+        for document in documents:
+            members[id(document)] = list(dict.fromkeys(document.get("host_ids") or []))[:limit]
+        wanted = {host_id for host_ids in members.values() for host_id in host_ids}
+        titles = {}
+        videos = await db.videos.find_many(
+            {"host_id": {"$in": list(wanted)}}, projection={"_id": 0, "host_id": 1, "title": 1}
+        )
+        for video in videos:
+            titles[video["host_id"]] = video.get("title")
+        for document in documents:
+            document["related"] = [
+                titles[host_id] for host_id in members[id(document)] if titles.get(host_id)
+            ]
+    return documents
+
+
+async def related_changes(db, query: dict):
+    """Per-collection filters for documents matching query plus those whose related titles it changed
+
+    Videos removed from a playlist keep its title until the next full rebuild.
+    """
+    video_ids = await db.videos.distinct("host_id", query)
+    playlist_video_ids = await db.playlists.distinct("host_ids", query)
+    return {
+        "videos": {"$or": [query, {"host_id": {"$in": playlist_video_ids}}]},
+        "playlists": {"$or": [query, {"host_ids": {"$in": video_ids}}]},
+    }
+
+
+async def iter_batches(query: dict = None, batch_size: int = None, related: bool = True):
+    """Yield lists of at most batch_size validated index records
+
+    `query` is one filter for every source or, keyed by collection name, a
+    filter per source. related=False skips the related-title joins.
+    """
+    db = get_storage()
+    batch_size = batch_size or settings.index_batch_size
+    if related:
+        await state.ensure_indexes(db)
+    for collection_name, Schema, projection in SOURCES:
+        collection_query = query or {}
+        if collection_name in collection_query:
+            collection_query = collection_query[collection_name]
+        batches = db[collection_name].iterate(collection_query, projection=projection, batch_size=batch_size)
+        async for documents in batches:
+            if related:
+                await add_related(db, collection_name, documents)
+            yield validate_batch(Schema, documents)
+
+
+async def upload_batches(batches, upload, concurrency: int = None, on_batch=None,
+                         stop_on_error: bool = True):
+    """Run `upload(records)` for every batch
+
+    A blocking `upload` runs in worker threads, a coroutine function is
+    awaited. At most `concurrency` uploads are in flight; the next batch is
+    not read from MongoDB until a slot frees up. With stop_on_error=False
+    failed batches are counted in stats["failed"] instead of aborting.
+    """
+    concurrency = concurrency or settings.index_upload_concurrency
+    slots = asyncio.Semaphore(concurrency)
+    pending = set()
+    errors = []
+    stats = {"pushed": 0, "batches": 0, "failed": 0}
+    started = time.perf_counter()
+    is_async = asyncio.iscoroutinefunction(upload)
+
+    async def run(records):
+        try:
+            if is_async:
+                await upload(records)
+            else:
+                await asyncio.to_thread(upload, records)
+            stats["pushed"] += len(records)
+            stats["batches"] += 1
+            if on_batch is not None:
+                on_batch(records)
+        except Exception as e:
+            stats["failed"] += len(records)
+            if stop_on_error:
+                errors.append(e)
+        finally:
+            slots.release()
+
+    try:
+        async for records in batches:
+            if errors:
+                break
+            if not records:
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(run(records))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
+    if errors:
+        # Fail the stream on the first upload error, like a single bulk call would
+        raise errors[0]
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["objects_per_second"] = round(stats["pushed"] / seconds, 1) if seconds > 0 else 0.0
+    return stats
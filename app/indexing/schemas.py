@@ -1,7 +1,7 @@
 import uuid
 import json
 from pydantic import BaseModel, Field, validator, model_validator
-from typing import Optional
+from typing import List, Optional
 
 
 class VideoIndexSchema(BaseModel):
@@ -9,7 +9,7 @@ class VideoIndexSchema(BaseModel):
     objectType: str = "Video"
     title: Optional[str]
     path: str = Field(alias='host_id')
-    # related -> playlist names
+    related: List[str] = Field(default_factory=list)  # titles of playlists with this video
         
     @validator("path")
     def set_path(cls, v, values, **kwargs):
@@ -22,7 +22,7 @@ class PlaylistIndexSchema(BaseModel):
     objectType: str = "Playlist"
     title: Optional[str]
     path: str = Field(default='/')
-    # related -> host_ids -> Video Title
+    related: List[str] = Field(default_factory=list)  # titles of the playlist's videos
     
     @model_validator(mode='after')
     def set_defaults(self):
@@ -0,0 +1,103 @@
+"""
+Bookkeeping for incremental search index syncs.
+
+`index_sync_state` holds one watermark per index: the time the last
+successful sync started. `index_tombstones` records the objectIDs of
+deleted videos and playlists so the next sync can remove them from the
+index; tombstones expire on their own once every sync has seen them.
+"""
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from app.db import get_storage
+
+SYNC_STATE_COLLECTION = "index_sync_state"
+TOMBSTONE_COLLECTION = "index_tombstones"
+TOMBSTONE_TTL = 30 * 24 * 3600  # seconds
+# Overlap between syncs so writes racing the previous sync are never missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_tombstone_index_ready = False
+_sync_indexes_ready = False
+
+
+async def get_watermark(db, index_name: str):
+    """Start time of the last successful sync, None if there never was one"""
+    state = await db[SYNC_STATE_COLLECTION].find_one({"_id": index_name})
+    if state is None or state.get("last_synced_at") is None:
+        return None
+    return state["last_synced_at"] - SYNC_OVERLAP
+
+
+async def set_watermark(db, index_name: str, synced_at: datetime, report: dict = None):
+    await db[SYNC_STATE_COLLECTION].update(
+        {"_id": index_name},
+        {"$set": {"last_synced_at": synced_at, "last_report": report or {}}},
+        upsert=True
+    )
+
+
+async def record_deletion(object_id: str, object_type: str):
+    """Remember that an indexed object was deleted"""
+    global _tombstone_index_ready
+    collection = get_storage()[TOMBSTONE_COLLECTION]
+    if not _tombstone_index_ready:
+        await collection.create_index("deleted_at", expire_after=TOMBSTONE_TTL)
+        _tombstone_index_ready = True
+    await collection.insert({
+        "object_id": str(object_id),
+        "object_type": object_type,
+        "deleted_at": datetime.utcnow()
+    })
+
+
+async def deleted_since(db, since: datetime):
+    """objectIDs deleted after `since`"""
+    tombstones = await db[TOMBSTONE_COLLECTION].find_many(
+        {"deleted_at": {"$gt": since}},
+        projection={"object_id": 1, "_id": 0}
+    )
+    return {tombstone["object_id"] for tombstone in tombstones}
+
+
+async def ensure_indexes(db):
+    """Indexes used by syncs: updated_at range scans and the related-title joins"""
+    global _sync_indexes_ready
+    if _sync_indexes_ready:
+        return
+    await db.videos.create_index("updated_at")
+    await db.playlists.create_index("updated_at")
+    await db.videos.create_index("host_id")
+    await db.playlists.create_index("host_ids")
+    _sync_indexes_ready = True
+
+
+async def acquire_lock(db, name: str, owner: str, ttl: float, **fields) -> bool:
+    """Take (or renew) a lease shared by every worker; False if someone else holds it
+
+    Extra fields are stored on the lease, for other workers to read with lock_holder.
+    """
+    now = datetime.utcnow()
+    try:
+        await db[SYNC_STATE_COLLECTION].update(
+            {"_id": f"lock:{name}", "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {**fields, "owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lock document exists, is not expired and belongs to another owner
+        return False
+    return True
+
+
+async def lock_holder(db, name: str):
+    """The unexpired lease document, None when nobody holds the lock"""
+    lease = await db[SYNC_STATE_COLLECTION].find_one({"_id": f"lock:{name}"})
+    if lease is None or lease["expires_at"] < datetime.utcnow():
+        return None
+    return lease
+
+
+async def release_lock(db, name: str, owner: str):
+    await db[SYNC_STATE_COLLECTION].delete({"_id": f"lock:{name}", "owner": owner})
@@ -0,0 +1,272 @@
+"""
+Prefix autocomplete over video and playlist titles.
+
+Every word-suffix of a normalized title ("learn python fast" ->
+"learn python fast", "python fast", "fast") is a key, so a prefix matches
+the start of any word. The top-K most popular objects for every prefix of
+a word are precomputed and maintained incrementally, which makes single-word
+prefixes (nearly every keystroke) a dict lookup. Multi-word prefixes bisect
+the sorted keys that share their first word, a range that is always small.
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+
+from app import config
+from app.db import get_storage
+from app.memory import track_memory
+
+from . import pipeline
+from .local import tokenize
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+SUGGESTION_FIELDS = ("objectID", "objectType", "title", "path")
+MAX_KEY_LENGTH = 32
+MAX_HEAD_LENGTH = 16  # longer single-word prefixes are answered by a scan
+YIELD_EVERY = 200  # records saved between event loop yields while building
+
+
+class SuggestIndex:
+    def __init__(self, capacity: int = 10):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self._words = []  # sorted first words of all keys
+        self._buckets = {}  # first word -> sorted [(key, objectID)]
+        self._heads = {}  # word prefix -> sorted [(-score, objectID)], at most capacity
+        self._dirty = set()  # head prefixes that lost a member, refilled on their next read
+        self._entries = {}  # objectID -> (suggestion, score, keys)
+        self._touched = {}
+        self.generation = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self, record: dict, score: float = None, unchanged_since: int = None):
+        """Add or replace a record; score defaults to the record's previous score"""
+        object_id = str(record["objectID"])
+        if unchanged_since is not None and self._touched.get(object_id, -1) > unchanged_since:
+            return
+        previous = self._entries.get(object_id)
+        if score is None:
+            score = previous[1] if previous else 0.0
+        keys = self._keys_for(record.get("title"))
+        suggestion = {field: record.get(field) for field in SUGGESTION_FIELDS}
+        suggestion["objectID"] = object_id
+        if previous is not None and previous[1] == score and previous[2] == keys:
+            # Same ranking, only the displayed fields may differ
+            self._entries[object_id] = (suggestion, score, keys)
+            self._touch(object_id)
+            return
+        self._remove(object_id)
+        self._entries[object_id] = (suggestion, score, keys)
+        for key in keys:
+            word = key.split(" ", 1)[0]
+            bucket = self._buckets.get(word)
+            if bucket is None:
+                bucket = self._buckets[word] = []
+                bisect.insort(self._words, word)
+            bisect.insort(bucket, (key, object_id))
+            for prefix in self._head_prefixes(word):
+                self._offer(prefix, object_id, score)
+        self._touch(object_id)
+
+    def delete(self, object_id: str):
+        self._remove(str(object_id))
+        self._touch(str(object_id))
+
+    def prune(self, keep_ids, unchanged_since: int) -> int:
+        """Delete records not in keep_ids, unless they were written after unchanged_since"""
+        stale = [
+            object_id for object_id in self._entries
+            if object_id not in keep_ids and self._touched.get(object_id, -1) <= unchanged_since
+        ]
+        pruned_from = self.generation
+        for object_id in stale:
+            self.delete(object_id)
+        # Only writes made while a rebuild runs matter to it; keep those of
+        # overlapping rebuilds and forget the rest, including these deletions
+        self._touched = {
+            object_id: generation for object_id, generation in self._touched.items()
+            if unchanged_since < generation <= pruned_from
+        }
+        return len(stale)
+
+    def suggest(self, query: str, limit: int = None):
+        """Most popular records with a title word starting with query"""
+        prefix = " ".join(tokenize(query))[:MAX_KEY_LENGTH]
+        if not prefix:
+            return []
+        limit = min(limit or self.capacity, self.capacity)
+        if " " not in prefix and len(prefix) <= MAX_HEAD_LENGTH:
+            if prefix in self._dirty:
+                self._refill(prefix)
+            top = self._heads.get(prefix, [])
+        else:
+            top = self._scan(prefix, limit)
+        return [self._entries[object_id][0] for _, object_id in top[:limit]]
+
+    def _keys_for(self, title):
+        words = tokenize(title)
+        return frozenset(" ".join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words)))
+
+    def _head_prefixes(self, word: str):
+        return (word[:length] for length in range(1, min(len(word), MAX_HEAD_LENGTH) + 1))
+
+    def _offer(self, prefix: str, object_id: str, score: float):
+        top = self._heads.setdefault(prefix, [])
+        item = (-score, object_id)
+        if len(top) >= self.capacity and item >= top[-1]:
+            return
+        if item in top:
+            return
+        bisect.insort(top, item)
+        del top[self.capacity:]
+
+    def _scan(self, prefix: str, limit: int):
+        """Top `limit` objects among keys starting with prefix"""
+        if " " in prefix:
+            words = [prefix.split(" ", 1)[0]]
+        else:
+            position = bisect.bisect_left(self._words, prefix)
+            end = bisect.bisect_left(self._words, prefix + "\uffff", position)
+            words = self._words[position:end]
+        best = {}
+        for word in words:
+            bucket = self._buckets.get(word, ())
+            position = bisect.bisect_left(bucket, (prefix,))
+            while position < len(bucket) and bucket[position][0].startswith(prefix):
+                object_id = bucket[position][1]
+                best[object_id] = self._entries[object_id][1]
+                position += 1
+        return heapq.nsmallest(limit, ((-score, object_id) for object_id, score in best.items()))
+
+    def _remove(self, object_id: str):
+        entry = self._entries.pop(object_id, None)
+        if entry is None:
+            return
+        _, score, keys = entry
+        affected = set()
+        for key in keys:
+            word = key.split(" ", 1)[0]
+            bucket = self._buckets.get(word)
+            if bucket is None:
+                continue
+            position = bisect.bisect_left(bucket, (key, object_id))
+            if position < len(bucket) and bucket[position] == (key, object_id):
+                del bucket[position]
+            if not bucket:
+                del self._buckets[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+            affected.update(self._head_prefixes(word))
+        for prefix in affected:
+            top = self._heads.get(prefix)
+            if top is not None and (-score, object_id) in top:
+                # Refilled when next read rather than now: a refresh re-scores
+                # many records, and a short prefix's refill scans most keys
+                top.remove((-score, object_id))
+                self._dirty.add(prefix)
+
+    async def refill(self):
+        """Refill every head list that lost members, yielding after each scan"""
+        for prefix in list(self._dirty):
+            if prefix in self._dirty:
+                self._refill(prefix)
+                await asyncio.sleep(0)
+
+    def _refill(self, prefix: str):
+        """Recompute a head list so it is an exact top-K again
+
+        Merges the lists of the prefix one letter longer (refilled first when
+        needed) with the objects whose word is the prefix itself, instead of
+        scanning every key under a short prefix.
+        """
+        self._dirty.discard(prefix)
+        if len(prefix) >= MAX_HEAD_LENGTH:
+            top = self._scan(prefix, self.capacity)
+        else:
+            best = {object_id: self._entries[object_id][1] for _, object_id in self._buckets.get(prefix, ())}
+            for child in self._children(prefix):
+                if child in self._dirty:
+                    self._refill(child)
+                for negative_score, object_id in self._heads.get(child, ()):
+                    best[object_id] = -negative_score
+            top = heapq.nsmallest(self.capacity, ((-score, object_id) for object_id, score in best.items()))
+        if top:
+            self._heads[prefix] = top
+        else:
+            self._heads.pop(prefix, None)
+
+    def _children(self, prefix: str):
+        """Distinct prefixes one letter longer than prefix among the indexed words"""
+        length = len(prefix) + 1
+        position = bisect.bisect_left(self._words, prefix)
+        while position < len(self._words) and self._words[position].startswith(prefix):
+            word = self._words[position]
+            if len(word) < length:
+                position += 1
+                continue
+            child = word[:length]
+            yield child
+            position = bisect.bisect_left(self._words, child + "\uffff", position)
+
+    def _touch(self, object_id: str):
+        self.generation += 1
+        self._touched[object_id] = self.generation
+
+
+suggest_index = SuggestIndex(capacity=settings.suggest_top_k)
+
+
+async def load_popularity(db):
+    """Popularity per objectID: playlists a video is in, videos a playlist holds"""
+    popularity = {}
+    async for playlists in db.playlists.iterate({}, projection={"_id": 0, "db_id": 1, "host_ids": 1}):
+        for playlist in playlists:
+            host_ids = playlist.get("host_ids") or []
+            popularity[str(playlist.get("db_id"))] = len(host_ids)
+            for host_id in set(host_ids):
+                popularity[host_id] = popularity.get(host_id, 0) + 1
+    return popularity
+
+
+@track_memory("job:build_suggest_index")
+async def build_suggest_index():
+    """(Re)build the suggest index from MongoDB, refreshing popularity
+
+    As with the local search index, writes that arrive through hooks while
+    the build runs win over the documents read by the build.
+    """
+    db = get_storage()
+    popularity = await load_popularity(db)
+    mark = suggest_index.generation
+    seen = set()
+    async for records in pipeline.iter_batches(related=False):
+        for position, record in enumerate(records, 1):
+            object_id = str(record["objectID"])
+            suggest_index.save(record, score=popularity.get(object_id, 0), unchanged_since=mark)
+            seen.add(object_id)
+            if position % YIELD_EVERY == 0:
+                # Let other requests run during large builds
+                await asyncio.sleep(0)
+    deleted = suggest_index.prune(seen, unchanged_since=mark)
+    # Re-scored records left head lists short; refill them here, not on reads
+    await suggest_index.refill()
+    suggest_index.ready = True
+    return {"objects": len(seen), "deleted": deleted}
+
+
+async def refresh_suggest_index(interval: float):
+    """Rebuild periodically to pick up other workers' writes and popularity changes"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await build_suggest_index()
+        except Exception:
+            logger.exception("Suggest index refresh failed")
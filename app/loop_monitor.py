@@ -0,0 +1,131 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A coroutine wakes up every LOOP_MONITOR_INTERVAL seconds and records how
+late it woke up (the event-loop lag) in a histogram. A watchdog thread
+checks that those wake-ups keep happening; when the loop has not got
+round to one for LOOP_BLOCK_THRESHOLD seconds, something is blocking it,
+and the watchdog captures the loop thread's stack while it is still stuck
+there. The stack is logged and the blocking frame is kept for the status
+endpoint.
+
+Overhead is one timer callback per interval and one thread wake-up per
+half threshold, so it is meant to stay on in production.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from . import config
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+MAX_STACK_FRAMES = 30
+RECENT_BLOCKS = 20
+
+loop_lag = registry.histogram("event_loop_lag_seconds", "How late the event loop runs scheduled callbacks")
+loop_blocks = registry.counter("event_loop_blocked_total", "Times the event loop was blocked past the threshold")
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.recent_blocks = deque(maxlen=RECENT_BLOCKS)
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start monitoring the running loop"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._heartbeat = now
+
+    def _watch(self):
+        reported = None  # heartbeat of the stall already reported
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            self._capture(stalled)
+
+    def _capture(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES)
+        top = traceback.extract_stack(frame, limit=1)[-1]
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)
+            task = current.get_name() if current is not None else None
+        except RuntimeError:
+            pass
+        loop_blocks.inc()
+        self.recent_blocks.append({
+            "at": time.time(),
+            "blocked_for": round(stalled, 3),
+            "task": task,
+            "where": f"{top.filename}:{top.lineno} in {top.name}",
+        })
+        logger.warning(
+            "Event loop blocked for at least %.3f s in task %s:\n%s",
+            stalled, task, "".join(stack)
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "lag": loop_lag.percentiles(),
+            "max_lag": round(self.max_lag, 4),
+            "blocked": loop_blocks.get(),
+            "recent_blocks": list(self.recent_blocks),
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.loop_monitor_interval,
+    threshold=settings.loop_block_threshold,
+)
@@ -1,13 +1,20 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import json
+import logging
 import pathlib
 import os
+from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Optional
 
 
 
-from fastapi import FastAPI, Request, Form, HTTPException, APIRouter, Depends
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, Form, HTTPException, APIRouter, Depends, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from fastapi.openapi.utils import get_openapi
@@ -15,19 +22,37 @@ from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.authentication import requires
 from pydantic.error_wrappers import ValidationError
 from . import config, db, utils
-from .db import get_database
+from .logging_config import RequestIdMiddleware, configure_logging
+from .loop_monitor import loop_monitor
+from .metrics import registry as metrics_registry
+from .memory import MemoryMiddleware, router as memory_router, start_tracing
+from .monitoring import MetricsMiddleware
+from .profiler import ProfileMiddleware, router as profile_router
 from .config import get_settings
 
 settings = get_settings()
+configure_logging(settings.log_level, settings.log_format)
+logger = logging.getLogger(__name__)
 
+from .indexing.hooks import local_index_enabled
+from .indexing.jobs import job_manager
+from .indexing.suggest import build_suggest_index, refresh_suggest_index, suggest_index
 from .indexing.client import (
-    update_index,
+    build_local_index,
+    close_client as close_search_client,
+    get_client as get_search_client,
+    get_search_backend,
+    get_search_status,
     search_index
 )
 
-from .shortcuts import redirect, render, get_object_or_404
+from .cache.base import close_cache
+from .cache.bus import invalidation_bus
+from .handlers import exception_handlers
+from .shortcuts import redirect, render, get_object_or_404, warm_templates
 from .users.backends import JWTCookieBackend
 from .users.decorators import login_required
+from .users.dependencies import require_admin
 from .users.models import User
 from .users import auth
 from .users.schemas import (
@@ -45,10 +70,113 @@ from .playlists.schemas import PlaylistCreateSchema, PlaylistVideoAddSchema
 from .watch_events.models import WatchEvent
 from .watch_events.routers import router as watch_event_router
 from .watch_events.schemas import WatchEventSchema
+from .watch_events import layout
+from .watch_events.buffer import write_buffer
+from .health import router as health_router
 
 DB_SESSION = None
+SUGGEST_REFRESH_TASK = None
 BASE_DIR = pathlib.Path(__file__).resolve().parent # app/
 
+# Cold-start timings in milliseconds, filled in by startup()
+STARTUP_REPORT = {"import_ms": None, "startup_ms": None, "phases": {}}
+startup_phase_seconds = metrics_registry.gauge(
+    "startup_phase_seconds", "Duration of each startup phase of this worker", ("phase",)
+)
+
+
+async def run_phase(name: str, function):
+    """Run one startup phase, recording its duration; failures are logged, not raised"""
+    started = time.perf_counter()
+    try:
+        result = function()
+        if asyncio.iscoroutine(result):
+            result = await result
+    except Exception:
+        logger.exception("Startup phase %s failed", name)
+        result = None
+    seconds = time.perf_counter() - started
+    STARTUP_REPORT["phases"][name] = round(seconds * 1000, 1)
+    startup_phase_seconds.set(seconds, phase=name)
+    return result
+
+
+async def warm_storage():
+    """Open pooled connections and create indexes before the first request needs them"""
+    storage = db.get_storage()
+    # Concurrent pings each check out a connection, so the pool opens several
+    pings = (storage.ping() for _ in range(max(1, settings.startup_warm_connections)))
+    await asyncio.wait_for(asyncio.gather(*pings), timeout=settings.startup_warm_timeout)
+    from .indexing import state
+    await state.ensure_indexes(storage)
+    await layout.ensure_indexes(layout.collection_for(storage, datetime.utcnow()))
+
+
+async def warm_local_index():
+    if local_index_enabled():
+        report = await build_local_index()
+        logger.info("Local search index built (%s objects)", report['pushed'])
+
+
+async def warm_suggest_index():
+    if not settings.suggest_enabled:
+        return
+    report = await build_suggest_index()
+    logger.info("Suggest index built (%s objects)", report['objects'])
+
+
+async def startup():
+    global DB_SESSION, SUGGEST_REFRESH_TASK
+    started = time.perf_counter()
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+    if settings.memory_tracking_enabled:
+        start_tracing()
+    DB_SESSION = db.get_storage()
+    logger.info("Storage backend: %s", settings.storage_backend)
+    await run_phase("storage", warm_storage)
+    await run_phase("invalidation_bus", invalidation_bus.start)
+    if get_search_backend() == "algolia":
+        # one long-lived client instead of one per query
+        await run_phase("search_client", get_search_client)
+    await run_phase("templates", warm_templates)
+    # Both builds mostly wait on the database, so they overlap
+    await asyncio.gather(
+        run_phase("local_index", warm_local_index),
+        run_phase("suggest_index", warm_suggest_index),
+    )
+    if settings.suggest_enabled and settings.suggest_refresh_interval > 0:
+        SUGGEST_REFRESH_TASK = asyncio.create_task(refresh_suggest_index(settings.suggest_refresh_interval))
+    STARTUP_REPORT["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        "Startup complete in %s ms after %s ms of imports: %s",
+        STARTUP_REPORT["startup_ms"], STARTUP_REPORT["import_ms"], STARTUP_REPORT["phases"]
+    )
+
+
+async def shutdown():
+    loop_monitor.stop()
+    if SUGGEST_REFRESH_TASK is not None:
+        SUGGEST_REFRESH_TASK.cancel()
+    # a running index job releases its lease so another worker can take over
+    await job_manager.close()
+    # flush coalesced watch events before the worker exits
+    await write_buffer.close()
+    await close_search_client()
+    # publishes what is still queued before the cache connection goes
+    await invalidation_bus.close()
+    await close_cache()
+    db.close_connection()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
 # Create API routers for different endpoint groups
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 pages_router = APIRouter(tags=["Pages"])
@@ -61,6 +189,8 @@ app = FastAPI(
     title="Video Membership API",
     description="A YouTube-like video membership platform API with authentication, video management, playlists, and watch progress tracking.",
     version="1.0.0",
+    lifespan=lifespan,
+    exception_handlers=exception_handlers,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_tags=[
@@ -88,6 +218,10 @@ app = FastAPI(
             "name": "API",
             "description": "General API endpoints",
         },
+        {
+            "name": "Health",
+            "description": "Liveness and readiness probes",
+        },
     ]
 )
 
@@ -131,17 +265,21 @@ app.add_middleware(
 )
 
 app.add_middleware(AuthenticationMiddleware, backend=JWTCookieBackend())
-
-from .handlers import * # noqa
-
-
-@app.on_event("startup")
-async def on_startup():
-    # triggered when fastapi starts
-    print("hello world")
-    global DB_SESSION
-    DB_SESSION = db.get_database()
-    print("✅ Connected to MongoDB Atlas")
+if settings.admin_token:
+    # outside authentication, inside the request ID it is keyed by
+    app.add_middleware(ProfileMiddleware)
+app.add_middleware(RequestIdMiddleware)
+if settings.memory_tracking_enabled:
+    app.add_middleware(MemoryMiddleware)
+if settings.metrics_enabled:
+    # outermost, so it times the whole middleware stack
+    app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_view():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404)
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 
 # Page endpoints
@@ -208,7 +346,7 @@ async def login_post_view(request: Request,
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.exception("Login error")
         raise HTTPException(status_code=400, detail={"errors": ["An error occurred during login. Please try again."]})
 
 
@@ -224,45 +362,38 @@ async def signup_post_view(request: Request,
     username: str = Form(None, description="User's username")
     ):
     try:
-        print(f"Signup attempt for email: {email}")
-        
         # Basic validation
         if not email or not password or not password_confirm:
-            print("Validation failed: missing required fields")
+            logger.debug("Signup validation failed: missing required fields")
             raise HTTPException(status_code=400, detail={"errors": ["All fields are required."]})
         
         if password != password_confirm:
-            print("Validation failed: passwords do not match")
+            logger.debug("Signup validation failed: passwords do not match")
             raise HTTPException(status_code=400, detail={"errors": ["Passwords do not match."]})
         
-        print("Basic validation passed")
-        
         # Check if user already exists
         try:
             existing_user = await User.by_email(email)
             if existing_user:
-                print(f"User already exists: {email}")
+                logger.debug("Signup for an existing user")
                 raise HTTPException(status_code=400, detail={"errors": ["User with this email already exists."]})
         except Exception as e:
-            print(f"Error checking existing user: {e}")
+            logger.exception("Error checking existing user")
             raise HTTPException(status_code=500, detail={"errors": [f"Database error: {str(e)}"]})
         
-        print("User does not exist, creating new user")
-        
         # Create new user
         try:
             user_obj = await User.create_user(email=email, password=password, username=username)
-            print(f"User created successfully: {user_obj.email}")
+            logger.info("User created", extra={"user_id": user_obj.user_id})
         except Exception as e:
-            print(f"Error creating user: {e}")
+            logger.exception("Error creating user")
             raise HTTPException(status_code=500, detail={"errors": [f"Error creating user: {str(e)}"]})
         
         # Generate session token
         try:
             session_id = auth.login(user_obj)
-            print("Session token generated")
         except Exception as e:
-            print(f"Error generating session token: {e}")
+            logger.exception("Error generating session token")
             raise HTTPException(status_code=500, detail={"errors": [f"Error generating session: {str(e)}"]})
         
         from fastapi.responses import JSONResponse
@@ -287,15 +418,12 @@ async def signup_post_view(request: Request,
             max_age=settings.session_duration
         )
         
-        print("Signup successful, returning response")
         return response
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected signup error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected signup error")
         raise HTTPException(status_code=500, detail={"errors": [f"Unexpected error: {str(e)}"]})
 
 
@@ -321,8 +449,7 @@ async def get_current_user(request: Request):
     try:
         # Check if user object has required attributes
         if not hasattr(request.user, 'user_id') or not hasattr(request.user, 'email') or not hasattr(request.user, 'username'):
-            print(f"User object missing required attributes: {type(request.user)}")
-            print(f"Available attributes: {dir(request.user)}")
+            logger.error("User object missing required attributes: %s", type(request.user))
             raise HTTPException(status_code=500, detail={"error": "Invalid user object"})
         
         return {
@@ -334,9 +461,7 @@ async def get_current_user(request: Request):
             }
         }
     except Exception as e:
-        print(f"Error in get_current_user: {e}")
-        print(f"User object type: {type(request.user)}")
-        print(f"User object attributes: {dir(request.user)}")
+        logger.exception("Error in get_current_user (user object type %s)", type(request.user))
         raise HTTPException(status_code=500, detail={"error": f"Authentication error: {str(e)}"})
 
 
@@ -349,18 +474,47 @@ async def get_current_user(request: Request):
 
 # Utility endpoints
 @api_router.post('/update-index', response_class=HTMLResponse)
-async def htmx_update_index_view(request:Request):
-    count = await update_index()
-    return HTMLResponse(f"({count}) Refreshed")
+async def htmx_update_index_view(request:Request, full: bool = False):
+    job, created = await job_manager.submit(full=full)
+    status = "started" if created else "already running"
+    return HTMLResponse(f"Indexing job {job.job_id} {status}", status_code=202)
+
+
+@api_router.get("/index-jobs", summary="List Index Jobs", description="Recent background indexing jobs")
+async def index_job_list_view(request: Request):
+    return {"jobs": [job.as_data() for job in await job_manager.list()]}
+
+
+@api_router.get("/index-jobs/{job_id}", summary="Get Index Job", description="Phase, progress, rate and ETA of an indexing job")
+async def index_job_detail_view(request: Request, job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Job not found"})
+    return job.as_data()
+
+
+@api_router.delete(
+    "/index-jobs/{job_id}",
+    summary="Cancel Index Job",
+    description="Cancel a running indexing job",
+    dependencies=[Depends(require_admin)]
+)
+async def index_job_cancel_view(request: Request, job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Job not found"})
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail={"error": f"Job is already {job.phase}"})
+    return {"message": "Job cancellation requested", "job_id": job_id}
 
 
 @api_router.get("/search", response_class=HTMLResponse)
-def search_detail_view(request:Request, q:Optional[str] = None):
+async def search_detail_view(request:Request, q:Optional[str] = None):
     query = None
     context = {}
     if q is not None:
         query = q
-        results = search_index(query)
+        results = await search_index(query)
         hits = results.get('hits') or []
         num_hits = results.get('nbHits')
         context = {
@@ -371,6 +525,49 @@ def search_detail_view(request:Request, q:Optional[str] = None):
     return render(request, "search/detail.html", context)
 
 
+@api_router.get("/search/suggest", summary="Search Suggestions", description="Most popular videos and playlists with a title word starting with q")
+async def search_suggest_view(
+    request: Request, q: Optional[str] = None, limit: int = Query(10, ge=1, le=settings.suggest_top_k)
+):
+    if not settings.suggest_enabled:
+        raise HTTPException(status_code=404, detail={"error": "Suggestions are disabled"})
+    return {
+        "query": q or "",
+        "ready": suggest_index.ready,
+        "suggestions": suggest_index.suggest(q or "", limit=limit)
+    }
+
+
+@api_router.get(
+    "/loop/status",
+    summary="Event Loop Status",
+    description="Event-loop lag percentiles and recent blocking calls",
+    dependencies=[Depends(require_admin)]
+)
+async def loop_status_view(request: Request):
+    return loop_monitor.get_stats()
+
+
+@api_router.get(
+    "/startup/status",
+    summary="Startup Report",
+    description="Import and startup phase durations of this worker, in milliseconds",
+    dependencies=[Depends(require_admin)]
+)
+async def startup_status_view(request: Request):
+    return STARTUP_REPORT
+
+
+@api_router.get(
+    "/search/status",
+    summary="Search Backend Status",
+    description="Search backend, circuit breaker state and cache counters",
+    dependencies=[Depends(require_admin)]
+)
+async def search_status_view(request: Request):
+    return get_search_status()
+
+
 # Include all routers (after all endpoints are defined)
 app.include_router(auth_router)
 app.include_router(pages_router)
@@ -378,3 +575,9 @@ app.include_router(api_router)
 app.include_router(playlist_router)
 app.include_router(video_router)
 app.include_router(watch_event_router)
+app.include_router(health_router)
+app.include_router(profile_router)
+app.include_router(memory_router)
+
+
+STARTUP_REPORT["import_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
@@ -0,0 +1,254 @@
+"""
+Memory instrumentation with tracemalloc.
+
+With MEMORY_TRACKING_ENABLED, tracemalloc traces every allocation and each
+request and background job is measured:
+
+- peak: the highest traced memory while it ran, above what was traced when
+  it started; roughly how much it allocated at once,
+- retained: traced memory at its end minus at its start; positive values
+  that keep showing up are garbage kept alive or leaks.
+
+tracemalloc only has one process-wide peak. It is read and reset whenever
+a measurement starts or ends and folded into every active measurement, so
+each peak covers exactly its own lifetime, but requests running at the
+same time share it; those measurements are counted as overlapped.
+
+Tracing makes allocations noticeably slower, so this is an instrumentation
+mode for staging or one canary worker, not a default.
+
+The admin endpoints take tracemalloc snapshots and diff them, grouped by
+line or traceback (MEMORY_TRACE_FRAMES frames deep). Taking a snapshot
+starts tracing if it is not on yet.
+"""
+import asyncio
+import itertools
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from . import config
+from .metrics import registry
+from .monitoring import route_label
+from .users.dependencies import require_admin
+
+settings = config.get_settings()
+
+MAX_SNAPSHOTS = 4  # snapshots hold every trace, keep few
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+memory_peak = registry.histogram(
+    "memory_peak_bytes", "Peak traced memory above the start of a request or job", ("target",)
+)
+
+router = APIRouter(prefix="/api/memory", tags=["API"], dependencies=[Depends(require_admin)])
+
+
+class _Measurement:
+    __slots__ = ("start", "peak", "overlapped")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+        self.overlapped = False
+
+
+class MemoryTracker:
+    def __init__(self):
+        self.targets = {}  # target -> totals
+        self._active = set()
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _fold_peak(self):
+        _, peak = tracemalloc.get_traced_memory()
+        for measurement in self._active:
+            if peak > measurement.peak:
+                measurement.peak = peak
+        tracemalloc.reset_peak()
+
+    def begin(self):
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            self._fold_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            measurement = _Measurement(current)
+            if self._active:
+                measurement.overlapped = True
+                for other in self._active:
+                    other.overlapped = True
+            self._active.add(measurement)
+        return measurement
+
+    def end(self, measurement, target: str):
+        if measurement is None:
+            return
+        with self._lock:
+            if tracemalloc.is_tracing():
+                self._fold_peak()
+                current, _ = tracemalloc.get_traced_memory()
+            else:
+                current = measurement.start
+            self._active.discard(measurement)
+            peak = measurement.peak - measurement.start
+            totals = self.targets.get(target)
+            if totals is None:
+                totals = self.targets[target] = {"count": 0, "overlapped": 0, "peak_max": 0, "retained": 0}
+            totals["count"] += 1
+            totals["overlapped"] += measurement.overlapped
+            totals["peak_max"] = max(totals["peak_max"], peak)
+            totals["retained"] += current - measurement.start
+        memory_peak.observe(peak, target=target)
+
+    @contextmanager
+    def track(self, target: str):
+        measurement = self.begin()
+        try:
+            yield
+        finally:
+            self.end(measurement, target)
+
+    def get_stats(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        targets = {}
+        for target, totals in sorted(self.targets.items()):
+            targets[target] = {
+                **totals,
+                "retained_avg": round(totals["retained"] / totals["count"]),
+                "peak": memory_peak.percentiles(target=target),
+            }
+        return {
+            "tracing": self.tracing,
+            "traced_current": current,
+            "traced_peak": peak,
+            "targets": targets,
+        }
+
+
+memory_tracker = MemoryTracker()
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.memory_trace_frames)
+
+
+def track_memory(target: str):
+    """Decorator measuring an async function, e.g. a background job"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with memory_tracker.track(target):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MemoryMiddleware:
+    """Pure ASGI middleware measuring peak and retained memory per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        measurement = memory_tracker.begin()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            memory_tracker.end(measurement, f"{scope['method']} {route_label(scope, status_code)}")
+
+
+_snapshots = OrderedDict()  # id -> (taken_at, snapshot)
+_snapshot_ids = itertools.count(1)
+
+
+def _snapshot_data(snapshot_id: int) -> dict:
+    taken_at, snapshot = _snapshots[snapshot_id]
+    return {"id": snapshot_id, "taken_at": taken_at, "traces": len(snapshot.traces)}
+
+
+@router.get("", summary="Memory Status", description="Traced memory and per-route and per-job peak and retained bytes")
+async def memory_status_view():
+    return memory_tracker.get_stats()
+
+
+@router.post("/snapshots", summary="Take Memory Snapshot", description="Take a tracemalloc snapshot, starting tracing if needed")
+async def memory_snapshot_create_view():
+    if not tracemalloc.is_tracing():
+        start_tracing()
+        return {"tracing_started": True, "message": "Tracing started; take snapshots once the workload has run"}
+    snapshot = await asyncio.to_thread(lambda: tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS))
+    snapshot_id = next(_snapshot_ids)
+    _snapshots[snapshot_id] = (time.time(), snapshot)
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+    return _snapshot_data(snapshot_id)
+
+
+@router.get("/snapshots", summary="List Memory Snapshots")
+async def memory_snapshot_list_view():
+    return {"snapshots": [_snapshot_data(snapshot_id) for snapshot_id in _snapshots]}
+
+
+@router.get("/snapshots/{snapshot_id}/diff", summary="Diff Memory Snapshots",
+            description="Allocation growth since the base snapshot (default: the one before)")
+async def memory_snapshot_diff_view(snapshot_id: int, base: int = None, group_by: str = "lineno", limit: int = 25):
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail={"error": "group_by must be lineno, filename or traceback"})
+    if base is None:
+        earlier = [key for key in _snapshots if key < snapshot_id]
+        base = earlier[-1] if earlier else None
+    if snapshot_id not in _snapshots or base not in _snapshots:
+        raise HTTPException(status_code=404, detail={"error": "Snapshot not found"})
+    snapshot = _snapshots[snapshot_id][1]
+    base_snapshot = _snapshots[base][1]
+    stats = await asyncio.to_thread(snapshot.compare_to, base_snapshot, group_by)
+    return {
+        "snapshot": snapshot_id,
+        "base": base,
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "top": [
+            {
+                "where": stat.traceback.format(most_recent_first=True),
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:max(limit, 1)]
+        ],
+    }
+
+
+@router.delete("/snapshots", summary="Clear Memory Snapshots",
+               description="Drop snapshots; stops tracing unless MEMORY_TRACKING_ENABLED")
+async def memory_snapshot_clear_view():
+    _snapshots.clear()
+    if not settings.memory_tracking_enabled:
+        tracemalloc.stop()
+    return {"tracing": tracemalloc.is_tracing()}
@@ -0,0 +1,271 @@
+"""
+Dependency-free in-process metrics.
+
+Counters, gauges and latency histograms live in one registry that renders
+the Prometheus text format for `/metrics`. Histograms use HDR-style
+log-linear buckets (a bucket per 1/32 of every power of two, about 3%
+relative error) so percentiles cost a few dict updates per observation
+regardless of the latency range. Percentiles cover a sliding window of the
+last one to two `window` periods; `_sum` and `_count` are cumulative.
+
+Request metrics are recorded by `app.monitoring.MetricsMiddleware`.
+Values owned by other modules (queue depths, breaker state) are exported
+with `set_function`, which is called at scrape time instead of on every
+change.
+"""
+import math
+import threading
+import time
+
+from app import config
+
+settings = config.get_settings()
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function):
+        """Read the value(s) from `function()` at scrape time
+
+        The function returns a number, or for labelled metrics a dict of
+        label-value tuples to numbers.
+        """
+        self._function = function
+        return self
+
+    def samples(self):
+        """(suffix, label values, extra label, value) tuples"""
+        values = self._function() if self._function is not None else dict(self._values)
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            yield "", key, "", value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+def bucket_index(value: float) -> int:
+    if value <= 0:
+        return -(1 << 30)
+    mantissa, exponent = math.frexp(value)  # mantissa in [0.5, 1)
+    return exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def bucket_upper_bound(index: int) -> float:
+    exponent, sub_bucket = divmod(index, SUB_BUCKETS)
+    return math.ldexp(0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS), exponent)
+
+
+class _HistogramSeries:
+    def __init__(self):
+        self.current = {}
+        self.previous = {}
+        self.rotated_at = time.monotonic()
+        self.count = 0
+        self.sum = 0.0
+
+    def rotate(self, window: float):
+        now = time.monotonic()
+        if now - self.rotated_at < window:
+            return
+        # Drop both periods if nothing was observed for two windows
+        self.previous = self.current if now - self.rotated_at < 2 * window else {}
+        self.current = {}
+        self.rotated_at = now
+
+    def quantiles(self, quantiles):
+        merged = dict(self.previous)
+        for index, count in self.current.items():
+            merged[index] = merged.get(index, 0) + count
+        total = sum(merged.values())
+        if not total:
+            return {q: math.nan for q in quantiles}
+        results = {}
+        ordered = sorted(merged.items())
+        seen = 0
+        position = 0
+        for q in sorted(quantiles):
+            rank = q * total
+            while position < len(ordered) and seen + ordered[position][1] < rank:
+                seen += ordered[position][1]
+                position += 1
+            index = ordered[min(position, len(ordered) - 1)][0]
+            results[q] = bucket_upper_bound(index)
+        return results
+
+
+class Histogram(Metric):
+    """Latency distribution, exported as a Prometheus summary"""
+    kind = "summary"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), window: float = None,
+                 quantiles=QUANTILES):
+        super().__init__(name, documentation, labelnames)
+        self.window = window or settings.metrics_window
+        self.quantiles_reported = tuple(quantiles)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bucket_index(value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = _HistogramSeries()
+            series.rotate(self.window)
+            series.current[index] = series.current.get(index, 0) + 1
+            series.count += 1
+            series.sum += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def percentiles(self, **labels):
+        series = self._values.get(self._key(labels))
+        if series is None:
+            return {}
+        with self._lock:
+            series.rotate(self.window)
+            return series.quantiles(self.quantiles_reported)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+            for _, series in items:
+                series.rotate(self.window)
+            snapshot = [
+                (key, series.quantiles(self.quantiles_reported), series.sum, series.count)
+                for key, series in items
+            ]
+        for key, quantiles, total, count in snapshot:
+            for q, value in quantiles.items():
+                yield "", key, f'quantile="{q}"', value
+            yield "_sum", key, "", total
+            yield "_count", key, "", count
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        full_name = f"{self.prefix}{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, documentation, labelnames, **kwargs)
+        if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {full_name} is already registered with another type or labels")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), **kwargs) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, **kwargs)
+
+    def get(self, name: str):
+        return self._metrics.get(f"{self.prefix}{name}")
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                lines.append(f"# {name} collection failed: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, key, extra, value in samples:
+                labels = _format_labels(metric.labelnames, key, extra)
+                lines.append(f"{name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(prefix="video_membership_")
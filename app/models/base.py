@@ -2,7 +2,7 @@
 Base MongoDB model for the application
 """
 from datetime import datetime
-from typing import Optional, Any, Dict
+from typing import Any, ClassVar, Dict, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -28,6 +28,8 @@ class PyObjectId(ObjectId):
 
 
 class BaseMongoModel(BaseModel):
+    collection_name: ClassVar[str] = ""  # storage collection holding this model
+
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,69 +1,117 @@
 """
-Datadog monitoring utilities for the video membership application.
+Monitoring utilities for the video membership application.
+
+Everything is recorded in the in-process registry (`app.metrics`, served at
+`/metrics`). Datadog is an optional exporter: with STATSD_ENABLED the same
+events are aggregated by `app.statsd_client` and flushed to the DogStatsD
+agent. Tags are limited to low-cardinality values; per-user or per-object
+IDs belong in logs, not metric tags.
 """
-import os
+import asyncio
 import time
 import logging
 from functools import wraps
 from typing import Optional, Dict, Any
-from datadog import statsd
-from ddtrace import tracer
+
+from .metrics import registry
+from .statsd_client import statsd_client
 
 logger = logging.getLogger(__name__)
 
-# Initialize Datadog if not already done
+# Optional Datadog tracing
 try:
-    from datadog import initialize
-    initialize(
-        api_key=os.getenv('DD_API_KEY'),
-        site=os.getenv('DD_SITE', 'datadoghq.com')
-    )
-except Exception as e:
-    logger.warning(f"Failed to initialize Datadog: {e}")
+    from ddtrace import tracer
+except ImportError:
+    tracer = None
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status class",
+    ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method",
+    ("method", "route")
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+function_calls = registry.counter("function_calls_total", "Tracked function calls", ("function", "status"))
+function_duration = registry.histogram(
+    "function_duration_seconds", "Tracked function latency", ("function",)
+)
+database_operations = registry.counter(
+    "database_operations_total", "Database operations", ("operation", "collection", "status")
+)
+database_duration = registry.histogram(
+    "database_operation_duration_seconds", "Database operation latency", ("operation", "collection")
+)
+events = registry.counter("events_total", "Business events", ("event",))
+logins = registry.counter("user_logins_total", "Login attempts", ("status",))
+watch_events = registry.counter("watch_events_total", "Watch events", ("event_type",))
+process_gauges = registry.gauge("process", "Process resource usage", ("resource",))
+
+
+RESULT_BUCKETS = ((0, '0'), (1, '1'), (10, '2-10'), (100, '11-100'))
+
+
+def results_bucket(count: int) -> str:
+    """Bounded tag value for a result count"""
+    for upper, label in RESULT_BUCKETS:
+        if count <= upper:
+            return label
+    return '100+'
+
+
+def _dd_increment(metric: str, tags: Optional[Dict[str, str]] = None):
+    statsd_client.increment(metric, tags=tags)
+
+
+def _dd_timing(metric: str, value: float, tags: Optional[Dict[str, str]] = None):
+    statsd_client.timing(metric, value, tags=tags)
+
+
+def _dd_gauge(metric: str, value: float):
+    statsd_client.gauge(metric, value)
+
 
 def track_metrics(func_name: str, tags: Optional[Dict[str, str]] = None):
     """
     Decorator to track custom metrics for function execution.
-    
+
     Args:
         func_name: Name of the function for metrics
         tags: Additional tags for the metrics
     """
+    def record(status: str, start_time: float):
+        duration = time.perf_counter() - start_time
+        function_calls.inc(function=func_name, status=status)
+        function_duration.observe(duration, function=func_name)
+        _dd_increment(f'video_membership.{func_name}.{status}', tags)
+        _dd_timing(f'video_membership.{func_name}.duration', duration * 1000, tags)
+
     def decorator(func):
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
-            start_time = time.time()
-            metric_tags = tags or {}
-            
+            start_time = time.perf_counter()
             try:
                 result = await func(*args, **kwargs)
-                statsd.increment(f'video_membership.{func_name}.success', tags=metric_tags)
-                return result
             except Exception as e:
-                statsd.increment(f'video_membership.{func_name}.error', tags=metric_tags)
+                record('error', start_time)
                 logger.error(f"Error in {func_name}: {e}")
                 raise
-            finally:
-                duration = (time.time() - start_time) * 1000  # Convert to milliseconds
-                statsd.timing(f'video_membership.{func_name}.duration', duration, tags=metric_tags)
-        
+            record('success', start_time)
+            return result
+
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            start_time = time.time()
-            metric_tags = tags or {}
-            
+            start_time = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
-                statsd.increment(f'video_membership.{func_name}.success', tags=metric_tags)
-                return result
             except Exception as e:
-                statsd.increment(f'video_membership.{func_name}.error', tags=metric_tags)
+                record('error', start_time)
                 logger.error(f"Error in {func_name}: {e}")
                 raise
-            finally:
-                duration = (time.time() - start_time) * 1000  # Convert to milliseconds
-                statsd.timing(f'video_membership.{func_name}.duration', duration, tags=metric_tags)
-        
+            record('success', start_time)
+            return result
+
         # Return appropriate wrapper based on function type
         if asyncio.iscoroutinefunction(func):
             return async_wrapper
@@ -73,120 +121,126 @@ def track_metrics(func_name: str, tags: Optional[Dict[str, str]] = None):
 
 def track_user_registration(user_id: str, email: str):
     """Track user registration metrics"""
-    statsd.increment('video_membership.users.registered', tags={
-        'user_id': user_id,
+    events.inc(event='user_registered')
+    _dd_increment('video_membership.users.registered', tags={
         'email_domain': email.split('@')[1] if '@' in email else 'unknown'
     })
     logger.info(f"User registered: {user_id}")
 
 def track_user_login(user_id: str, success: bool):
     """Track user login metrics"""
+    logins.inc(status='success' if success else 'failed')
     if success:
-        statsd.increment('video_membership.users.login.success')
+        _dd_increment('video_membership.users.login.success')
     else:
-        statsd.increment('video_membership.users.login.failed')
-    
+        _dd_increment('video_membership.users.login.failed')
+
     logger.info(f"User login attempt: {user_id}, success: {success}")
 
 def track_video_views(video_id: str, user_id: str, video_title: str):
     """Track video view metrics"""
-    statsd.increment('video_membership.videos.views', tags={
-        'video_id': video_id,
-        'user_id': user_id
-    })
+    events.inc(event='video_viewed')
+    _dd_increment('video_membership.videos.views')
     logger.info(f"Video viewed: {video_id} by user {user_id}")
 
 def track_course_enrollments(course_id: str, user_id: str, course_title: str):
     """Track course enrollment metrics"""
-    statsd.increment('video_membership.courses.enrolled', tags={
-        'course_id': course_id,
-        'user_id': user_id
-    })
+    events.inc(event='course_enrolled')
+    _dd_increment('video_membership.courses.enrolled')
     logger.info(f"Course enrolled: {course_id} by user {user_id}")
 
 def track_playlist_creation(playlist_id: str, user_id: str, playlist_title: str):
     """Track playlist creation metrics"""
-    statsd.increment('video_membership.playlists.created', tags={
-        'playlist_id': playlist_id,
-        'user_id': user_id
-    })
+    events.inc(event='playlist_created')
+    _dd_increment('video_membership.playlists.created')
     logger.info(f"Playlist created: {playlist_id} by user {user_id}")
 
 def track_database_operation(operation_name: str, collection: str, duration_ms: float, success: bool):
     """Track database operation metrics"""
+    status = 'success' if success else 'error'
+    database_operations.inc(operation=operation_name, collection=collection, status=status)
+    database_duration.observe(duration_ms / 1000, operation=operation_name, collection=collection)
+
     tags = {
         'operation': operation_name,
         'collection': collection,
-        'status': 'success' if success else 'error'
+        'status': status
     }
-    
-    statsd.timing(f'video_membership.database.{operation_name}.duration', duration_ms, tags=tags)
-    statsd.increment(f'video_membership.database.{operation_name}.count', tags=tags)
-    
+    _dd_timing(f'video_membership.database.{operation_name}.duration', duration_ms, tags)
+    _dd_increment(f'video_membership.database.{operation_name}.count', tags)
+
     if not success:
-        statsd.increment('video_membership.database.errors', tags=tags)
+        _dd_increment('video_membership.database.errors', tags)
 
 def track_api_request(endpoint: str, method: str, status_code: int, duration_ms: float):
     """Track API request metrics"""
+    status_class = f"{status_code // 100}xx"
+    http_requests.inc(method=method, route=endpoint, status=status_class)
+    http_request_duration.observe(duration_ms / 1000, method=method, route=endpoint)
+
+    if not statsd_client.enabled:
+        return
     tags = {
         'endpoint': endpoint,
         'method': method,
         'status_code': str(status_code),
-        'status_class': f"{status_code // 100}xx"
+        'status_class': status_class
     }
-    
-    statsd.increment('video_membership.api.requests', tags=tags)
-    statsd.timing('video_membership.api.request.duration', duration_ms, tags=tags)
-    
+    _dd_increment('video_membership.api.requests', tags)
+    _dd_timing('video_membership.api.request.duration', duration_ms, tags)
+
     if status_code >= 400:
-        statsd.increment('video_membership.api.errors', tags=tags)
+        _dd_increment('video_membership.api.errors', tags)
 
 def track_search_queries(query: str, results_count: int, user_id: str):
     """Track search query metrics"""
-    statsd.increment('video_membership.search.queries', tags={
-        'user_id': user_id,
-        'results_count': str(results_count)
+    events.inc(event='search_query')
+    _dd_increment('video_membership.search.queries', tags={
+        'results': results_bucket(results_count)
     })
     logger.info(f"Search query: '{query}' by user {user_id}, results: {results_count}")
 
 def track_watch_events(event_type: str, video_id: str, user_id: str, timestamp: int):
     """Track video watch events"""
-    statsd.increment('video_membership.watch_events', tags={
-        'event_type': event_type,
-        'video_id': video_id,
-        'user_id': user_id
+    watch_events.inc(event_type=event_type)
+    _dd_increment('video_membership.watch_events', tags={
+        'event_type': event_type
     })
     logger.info(f"Watch event: {event_type} for video {video_id} by user {user_id}")
 
-@tracer.wrap(service='video-membership', resource='database_query')
 def track_database_query(operation: str, collection: str):
     """Track database queries with tracing"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 result = await func(*args, **kwargs)
-                duration = (time.time() - start_time) * 1000
+                duration = (time.perf_counter() - start_time) * 1000
                 track_database_operation(operation, collection, duration, True)
                 return result
             except Exception as e:
-                duration = (time.time() - start_time) * 1000
+                duration = (time.perf_counter() - start_time) * 1000
                 track_database_operation(operation, collection, duration, False)
                 raise
         return wrapper
     return decorator
 
+if tracer is not None:
+    track_database_query = tracer.wrap(service='video-membership', resource='database_query')(track_database_query)
+
 def track_memory_usage():
     """Track application memory usage"""
     try:
         import psutil
         process = psutil.Process()
         memory_info = process.memory_info()
-        
-        statsd.gauge('video_membership.memory.rss', memory_info.rss)
-        statsd.gauge('video_membership.memory.vms', memory_info.vms)
-        statsd.gauge('video_membership.memory.percent', process.memory_percent())
+
+        process_gauges.set(memory_info.rss, resource='memory_rss_bytes')
+        process_gauges.set(memory_info.vms, resource='memory_vms_bytes')
+        _dd_gauge('video_membership.memory.rss', memory_info.rss)
+        _dd_gauge('video_membership.memory.vms', memory_info.vms)
+        _dd_gauge('video_membership.memory.percent', process.memory_percent())
     except ImportError:
         logger.warning("psutil not available for memory tracking")
 
@@ -196,8 +250,9 @@ def track_cpu_usage():
         import psutil
         process = psutil.Process()
         cpu_percent = process.cpu_percent()
-        
-        statsd.gauge('video_membership.cpu.percent', cpu_percent)
+
+        process_gauges.set(cpu_percent, resource='cpu_percent')
+        _dd_gauge('video_membership.cpu.percent', cpu_percent)
     except ImportError:
         logger.warning("psutil not available for CPU tracking")
 
@@ -207,7 +262,7 @@ def get_health_metrics() -> Dict[str, Any]:
     try:
         import psutil
         process = psutil.Process()
-        
+
         return {
             'memory_usage': process.memory_percent(),
             'cpu_usage': process.cpu_percent(),
@@ -218,3 +273,45 @@ def get_health_metrics() -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error getting health metrics: {e}")
         return {'status': 'unhealthy', 'error': str(e)}
+
+
+def route_label(scope, status_code: int) -> str:
+    """Path template of the matched route, never the raw path"""
+    path = getattr(scope.get("route"), "path", None)
+    if path:
+        return path
+    return "<unmatched>" if status_code == 404 else "<other>"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status classes and in-flight requests
+
+    Labels use route templates ("/videos/{host_id}"), so their cardinality
+    is bounded by the number of routes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            track_api_request(
+                route_label(scope, status_code), scope["method"], status_code,
+                (time.perf_counter() - started) * 1000
+            )
@@ -3,11 +3,15 @@ import uuid
 from typing import List, Optional
 from pydantic import Field
 from app.models.base import BaseMongoModel, PyObjectId
-from app.db import get_database
+from app.cache.bus import invalidation_bus
+from app.db import get_storage
+from app.indexing import hooks
 from app.videos.models import Video
 
 
 class Playlist(BaseMongoModel):
+    collection_name = "playlists"
+
     db_id: str = Field(default_factory=lambda: str(uuid.uuid1()))
     user_id: str = Field(...)
     updated: datetime = Field(default_factory=datetime.utcnow)
@@ -43,30 +47,33 @@ class Playlist(BaseMongoModel):
         self.updated_at = datetime.utcnow()
         
         # Update in database
-        db = get_database()
-        await db.playlists.update_one(
+        db = get_storage()
+        await db.playlists.update(
             {"_id": self.id},
             {"$set": {"host_ids": self.host_ids, "updated": self.updated, "updated_at": self.updated_at}}
         )
+        await hooks.playlist_saved(self)
+        await invalidation_bus.publish("playlists", [self.db_id])
         
         return True
 
     async def get_videos(self):
         """Get videos in this playlist"""
-        videos = []
-        for host_id in self.host_ids:
-            try:
-                video_obj = await Video.get_by_host_id(host_id)
-            except:
-                video_obj = None
-            if video_obj is not None:
-                videos.append(video_obj)
-        return videos
+        return await Video.get_many_by_host_ids(self.host_ids)
+
+    async def delete(self):
+        """Delete the playlist from database"""
+        db = get_storage()
+        deleted = await db.playlists.delete({"db_id": self.db_id})
+        if deleted:
+            await hooks.object_deleted(self.db_id, "Playlist")
+            await invalidation_bus.publish("playlists", [self.db_id])
+        return deleted > 0
 
     @classmethod
     async def create_playlist(cls, user_id: str, title: str, host_ids: List[str] = None):
         """Create a new playlist"""
-        db = get_database()
+        db = get_storage()
         
         playlist_data = {
             "db_id": str(uuid.uuid1()),
@@ -78,19 +85,15 @@ class Playlist(BaseMongoModel):
         playlist = cls(**playlist_data)
         
         # Save to database
-        result = await db.playlists.insert_one(playlist.to_mongo())
-        playlist.id = result.inserted_id
+        playlist.id = await db.playlists.insert(playlist.to_mongo())
+        await hooks.playlist_saved(playlist)
+        await invalidation_bus.publish("playlists", [playlist.db_id])
         
         return playlist
 
     @classmethod
     async def get_by_user_id(cls, user_id: str):
         """Get playlists by user_id"""
-        db = get_database()
-        cursor = db.playlists.find({"user_id": user_id})
-        playlists = []
-        
-        async for playlist_data in cursor:
-            playlists.append(cls(**playlist_data))
-        
-        return playlists
\ No newline at end of file
+        db = get_storage()
+        documents = await db.playlists.find_many({"user_id": user_id})
+        return [cls(**playlist_data) for playlist_data in documents]
\ No newline at end of file
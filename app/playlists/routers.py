@@ -4,7 +4,7 @@ from fastapi.security import HTTPBearer
 
 from app import utils
 from app.shortcuts import get_object_or_404
-from app.db import get_database
+from app.db import get_storage
 
 
 from app.watch_events.models import WatchEvent
@@ -49,10 +49,9 @@ router = APIRouter(
 @router.get("/api/playlists", summary="Get All Playlists", description="Retrieve a list of all playlists")
 async def api_playlist_list_view(request: Request):
     # Get playlists from MongoDB - public endpoint (no authentication required)
-    db = get_database()
-    cursor = db.playlists.find({}).limit(100)
+    documents = await get_storage().playlists.find_many({}, limit=100)
     playlists = []
-    async for playlist_data in cursor:
+    for playlist_data in documents:
         # Convert ObjectId to string for Pydantic model
         playlist_data['id'] = str(playlist_data['_id'])
         del playlist_data['_id']
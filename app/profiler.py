@@ -0,0 +1,241 @@
+"""
+On-demand sampling profiler.
+
+A sampler thread reads the stacks of the running threads with
+`sys._current_frames()` every interval and counts identical stacks. The
+result is returned in the collapsed-stack format read by flamegraph.pl,
+speedscope and inferno ("frame;frame;frame count" per line), where count
+is in sampling intervals.
+
+Two ways to use it, both gated by the X-Admin-Token header:
+
+- GET /api/profile?seconds=N samples every thread of the process for N
+  seconds.
+- A request sent with "X-Profile: 1" is profiled from the outermost
+  middleware down. Only samples where that request's task is on the loop
+  are counted; while the task is suspended the sample records where it
+  awaits, ending in a "<waiting>" frame, so time spent on MongoDB or
+  Algolia shows up too. Endpoints run in the threadpool appear as waiting.
+  The response carries X-Profile-Id; the profile is then served by
+  GET /api/profile/requests/{id}.
+
+Nothing runs while no profile is being taken: the sampler thread only
+exists during a profile and the middleware is only installed when
+ADMIN_TOKEN is set.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from . import config
+from .logging_config import request_id_var
+from .users.dependencies import ADMIN_TOKEN_HEADER, is_admin_token, require_admin
+
+settings = config.get_settings()
+
+MAX_DEPTH = 128
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+REQUEST_PROFILES = 20  # recent per-request profiles kept
+WAITING = "<waiting>"
+
+router = APIRouter(prefix="/api/profile", tags=["API"], dependencies=[Depends(require_admin)])
+
+_request_profiles = OrderedDict()  # request id -> profile
+_process_profile_lock = asyncio.Lock()
+
+
+@lru_cache(maxsize=4096)
+def code_label(code) -> str:
+    path = code.co_filename.replace("\\", "/")
+    return f"{code.co_name} ({'/'.join(path.rsplit('/', 2)[-2:])}:{code.co_firstlineno})"
+
+
+def frame_stack(frame) -> list:
+    """Labels of frame and its callers, outermost first"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(code_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def await_stack(coro) -> list:
+    """Labels of a suspended coroutine and the coroutines it awaits, outermost first"""
+    labels = []
+    while coro is not None and len(labels) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(code_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    labels.append(WAITING)
+    return labels
+
+
+def collapse(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+class Sampler:
+    """Samples every thread, or only one task of an event loop when task is given"""
+
+    def __init__(self, interval: float, loop=None, task=None):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._loop = loop
+        self._task = task
+        self._loop_thread_id = threading.get_ident() if task is not None else None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.stacks
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            # While another thread holds the GIL the sampler wakes late, so
+            # weigh each sample by the intervals elapsed since the last one;
+            # CPU-bound stacks would be undercounted otherwise.
+            now = time.perf_counter()
+            weight = max(round((now - last) / self.interval), 1)
+            last = now
+            if self._task is not None:
+                self._sample_task(weight)
+            else:
+                self._sample_threads(weight)
+            self.samples += 1
+
+    def _sample_threads(self, weight: int):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = [names.get(ident, str(ident))] + frame_stack(frame)
+            self.stacks[";".join(stack)] += weight
+
+    def _sample_task(self, weight: int):
+        try:
+            running = asyncio.current_task(self._loop) is self._task
+        except RuntimeError:
+            return
+        if running:
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = frame_stack(frame)
+        else:
+            stack = await_stack(self._task.get_coro())
+        if stack:
+            self.stacks[";".join(stack)] += weight
+
+
+async def profile_process(seconds: float, interval: float) -> Counter:
+    sampler = Sampler(interval)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stacks = sampler.stop()
+    return stacks
+
+
+def save_request_profile(profile_id: str, profile: dict):
+    _request_profiles[profile_id] = profile
+    _request_profiles.move_to_end(profile_id)
+    while len(_request_profiles) > REQUEST_PROFILES:
+        _request_profiles.popitem(last=False)
+
+
+class ProfileMiddleware:
+    """Pure ASGI middleware profiling requests sent with X-Profile: 1 and a valid X-Admin-Token"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id = request_id_var.get()
+        if profile_id == "-":
+            profile_id = f"{time.time_ns():x}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, profile_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        sampler = Sampler(settings.profiler_request_interval, asyncio.get_running_loop(), asyncio.current_task())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = sampler.stop()
+            save_request_profile(profile_id, {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "duration": round(time.perf_counter() - started, 4),
+                "samples": sampler.samples,
+                "stacks": stacks,
+            })
+
+    @staticmethod
+    def _wants_profile(scope) -> bool:
+        wants, token = False, None
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                wants = value in (b"1", b"true")
+            elif name == ADMIN_TOKEN_HEADER.encode():
+                token = value.decode("latin-1")
+        return wants and is_admin_token(token)
+
+
+@router.get("", summary="Profile Process", description="Sample every thread for N seconds; collapsed stacks for flamegraphs",
+            response_class=PlainTextResponse)
+async def profile_process_view(seconds: float = 10.0, interval: float = None):
+    if not 0 < seconds <= settings.profiler_max_seconds:
+        raise HTTPException(status_code=400, detail={"error": f"seconds must be in (0, {settings.profiler_max_seconds}]"})
+    interval = max(interval or settings.profiler_interval, 0.001)
+    if _process_profile_lock.locked():
+        raise HTTPException(status_code=409, detail={"error": "A profile is already running"})
+    async with _process_profile_lock:
+        stacks = await profile_process(seconds, interval)
+    return PlainTextResponse(collapse(stacks))
+
+
+@router.get("/requests", summary="List Request Profiles", description="Recent requests profiled with X-Profile: 1")
+async def request_profile_list_view():
+    return {"profiles": [
+        {key: value for key, value in profile.items() if key != "stacks"}
+        for profile in reversed(_request_profiles.values())
+    ]}
+
+
+@router.get("/requests/{profile_id}", summary="Get Request Profile", description="Collapsed stacks of one profiled request",
+            response_class=PlainTextResponse)
+async def request_profile_detail_view(profile_id: str):
+    profile = _request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail={"error": "Profile not found"})
+    return PlainTextResponse(collapse(profile["stacks"]))
@@ -0,0 +1,134 @@
+"""
+Production launcher: gunicorn supervising uvicorn workers.
+
+    python -m app.serve
+    ddtrace-run python -m app.serve
+
+The app is imported once in the master (preload) and forked into
+WEB_CONCURRENCY workers, by default one per CPU the container may use
+(affinity mask, capped by the cgroup CPU quota). Workers run uvloop and
+httptools when they are installed and fall back to asyncio and h11.
+
+On SIGTERM the master stops accepting connections and every worker
+finishes its in-flight requests, then runs the shutdown handlers, which
+flush the watch-event write buffer, before WEB_GRACEFUL_TIMEOUT runs out.
+
+For development keep using `uvicorn app.main:app --reload`.
+"""
+import importlib.util
+import logging
+import math
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from app import config
+from app.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+SHUTDOWN_HANDLER_SECONDS = 5  # kept out of the drain for flushing buffers after the last request
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+EVENT_LOOP = "uvloop" if installed("uvloop") else "asyncio"
+HTTP_PARSER = "httptools" if installed("httptools") else "h11"
+
+
+def cgroup_cpu_quota():
+    """CPUs granted by the cgroup CPU quota (v2, then v1), or None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()  # "max 100000" when unlimited
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+class Worker(UvicornWorker):
+    """Uvicorn worker with an explicit loop/parser and a bounded drain"""
+
+    def __init__(self, *args, **kwargs):
+        self.CONFIG_KWARGS = {
+            "loop": EVENT_LOOP,
+            "http": HTTP_PARSER,
+            # Stop waiting for open connections early enough that the
+            # shutdown handlers still run before the master kills us
+            "timeout_graceful_shutdown": max(1, settings.web_graceful_timeout - SHUTDOWN_HANDLER_SECONDS),
+        }
+        super().__init__(*args, **kwargs)
+
+
+def post_fork(server, worker):
+    # The log queue listener thread started at import lives in the master only
+    configure_logging(settings.log_level, settings.log_format)
+
+
+def when_ready(server):
+    logger.info(
+        "Serving on %s with %s workers (%s, %s)",
+        settings.web_bind, server.num_workers, EVENT_LOOP, HTTP_PARSER
+    )
+
+
+def gunicorn_options() -> dict:
+    return {
+        "bind": settings.web_bind,
+        "workers": settings.web_concurrency or available_cpus(),
+        "worker_class": "app.serve.Worker",
+        "preload_app": True,
+        "keepalive": settings.web_keepalive,
+        "backlog": settings.web_backlog,
+        "graceful_timeout": settings.web_graceful_timeout,
+        "max_requests": settings.web_max_requests,
+        "max_requests_jitter": settings.web_max_requests // 10,
+        "post_fork": post_fork,
+        "when_ready": when_ready,
+    }
+
+
+class Launcher(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+
+def main():
+    Launcher(gunicorn_options()).run()
+
+
+if __name__ == "__main__":
+    main()
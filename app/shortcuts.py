@@ -1,31 +1,44 @@
+import logging
+from functools import lru_cache
+
 from app import config
 
 from fastapi import Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+logger = logging.getLogger(__name__)
+
 settings = config.get_settings()
-templates = Jinja2Templates(directory=str(settings.templates_dir))
 
 
+@lru_cache
+def get_templates():
+    """Jinja templates, created on first use (jinja2 is slow to import)"""
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=str(settings.templates_dir))
+
+
+def warm_templates() -> int:
+    """Compile every template into Jinja's cache; returns how many"""
+    environment = get_templates().env
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
 
 def is_htmx(request:Request):
     return request.headers.get("hx-request") == 'true'
 
 
 async def get_object_or_404(KlassName, **kwargs):
-    """Get object or raise 404 - updated for MongoDB"""
-    from app.db import get_database
+    """Get object or raise 404"""
+    from app.db import get_storage
     
     try:
-        # Get the collection name from the model class
-        collection_name = KlassName.__name__.lower() + 's'  # e.g., Video -> videos
-        
-        # Get database connection
-        db = get_database()
-        collection = getattr(db, collection_name)
+        collection = get_storage().collection(KlassName.collection_name)
         
         # Find the document
         document = await collection.find_one(kwargs)
@@ -43,7 +56,7 @@ async def get_object_or_404(KlassName, **kwargs):
     except StarletteHTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_object_or_404: {e}")
+        logger.exception("Error in get_object_or_404")
         raise StarletteHTTPException(status_code=500)
 
 def redirect(path, cookies:dict={}, remove_session=False):
@@ -60,7 +73,7 @@ def redirect(path, cookies:dict={}, remove_session=False):
 def render(request, template_name, context={}, status_code:int=200, cookies:dict={}):
     ctx = context.copy()
     ctx.update({"request": request})
-    t = templates.get_template(template_name)
+    t = get_templates().get_template(template_name)
     html_str = t.render(ctx)
     response = HTMLResponse(html_str, status_code=status_code)
     # print(request.cookies)
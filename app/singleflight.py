@@ -0,0 +1,36 @@
+"""
+Single flight: concurrent loads of the same key share one call.
+
+The load runs in a task of its own that every caller waits on through
+asyncio.shield, so a caller that is cancelled (client disconnect, request
+timeout) neither cancels the load nor fails the other callers waiting for it.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}  # key -> task
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def do(self, key, loader):
+        """(result of `await loader()`, whether it was shared with an earlier caller)"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Every caller may have been cancelled; mark the exception as retrieved
+            task.exception()
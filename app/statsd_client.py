@@ -0,0 +1,195 @@
+"""
+Aggregating DogStatsD client.
+
+Counters, gauges and timings are aggregated in memory and sent every
+STATSD_FLUSH_INTERVAL seconds from a background thread, packed into as few
+UDP datagrams as possible, instead of one datagram per event:
+
+- counters are summed per metric and tag set,
+- gauges keep their last value,
+- timings keep a reservoir of at most STATSD_TIMING_SAMPLES values per
+  interval, sent with a sample rate so the agent still counts every event.
+
+Each metric may use at most STATSD_MAX_TAG_SETS distinct tag sets over the
+life of the process; events with a new tag set past that budget are
+recorded under the single tag set `overflow:true`.
+"""
+import atexit
+import logging
+import random
+import socket
+import threading
+
+from . import config
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+MAX_DATAGRAM_SIZE = 1432  # safe UDP payload for DogStatsD
+OVERFLOW_TAGS = ("overflow:true",)
+
+overflowed = registry.counter(
+    "statsd_tag_overflow_total", "StatsD events recorded under the overflow tag set", ("metric",)
+)
+datagrams_sent = registry.counter("statsd_datagrams_total", "StatsD datagrams sent", ("result",))
+
+
+def format_tags(tags) -> tuple:
+    """Sorted "key:value" tuple from a dict or a list of tags"""
+    if not tags:
+        return ()
+    if isinstance(tags, dict):
+        tags = [f"{key}:{value}" for key, value in tags.items()]
+    return tuple(sorted(str(tag).replace("|", "_").replace(",", "_") for tag in tags))
+
+
+class AggregatingStatsClient:
+    def __init__(self, host: str, port: int, prefix: str = "", flush_interval: float = 10.0,
+                 max_tag_sets: int = 100, timing_samples: int = 32, enabled: bool = True):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.max_tag_sets = max_tag_sets
+        self.timing_samples = timing_samples
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._tag_sets = {}  # metric -> admitted tag sets
+        self._reset()
+        self._socket = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _reset(self):
+        self._counters = {}  # (metric, tags) -> sum
+        self._gauges = {}  # (metric, tags) -> last value
+        self._timings = {}  # (metric, tags) -> [seen, reservoir]
+
+    def increment(self, metric: str, value: float = 1, tags=None):
+        if not self.enabled:
+            return
+        key = self._key(metric, tags)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._ensure_started()
+
+    def gauge(self, metric: str, value: float, tags=None):
+        if not self.enabled:
+            return
+        key = self._key(metric, tags)
+        with self._lock:
+            self._gauges[key] = value
+        self._ensure_started()
+
+    def timing(self, metric: str, value_ms: float, tags=None):
+        if not self.enabled:
+            return
+        key = self._key(metric, tags)
+        with self._lock:
+            entry = self._timings.get(key)
+            if entry is None:
+                entry = self._timings[key] = [0, []]
+            entry[0] += 1
+            reservoir = entry[1]
+            if len(reservoir) < self.timing_samples:
+                reservoir.append(value_ms)
+            else:
+                # Reservoir sampling: every value seen has the same chance to be kept
+                slot = random.randrange(entry[0])
+                if slot < self.timing_samples:
+                    reservoir[slot] = value_ms
+        self._ensure_started()
+
+    def _key(self, metric: str, tags):
+        tags = format_tags(tags)
+        admitted = self._tag_sets.get(metric)
+        if admitted is None:
+            admitted = self._tag_sets.setdefault(metric, set())
+        if tags not in admitted:
+            with self._lock:
+                if len(admitted) >= self.max_tag_sets:
+                    overflowed.inc(metric=metric)
+                    return metric, OVERFLOW_TAGS
+                admitted.add(tags)
+        return metric, tags
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="statsd-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Send everything aggregated since the last flush"""
+        with self._lock:
+            counters, gauges, timings = self._counters, self._gauges, self._timings
+            self._reset()
+        lines = []
+        for (metric, tags), value in counters.items():
+            lines.append(self._line(metric, value, "c", tags))
+        for (metric, tags), value in gauges.items():
+            lines.append(self._line(metric, value, "g", tags))
+        for (metric, tags), (seen, reservoir) in timings.items():
+            rate = len(reservoir) / seen
+            for value in reservoir:
+                lines.append(self._line(metric, value, "ms", tags, rate))
+        self._send(lines)
+
+    def _line(self, metric: str, value, kind: str, tags, rate: float = 1.0) -> str:
+        line = f"{self.prefix}{metric}:{value:g}|{kind}"
+        if rate < 1:
+            line += f"|@{rate:.4g}"
+        if tags:
+            line += "|#" + ",".join(tags)
+        return line
+
+    def _send(self, lines):
+        if not lines:
+            return
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setblocking(False)
+        datagram = []
+        size = 0
+        for line in lines:
+            if datagram and size + len(line) + 1 > MAX_DATAGRAM_SIZE:
+                self._send_datagram("\n".join(datagram))
+                datagram, size = [], 0
+            datagram.append(line)
+            size += len(line) + 1
+        self._send_datagram("\n".join(datagram))
+
+    def _send_datagram(self, payload: str):
+        try:
+            self._socket.sendto(payload.encode("utf-8"), self.address)
+            datagrams_sent.inc(result="sent")
+        except OSError as e:
+            # The agent being down must never affect requests
+            datagrams_sent.inc(result="error")
+            logger.debug("StatsD send failed: %s", e)
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+statsd_client = AggregatingStatsClient(
+    host=settings.statsd_host,
+    port=settings.statsd_port,
+    flush_interval=settings.statsd_flush_interval,
+    max_tag_sets=settings.statsd_max_tag_sets,
+    timing_samples=settings.statsd_timing_samples,
+    enabled=settings.statsd_enabled,
+)
+atexit.register(statsd_client.close)
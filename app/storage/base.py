@@ -0,0 +1,101 @@
+"""
+Storage interface used by the models.
+
+A small subset of MongoDB: filters and update documents use MongoDB
+syntax (equality, $in, $nin, $ne, $gt/$gte/$lt/$lte, $exists, $or, $and;
+$set, $unset, $inc, $push, $addToSet, $pull, $setOnInsert), so the Motor
+backend passes them through unchanged and the in-memory backend
+interprets them. Unique-key violations raise pymongo's DuplicateKeyError
+and BulkWriteError on both backends.
+
+Backends: `mongo` (Motor) and `memory` (dicts with hash indexes, for
+benchmarks and tests), selected with STORAGE_BACKEND; see `app.db.get_storage`.
+"""
+
+
+class Collection:
+    name: str
+
+    async def find_one(self, filter: dict = None, sort=None, projection: dict = None):
+        """First matching document, or None"""
+        raise NotImplementedError
+
+    async def find_many(self, filter: dict = None, sort=None, limit: int = 0, skip: int = 0,
+                        projection: dict = None) -> list:
+        """Matching documents; sort is a list of (field, 1 or -1)"""
+        raise NotImplementedError
+
+    def iterate(self, filter: dict = None, sort=None, projection: dict = None, batch_size: int = 1000):
+        """Async iterator over lists of at most batch_size matching documents, for scans"""
+        raise NotImplementedError
+
+    async def insert(self, document: dict):
+        """Insert one document; returns its _id"""
+        raise NotImplementedError
+
+    async def insert_many(self, documents, ordered: bool = True) -> list:
+        """Insert documents; returns their _ids"""
+        raise NotImplementedError
+
+    async def update(self, filter: dict, changes: dict, upsert: bool = False, many: bool = False) -> int:
+        """Apply an update document to the first (or every) match; returns the number matched"""
+        raise NotImplementedError
+
+    async def delete(self, filter: dict, many: bool = False) -> int:
+        """Delete the first (or every) match; returns the number deleted"""
+        raise NotImplementedError
+
+    async def count(self, filter: dict = None) -> int:
+        raise NotImplementedError
+
+    async def distinct(self, field: str, filter: dict = None) -> list:
+        """Distinct values of field among matches; array values count element by element"""
+        raise NotImplementedError
+
+    async def group(self, field: str, filter: dict = None, keys=None, collect: str = None,
+                    limit: int = None) -> dict:
+        """Aggregate-lite: {value of field: {"count": n, "values": [...]}} over matches
+
+        Array fields are unwound; count is the number of documents holding
+        the value. `keys` restricts the result to those values and `collect`
+        gathers the distinct non-null values of another field per group,
+        sorted, the first `limit` of them when limit is given.
+        """
+        raise NotImplementedError
+
+    async def create_index(self, fields, unique: bool = False, expire_after: float = None):
+        """fields is a field name or a list of (field, direction)"""
+        raise NotImplementedError
+
+
+class Storage:
+    async def ping(self):
+        """Raise if the backend cannot be reached"""
+        raise NotImplementedError
+
+    def collection(self, name: str) -> Collection:
+        raise NotImplementedError
+
+    async def list_collection_names(self) -> list:
+        raise NotImplementedError
+
+    async def drop_collection(self, name: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __getitem__(self, name: str) -> Collection:
+        return self.collection(name)
+
+    def __getattr__(self, name: str) -> Collection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.collection(name)
+
+
+def index_fields(fields) -> list:
+    """Normalize a field name or list of (field, direction) to the list form"""
+    if isinstance(fields, str):
+        return [(fields, 1)]
+    return [(field, direction) for field, direction in fields]
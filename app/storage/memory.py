@@ -0,0 +1,459 @@
+"""
+In-memory storage backend.
+
+Documents live in one dict per collection, keyed by _id. Indexes are hash
+indexes over every prefix of their fields, array values indexed element by
+element like MongoDB multikey indexes. A query uses the index covering the
+longest run of equality or $in conditions on its leading fields and scans
+only the documents it returns; anything else is a full scan. Range
+conditions and sorts are evaluated on the candidates.
+
+Documents are copied on the way in and out, so callers can mutate what
+they get like they can with Motor. Nothing is persisted, TTL indexes do not
+expire documents, and there is no concurrency control beyond the event
+loop running one coroutine at a time.
+"""
+import asyncio
+import itertools
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .base import Collection, Storage, index_fields
+
+DUPLICATE_KEY_ERROR = 11000
+SCAN_YIELD_EVERY = 1000  # documents between yields to the event loop during scans
+
+_MISSING = object()
+# MongoDB's cross-type sort order, roughly
+_TYPE_ORDER = {type(None): 0, int: 1, float: 1, str: 2, dict: 3, list: 4, ObjectId: 5, bool: 6, datetime: 7}
+
+
+def _clone(value):
+    """Deep copy, normalized the way a BSON round trip would (tuples become
+    lists, ObjectId subclasses plain ObjectIds)"""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clone(item) for item in value]
+    if isinstance(value, ObjectId) and type(value) is not ObjectId:
+        return ObjectId(value.binary)
+    return value
+
+
+def get_path(document, path: str):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def set_path(document, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def unset_path(document, path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+
+def sort_key(value):
+    if value is _MISSING:
+        value = None
+    return _TYPE_ORDER.get(type(value), 8), value if value is not None else 0
+
+
+def _compare(value, operator: str, operand) -> bool:
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        # Different types never compare in MongoDB range queries
+        return False
+    raise ValueError(f"Unsupported operator {operator}")
+
+
+def _candidates(value):
+    """The value plus, for arrays, each element (MongoDB matches either)"""
+    if isinstance(value, list):
+        return [value, *value]
+    return [value]
+
+
+def _matches_condition(value, condition) -> bool:
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return any(candidate == condition for candidate in _candidates(value)) or (
+            condition is None and value is _MISSING
+        )
+    for operator, operand in condition.items():
+        if operator == "$exists":
+            if (value is not _MISSING) != bool(operand):
+                return False
+        elif operator == "$eq":
+            if not _matches_condition(value, operand):
+                return False
+        elif operator == "$ne":
+            if _matches_condition(value, operand):
+                return False
+        elif operator == "$in":
+            if not any(_matches_condition(value, item) for item in operand):
+                return False
+        elif operator == "$nin":
+            if any(_matches_condition(value, item) for item in operand):
+                return False
+        elif value is _MISSING or not any(
+            _compare(candidate, operator, operand) for candidate in _candidates(value)
+        ):
+            return False
+    return True
+
+
+def matches(document, filter: dict) -> bool:
+    for key, condition in filter.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported query operator {key}")
+        elif not _matches_condition(get_path(document, key), condition):
+            return False
+    return True
+
+
+def project(document, projection: dict):
+    if not projection:
+        return _clone(document)
+    include = {key for key, value in projection.items() if value and key != "_id"}
+    if include:
+        result = {key: _clone(document[key]) for key in include if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    excluded = {key for key, value in projection.items() if not value}
+    return {key: _clone(value) for key, value in document.items() if key not in excluded}
+
+
+def apply_update(document, changes: dict, inserting: bool = False):
+    for operator, fields in changes.items():
+        if operator == "$setOnInsert":
+            if not inserting:
+                continue
+            operator = "$set"
+        for path, value in fields.items():
+            if operator == "$set":
+                set_path(document, path, _clone(value))
+            elif operator == "$unset":
+                unset_path(document, path)
+            elif operator in ("$max", "$min"):
+                current = get_path(document, path)
+                if current is _MISSING or (value > current if operator == "$max" else value < current):
+                    set_path(document, path, _clone(value))
+            elif operator == "$inc":
+                current = get_path(document, path)
+                set_path(document, path, (0 if current is _MISSING else current) + value)
+            elif operator in ("$push", "$addToSet"):
+                current = get_path(document, path)
+                if current is _MISSING:
+                    current = []
+                    set_path(document, path, current)
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in values:
+                    if operator == "$push" or item not in current:
+                        current.append(_clone(item))
+            elif operator == "$pull":
+                current = get_path(document, path)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _matches_condition(item, value)]
+            else:
+                raise ValueError(f"Unsupported update operator {operator}")
+
+
+def sort_documents(documents, sort):
+    for field, direction in reversed(list(sort)):
+        documents.sort(key=lambda document: sort_key(get_path(document, field)), reverse=direction < 0)
+    return documents
+
+
+def _index_values(document, field: str) -> list:
+    value = get_path(document, field)
+    if value is _MISSING:
+        return [None]
+    if isinstance(value, list):
+        return list(dict.fromkeys(value)) or [None]
+    return [value]
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class MemoryIndex:
+    def __init__(self, fields, unique: bool = False):
+        self.fields = [field for field, _ in index_fields(fields)]
+        self.unique = unique
+        # entries[n] maps the values of the first n+1 fields to document ids
+        self.entries = [{} for _ in self.fields]
+
+    def keys(self, document):
+        values = [_index_values(document, field) for field in self.fields]
+        return [key for key in itertools.product(*values) if all(_hashable(part) for part in key)]
+
+    def conflicts(self, document, ignore=None) -> bool:
+        if not self.unique:
+            return False
+        full = self.entries[-1]
+        return any(full.get(key, set()) - {ignore} for key in self.keys(document))
+
+    def add(self, document):
+        document_id = document["_id"]
+        for key in self.keys(document):
+            for length, entries in enumerate(self.entries, 1):
+                entries.setdefault(key[:length], set()).add(document_id)
+
+    def remove(self, document):
+        document_id = document["_id"]
+        for key in self.keys(document):
+            for length, entries in enumerate(self.entries, 1):
+                ids = entries.get(key[:length])
+                if ids is not None:
+                    ids.discard(document_id)
+                    if not ids:
+                        del entries[key[:length]]
+
+    def lookup(self, filter: dict):
+        """(covered fields, candidate ids) for the equality prefix of filter, or None"""
+        choices = []
+        for field in self.fields:
+            condition = filter.get(field, _MISSING)
+            if condition is _MISSING:
+                break
+            if isinstance(condition, dict) and set(condition) == {"$in"}:
+                values = list(condition["$in"])
+            elif isinstance(condition, dict) and set(condition) == {"$eq"}:
+                values = [condition["$eq"]]
+            elif isinstance(condition, (dict, list)) or condition is None:
+                break
+            else:
+                values = [condition]
+            if not all(_hashable(value) for value in values):
+                break
+            choices.append(values)
+        if not choices:
+            return None
+        entries = self.entries[len(choices) - 1]
+        ids = set()
+        for key in itertools.product(*choices):
+            ids |= entries.get(key, set())
+        return len(choices), ids
+
+
+class MemoryCollection(Collection):
+    def __init__(self, name: str):
+        self.name = name
+        self._documents = {}  # _id -> document
+        self._indexes = {"_id_": MemoryIndex("_id", unique=True)}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _plan(self, filter: dict):
+        """Documents that may match filter, through the best index"""
+        best = None
+        for index in self._indexes.values():
+            found = index.lookup(filter)
+            if found is not None and (best is None or found[0] > best[0]):
+                best = found
+        if best is None:
+            return list(self._documents.values())
+        return [self._documents[document_id] for document_id in best[1]]
+
+    def _select(self, filter, sort=None, limit: int = 0, skip: int = 0):
+        filter = filter or {}
+        found = [document for document in self._plan(filter) if matches(document, filter)]
+        if sort:
+            sort_documents(found, sort)
+        if skip:
+            found = found[skip:]
+        if limit:
+            found = found[:limit]
+        return found
+
+    async def find_one(self, filter: dict = None, sort=None, projection: dict = None):
+        found = self._select(filter, sort, limit=1)
+        return project(found[0], projection) if found else None
+
+    async def find_many(self, filter: dict = None, sort=None, limit: int = 0, skip: int = 0,
+                        projection: dict = None) -> list:
+        return [project(document, projection) for document in self._select(filter, sort, limit, skip)]
+
+    async def iterate(self, filter: dict = None, sort=None, projection: dict = None, batch_size: int = 1000):
+        found = self._select(filter, sort)
+        for start in range(0, len(found), batch_size):
+            yield [project(document, projection) for document in found[start:start + batch_size]]
+
+    def _insert(self, document: dict):
+        document = _clone(document)
+        document.setdefault("_id", ObjectId())
+        for name, index in self._indexes.items():
+            if index.conflicts(document):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {name}",
+                    DUPLICATE_KEY_ERROR
+                )
+        self._documents[document["_id"]] = document
+        for index in self._indexes.values():
+            index.add(document)
+        return document["_id"]
+
+    async def insert(self, document: dict):
+        inserted_id = self._insert(document)
+        # Motor sets the generated _id on the caller's document
+        document.setdefault("_id", inserted_id)
+        return inserted_id
+
+    async def insert_many(self, documents, ordered: bool = True) -> list:
+        inserted_ids = []
+        errors = []
+        for position, document in enumerate(documents):
+            try:
+                inserted_id = self._insert(document)
+            except DuplicateKeyError as e:
+                errors.append({"index": position, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                if ordered:
+                    break
+                continue
+            document.setdefault("_id", inserted_id)
+            inserted_ids.append(inserted_id)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted_ids)})
+        return inserted_ids
+
+    def _replace(self, old: dict, new: dict):
+        for name, index in self._indexes.items():
+            if index.conflicts(new, ignore=old["_id"]):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {name}",
+                    DUPLICATE_KEY_ERROR
+                )
+        for index in self._indexes.values():
+            index.remove(old)
+        self._documents[new["_id"]] = new
+        for index in self._indexes.values():
+            index.add(new)
+
+    async def update(self, filter: dict, changes: dict, upsert: bool = False, many: bool = False) -> int:
+        found = self._select(filter, limit=0 if many else 1)
+        for document in found:
+            updated = _clone(document)
+            apply_update(updated, changes)
+            updated["_id"] = document["_id"]
+            self._replace(document, updated)
+        if not found and upsert:
+            document = {
+                key: _clone(value) for key, value in filter.items()
+                if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+            }
+            apply_update(document, changes, inserting=True)
+            self._insert(document)
+        return len(found)
+
+    async def delete(self, filter: dict, many: bool = False) -> int:
+        found = self._select(filter, limit=0 if many else 1)
+        for document in found:
+            for index in self._indexes.values():
+                index.remove(document)
+            del self._documents[document["_id"]]
+        return len(found)
+
+    async def count(self, filter: dict = None) -> int:
+        if not filter:
+            return len(self._documents)
+        return len(self._select(filter))
+
+    async def distinct(self, field: str, filter: dict = None) -> list:
+        values = {}
+        for document in self._select(filter):
+            value = get_path(document, field)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not _MISSING and _hashable(item):
+                    values.setdefault(item, None)
+        return list(values)
+
+    async def group(self, field: str, filter: dict = None, keys=None, collect: str = None,
+                    limit: int = None) -> dict:
+        wanted = set(keys) if keys is not None else None
+        groups = {}
+        for position, document in enumerate(self._select(filter), 1):
+            value = get_path(document, field)
+            if value is _MISSING:
+                continue
+            collected = get_path(document, collect) if collect else _MISSING
+            for key in dict.fromkeys(value if isinstance(value, list) else [value]):
+                if wanted is not None and key not in wanted or not _hashable(key):
+                    continue
+                group = groups.setdefault(key, {"count": 0, "values": []})
+                group["count"] += 1
+                if collected not in (_MISSING, None) and collected not in group["values"]:
+                    group["values"].append(collected)
+            if position % SCAN_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        for group in groups.values():
+            group["values"] = sorted(group["values"])[:limit]
+        return groups
+
+    async def create_index(self, fields, unique: bool = False, expire_after: float = None):
+        fields = index_fields(fields)
+        name = "_".join(f"{field}_{direction}" for field, direction in fields)
+        if name in self._indexes:
+            return
+        index = MemoryIndex(fields, unique=unique)
+        for document in self._documents.values():
+            if index.conflicts(document):
+                raise DuplicateKeyError(f"E11000 duplicate key error building index {name}", DUPLICATE_KEY_ERROR)
+            index.add(document)
+        self._indexes[name] = index
+
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self._collections = {}
+
+    async def ping(self):
+        return None
+
+    def collection(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(name)
+        return collection
+
+    async def list_collection_names(self) -> list:
+        return [name for name, collection in self._collections.items() if len(collection)]
+
+    async def drop_collection(self, name: str):
+        self._collections.pop(name, None)
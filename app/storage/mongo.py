@@ -0,0 +1,123 @@
+"""
+MongoDB storage backend: thin wrappers over a Motor database.
+"""
+from .base import Collection, Storage, index_fields
+
+
+class MongoCollection(Collection):
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def _cursor(self, filter, sort, projection):
+        cursor = self._collection.find(filter or {}, projection)
+        if sort:
+            cursor = cursor.sort(list(sort))
+        return cursor
+
+    async def find_one(self, filter: dict = None, sort=None, projection: dict = None):
+        return await self._collection.find_one(filter or {}, projection, sort=list(sort) if sort else None)
+
+    async def find_many(self, filter: dict = None, sort=None, limit: int = 0, skip: int = 0,
+                        projection: dict = None) -> list:
+        cursor = self._cursor(filter, sort, projection)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def iterate(self, filter: dict = None, sort=None, projection: dict = None, batch_size: int = 1000):
+        cursor = self._cursor(filter, sort, projection).batch_size(batch_size)
+        batch = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def insert(self, document: dict):
+        result = await self._collection.insert_one(document)
+        return result.inserted_id
+
+    async def insert_many(self, documents, ordered: bool = True) -> list:
+        result = await self._collection.insert_many(list(documents), ordered=ordered)
+        return result.inserted_ids
+
+    async def update(self, filter: dict, changes: dict, upsert: bool = False, many: bool = False) -> int:
+        method = self._collection.update_many if many else self._collection.update_one
+        result = await method(filter, changes, upsert=upsert)
+        return result.matched_count
+
+    async def delete(self, filter: dict, many: bool = False) -> int:
+        method = self._collection.delete_many if many else self._collection.delete_one
+        result = await method(filter)
+        return result.deleted_count
+
+    async def count(self, filter: dict = None) -> int:
+        if not filter:
+            return await self._collection.estimated_document_count()
+        return await self._collection.count_documents(filter)
+
+    async def distinct(self, field: str, filter: dict = None) -> list:
+        return await self._collection.distinct(field, filter or {})
+
+    async def group(self, field: str, filter: dict = None, keys=None, collect: str = None,
+                    limit: int = None) -> dict:
+        pipeline = []
+        if filter:
+            pipeline.append({"$match": filter})
+        projection = {"_id": 1, field: 1}
+        if collect:
+            projection[collect] = 1
+        pipeline += [{"$project": projection}, {"$unwind": f"${field}"}]
+        if keys is not None:
+            pipeline.append({"$match": {field: {"$in": list(keys)}}})
+        # Group per document first so a value repeated in one array counts once
+        first = {"_id": {"doc": "$_id", "key": f"${field}"}}
+        if not collect:
+            pipeline += [{"$group": first}, {"$group": {"_id": "$_id.key", "count": {"$sum": 1}}}]
+        else:
+            first["value"] = {"$first": f"${collect}"}
+            # Distinct (key, value) pairs in value order, so the values kept are the same every run
+            values = {"$filter": {"input": "$values", "cond": {"$ne": ["$$this", None]}}}
+            pipeline += [
+                {"$group": first},
+                {"$group": {"_id": {"key": "$_id.key", "value": "$value"}, "count": {"$sum": 1}}},
+                {"$sort": {"_id.value": 1}},
+                {"$group": {"_id": "$_id.key", "count": {"$sum": "$count"}, "values": {"$push": "$_id.value"}}},
+                {"$project": {"count": 1, "values": {"$slice": [values, limit]} if limit else values}},
+            ]
+        groups = {}
+        async for row in self._collection.aggregate(pipeline):
+            groups[row["_id"]] = {"count": row["count"], "values": row.get("values", [])}
+        return groups
+
+    async def create_index(self, fields, unique: bool = False, expire_after: float = None):
+        kwargs = {"unique": unique}
+        if expire_after is not None:
+            kwargs["expireAfterSeconds"] = expire_after
+        await self._collection.create_index(index_fields(fields), **kwargs)
+
+
+class MongoStorage(Storage):
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    async def ping(self):
+        await self._database.command("ping")
+
+    def collection(self, name: str) -> MongoCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MongoCollection(self._database[name])
+        return collection
+
+    async def list_collection_names(self) -> list:
+        return await self._database.list_collection_names()
+
+    async def drop_collection(self, name: str):
+        await self._database.drop_collection(name)
@@ -1,9 +1,11 @@
 import datetime
-from jose import jwt, ExpiredSignatureError
+import logging
 from app import config
 
 from .models import User
 
+logger = logging.getLogger(__name__)
+
 settings = config.get_settings()
 
 async def authenticate(email, password):
@@ -18,6 +20,7 @@ async def authenticate(email, password):
 
 def login(user_obj, expires=settings.session_duration):
     # step 2
+    from jose import jwt  # imported on first use to keep startup fast
     raw_data = {
         "user_id": f"{user_obj.user_id}",
         "role": "admin",
@@ -28,11 +31,12 @@ def login(user_obj, expires=settings.session_duration):
 
 def verify_user_id(token):
     # step 3
+    from jose import jwt, ExpiredSignatureError
     data = {}
     try:
         data = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
-    except ExpiredSignatureError as e:
-        print(e, "log out user")
+    except ExpiredSignatureError:
+        logger.debug("Session token expired, logging out user")
     except:
         pass
     if 'user_id' not in data:
@@ -1,3 +1,5 @@
+import logging
+
 from starlette.authentication import (
     AuthenticationBackend,
     SimpleUser,
@@ -8,6 +10,8 @@ from starlette.authentication import (
 from . import auth
 from .models import User
 
+logger = logging.getLogger(__name__)
+
 class AuthenticatedUser:
     def __init__(self, user_id: str, email: str, username: str):
         self.user_id = user_id
@@ -40,7 +44,7 @@ class JWTCookieBackend(AuthenticationBackend):
                     username=user_obj.username
                 )
         except Exception as e:
-            print(f"Error fetching user data: {e}")
+            logger.warning("Error fetching user data: %s", e)
         
         # Fallback to anonymous user
         roles = ["anon"]
@@ -1,5 +1,8 @@
+import hmac
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.config import get_settings
 from .models import User
 
 # Create a security scheme for authentication
@@ -34,3 +37,26 @@ def require_auth():
         return request.user
     
     return auth_dependency
+
+
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+
+def is_admin_token(token) -> bool:
+    """True if token matches ADMIN_TOKEN; always False when ADMIN_TOKEN is unset"""
+    admin_token = get_settings().admin_token
+    if not admin_token or not token:
+        return False
+    return hmac.compare_digest(str(token).encode(), admin_token.encode())
+
+
+def require_admin(request: Request):
+    """
+    FastAPI dependency for operational endpoints (profiling, memory, status).
+    Requires the X-Admin-Token header; the endpoints do not exist while
+    ADMIN_TOKEN is unset.
+    """
+    if not get_settings().admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not is_admin_token(request.headers.get(ADMIN_TOKEN_HEADER)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
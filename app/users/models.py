@@ -1,12 +1,19 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 from pydantic import Field, EmailStr
 from app.models.base import BaseMongoModel, PyObjectId
-from app.db import get_database
+from app.cache.base import namespace
+from app.db import get_storage
 from . import exceptions, security, validators
 
+# Users by user_id, without password hashes
+user_cache = namespace("users")
+
 
 class User(BaseMongoModel):
+    collection_name = "users"
+
     email: EmailStr = Field(..., unique=True)
     user_id: str = Field(default_factory=lambda: str(uuid.uuid1()))
     username: str = Field(default="")
@@ -42,7 +49,7 @@ class User(BaseMongoModel):
     @classmethod
     async def create_user(cls, email: str, password: str = None, username: str = None):
         """Create a new user"""
-        db = get_database()
+        db = get_storage()
         
         # Check if user already exists
         existing_user = await db.users.find_one({"email": email})
@@ -67,38 +74,54 @@ class User(BaseMongoModel):
             user.set_password(password)
         
         # Save to database
-        result = await db.users.insert_one(user.to_mongo())
-        user.id = result.inserted_id
+        user.id = await db.users.insert(user.to_mongo())
         
         return user
 
+    async def save(self):
+        """Write the user's changes (e.g. after set_password) and drop cached copies in every worker"""
+        self.updated_at = datetime.utcnow()
+        changes = self.to_mongo()
+        for field in ("_id", "user_id", "created_at"):
+            changes.pop(field, None)
+        if not self.password:
+            # Users from by_user_id carry no hash; keep the stored one
+            del changes["password"]
+        db = get_storage()
+        await db.users.update({"user_id": self.user_id}, {"$set": changes})
+        await user_cache.invalidate(self.user_id)
+
     @classmethod
     async def check_exists(cls, user_id: str) -> bool:
         """Check if user exists by user_id"""
-        db = get_database()
+        db = get_storage()
         user = await db.users.find_one({"user_id": user_id})
         return user is not None
     
     @classmethod
     async def by_user_id(cls, user_id: str = None):
-        """Get user by user_id"""
+        """Get user by user_id; the password hash is not loaded (see by_email)"""
         if user_id is None:
             return None
         
-        db = get_database()
-        user_data = await db.users.find_one({"user_id": user_id})
+        async def load():
+            return await get_storage().users.find_one({"user_id": user_id}, projection={"password": 0})
+
+        # Looked up by the authentication middleware on every request
+        user_data = await user_cache.get_or_load(user_id, load)
         
         if user_data:
             # Convert ObjectId to string for Pydantic model
             user_data['id'] = str(user_data['_id'])
             del user_data['_id']
+            user_data['password'] = ""
             return cls(**user_data)
         return None
 
     @classmethod
     async def by_email(cls, email: str):
         """Get user by email"""
-        db = get_database()
+        db = get_storage()
         user_data = await db.users.find_one({"email": email})
         
         if user_data:
@@ -1,12 +1,19 @@
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
+from functools import lru_cache
+
+
+@lru_cache
+def password_hasher():
+    # argon2 is imported on first use to keep startup fast
+    from argon2 import PasswordHasher
+    return PasswordHasher()
 
 def generate_hash(pw_raw):
-    ph = PasswordHasher()
+    ph = password_hasher()
     return ph.hash(pw_raw)
 
 def verify_hash(pw_hash, pw_raw):
-    ph = PasswordHasher()
+    from argon2.exceptions import VerifyMismatchError
+    ph = password_hasher()
     verified = False
     msg = ""
     try:
@@ -1,12 +1,15 @@
+import logging
 import uuid
 from datetime import datetime
 from typing import Optional
 from pydantic import Field
 from app.models.base import BaseMongoModel, PyObjectId
-from app.db import get_database
+from app.cache.base import namespace
+from app.db import get_storage
+from app.indexing import hooks
 from app.users.exceptions import InvalidUserIDException
 from app.users.models import User
-from app.shortcuts import templates
+from app.shortcuts import get_templates
 
 from .exceptions import (
     InvalidYouTubeVideoURLException, 
@@ -14,8 +17,15 @@ from .exceptions import (
 )
 from .extractors import extract_video_id
 
+logger = logging.getLogger(__name__)
+
+# Video documents by host_id
+video_cache = namespace("videos")
+
 
 class Video(BaseMongoModel):
+    collection_name = "videos"
+
     host_id: str = Field(..., unique=True)  # YouTube, Vimeo video ID
     db_id: str = Field(default_factory=lambda: str(uuid.uuid1()))
     host_service: str = Field(default='youtube')
@@ -47,7 +57,7 @@ class Video(BaseMongoModel):
         basename = self.host_service # youtube, vimeo
         template_name = f"videos/renderers/{basename}.html"
         context = {"host_id": self.host_id}
-        t = templates.get_template(template_name)
+        t = get_templates().get_template(template_name)
         return t.render(context)
 
     def as_data(self):
@@ -64,7 +74,7 @@ class Video(BaseMongoModel):
         if not host_id:
             raise InvalidYouTubeVideoURLException("Invalid YouTube Video URL")
         
-        db = get_database()
+        db = get_storage()
         
         # Try to find existing video
         existing_video = await db.videos.find_one({"host_id": host_id})
@@ -81,16 +91,22 @@ class Video(BaseMongoModel):
         if not host_id:
             return None
         
+        old_host_id = self.host_id
         self.url = url
         self.host_id = host_id
         self.updated_at = datetime.utcnow()
         
         # Update in database
-        db = get_database()
-        await db.videos.update_one(
+        db = get_storage()
+        await db.videos.update(
             {"_id": self.id},
             {"$set": {"url": url, "host_id": host_id, "updated_at": self.updated_at}}
         )
+        await video_cache.invalidate(old_host_id, host_id)
+        if old_host_id != host_id:
+            # The search index is keyed by host_id, so the old record must go
+            await hooks.object_deleted(old_host_id, "Video")
+        await hooks.video_saved(self)
         
         return url
 
@@ -101,19 +117,15 @@ class Video(BaseMongoModel):
         if host_id is None:
             raise InvalidYouTubeVideoURLException("Invalid YouTube Video URL")
         
-        print(f"Adding video: url={url}, host_id={host_id}, user_id={user_id}")
-        
         # Check if user exists
         user_exists = await User.check_exists(user_id)
         if not user_exists:
-            print(f"User not found: {user_id}")
             raise InvalidUserIDException("Invalid user_id")
         
         # Check if video already exists
-        db = get_database()
+        db = get_storage()
         existing_video = await db.videos.find_one({"host_id": host_id})
         if existing_video:
-            print(f"Video already exists: {host_id}")
             raise VideoAlreadyAddedException("Video already added")
         
         # Create video data
@@ -126,22 +138,24 @@ class Video(BaseMongoModel):
             "user_id": user_id
         }
         
-        print(f"Creating video with data: {video_data}")
-        
         video = cls(**video_data)
         
         # Save to database
-        result = await db.videos.insert_one(video.to_mongo())
-        video.id = result.inserted_id
+        video.id = await db.videos.insert(video.to_mongo())
+        await hooks.video_saved(video)
+        # Lets other workers add it to their search indexes
+        await video_cache.invalidate(video.host_id)
         
-        print(f"Video created successfully: {video.host_id}")
+        logger.info("Video created", extra={"host_id": video.host_id, "user_id": user_id})
         return video
 
     @classmethod
     async def get_by_host_id(cls, host_id: str):
         """Get video by host_id"""
-        db = get_database()
-        video_data = await db.videos.find_one({"host_id": host_id})
+        async def load():
+            return await get_storage().videos.find_one({"host_id": host_id})
+
+        video_data = await video_cache.get_or_load(host_id, load)
         
         if video_data:
             # Convert ObjectId to string for Pydantic model
@@ -150,11 +164,38 @@ class Video(BaseMongoModel):
             return cls(**video_data)
         return None
 
+    @classmethod
+    async def get_many_by_host_ids(cls, host_ids):
+        """Videos for host_ids, in that order, skipping unknown ones; one query for all cache misses"""
+        host_ids = list(host_ids)
+        documents = await video_cache.get_many(host_ids)
+        missing = [host_id for host_id in dict.fromkeys(host_ids) if host_id not in documents]
+        if missing:
+            loaded = await get_storage().videos.find_many({"host_id": {"$in": missing}})
+            loaded = {document["host_id"]: document for document in loaded}
+            await video_cache.set_many(loaded)
+            documents.update(loaded)
+        videos = []
+        for host_id in host_ids:
+            video_data = documents.get(host_id)
+            if video_data is None:
+                continue
+            video_data = dict(video_data, id=str(video_data['_id']))
+            del video_data['_id']
+            try:
+                videos.append(cls(**video_data))
+            except Exception as e:
+                logger.warning("Skipping invalid video %s: %s", host_id, e)
+        return videos
+
     async def delete(self):
         """Delete the video from database"""
-        db = get_database()
-        result = await db.videos.delete_one({"host_id": self.host_id})
-        return result.deleted_count > 0
+        db = get_storage()
+        deleted = await db.videos.delete({"host_id": self.host_id})
+        await video_cache.invalidate(self.host_id)
+        if deleted:
+            await hooks.object_deleted(self.host_id, "Video")
+        return deleted > 0
 
 
 
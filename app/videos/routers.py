@@ -1,10 +1,12 @@
+import logging
+
 from fastapi import APIRouter, Request, Form, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer
 
 from app import utils
 from app.shortcuts import get_object_or_404
-from app.db import get_database
+from app.db import get_storage
 
 
 from app.watch_events.models import WatchEvent
@@ -13,6 +15,8 @@ from .schemas import (
     VideoCreateSchema,
     VideoEditSchema)
 
+logger = logging.getLogger(__name__)
+
 # Security scheme for authentication
 security = HTTPBearer(auto_error=False)
 
@@ -50,10 +54,9 @@ router = APIRouter(
 @router.get("/api/videos", summary="Get All Videos", description="Retrieve a list of all videos")
 async def api_video_list_view(request: Request):
     # Get videos from MongoDB - public endpoint (no authentication required)
-    db = get_database()
-    cursor = db.videos.find({}).limit(100)
+    documents = await get_storage().videos.find_many({}, limit=100)
     videos = []
-    async for video_data in cursor:
+    for video_data in documents:
         # Convert ObjectId to string for Pydantic model
         if '_id' in video_data:
             video_data['id'] = str(video_data['_id'])
@@ -70,8 +73,7 @@ async def api_video_list_view(request: Request):
             video_dict = video.model_dump()
             videos.append(video_dict)
         except Exception as e:
-            print(f"Error creating Video object: {e}")
-            print(f"Data: {video_data}")
+            logger.warning("Skipping invalid video %s: %s", video_data.get('host_id'), e)
             continue
     
     return {
@@ -153,12 +155,10 @@ async def api_video_create_view(
         "user_id": request.user.user_id  # Use user_id instead of username
     }
     
-    print(f"Creating video with data: {raw_data}")
-    
     data, errors = utils.valid_schema_data_or_error(raw_data, VideoCreateSchema)
     
     if len(errors) > 0:
-        print(f"Validation errors: {errors}")
+        logger.debug("Video validation errors: %s", errors)
         raise HTTPException(status_code=400, detail={"errors": errors})
     
     try:
@@ -187,7 +187,7 @@ async def api_video_create_view(
         
         return video.model_dump()
     except Exception as e:
-        print(f"Error creating video: {e}")
+        logger.warning("Error creating video: %s", e)
         raise HTTPException(status_code=400, detail={"error": f"Error creating video: {str(e)}"})
 
 
@@ -0,0 +1,114 @@
+"""
+Admission control for the watch-event write path.
+
+When MongoDB slows down, watch-event inserts pile up in the event loop and
+drag down every other route. The controller caps concurrent writes, lets
+high priority events wait a short while for a slot and sheds the rest so
+progress tracking can never starve video and playlist reads.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from app import config
+from app.metrics import registry
+
+from .exceptions import WatchEventRejectedException
+
+settings = config.get_settings()
+
+PRIORITY_HIGH = "high"  # completion events, worth waiting for
+PRIORITY_LOW = "low"  # progress heartbeats, can be coalesced
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {
+            "admitted": 0,
+            "shed": 0,
+            "timed_out": 0,
+            "degraded": 0,
+        }
+
+    @asynccontextmanager
+    async def admit(self, priority: str = PRIORITY_HIGH):
+        """Hold a write slot for the duration of the block or raise WatchEventRejectedException"""
+        if self._slots.locked():
+            await self._wait_for_slot(priority)
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _wait_for_slot(self, priority: str):
+        if priority == PRIORITY_LOW:
+            # Heartbeats never queue; the caller may degrade to a buffered write
+            self.stats["degraded"] += 1
+            raise WatchEventRejectedException(
+                "Watch event write path is busy",
+                status_code=429,
+                retry_after=self.retry_after,
+                degradable=True,
+            )
+        if self.waiting >= self.max_queue:
+            self.stats["shed"] += 1
+            raise WatchEventRejectedException(
+                "Watch event write queue is full",
+                status_code=503,
+                retry_after=self.retry_after,
+            )
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            self.stats["shed"] += 1
+            raise WatchEventRejectedException(
+                "Timed out waiting for a watch event write slot",
+                status_code=503,
+                retry_after=self.retry_after,
+            )
+        finally:
+            self.waiting -= 1
+
+    def mark_shed(self):
+        """Record a degraded write that could not be buffered either"""
+        self.stats["shed"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.watch_event_max_concurrency,
+    max_queue=settings.watch_event_max_queue,
+    queue_timeout=settings.watch_event_queue_timeout,
+    retry_after=settings.watch_event_retry_after,
+)
+
+registry.counter(
+    "watch_event_admission_total", "Watch-event admission decisions", ("outcome",)
+).set_function(lambda: {(outcome,): count for outcome, count in admission_controller.stats.items()})
+registry.gauge("watch_event_in_flight", "Watch-event writes in progress").set_function(
+    lambda: admission_controller.in_flight
+)
+registry.gauge("watch_event_waiting", "Watch-event writes waiting for a slot").set_function(
+    lambda: admission_controller.waiting
+)
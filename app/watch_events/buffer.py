@@ -0,0 +1,127 @@
+"""
+Coalescing write buffer for watch events.
+
+Progress heartbeats only matter for their latest position, so while the
+write path is over budget we keep one pending document per (user, video)
+and flush them in a single bulk insert on an interval.
+"""
+import asyncio
+import logging
+
+from pymongo.errors import BulkWriteError
+
+from app import config
+from app.metrics import registry
+from app.db import get_storage
+
+from . import layout
+
+logger = logging.getLogger(__name__)
+
+settings = config.get_settings()
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class WriteBuffer:
+    def __init__(self, max_size: int, flush_interval: float):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._task = None
+        self.stats = {
+            "buffered": 0,
+            "coalesced": 0,
+            "flushed": 0,
+            "flush_errors": 0,
+            "dropped": 0,
+        }
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, document: dict) -> bool:
+        """Queue a watch event document, replacing any older one for the same video/user"""
+        key = (document["user_id"], document["host_id"])
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+        elif len(self._pending) >= self.max_size:
+            return False
+        self._pending[key] = document
+        self.stats["buffered"] += 1
+        self._ensure_flusher()
+        return True
+
+    def peek(self, host_id: str, user_id: str):
+        """Get the pending (not yet flushed) document for a video/user"""
+        return self._pending.get((user_id, host_id))
+
+    async def flush(self) -> int:
+        """Write all pending documents in one bulk insert"""
+        if not self._pending:
+            return 0
+        batch = self._pending
+        self._pending = {}
+        try:
+            db = get_storage()
+            await layout.insert_documents(db, list(batch.values()), ordered=False)
+        except BulkWriteError as e:
+            # Duplicates are documents already written by an earlier, partially failed flush
+            write_errors = e.details.get("writeErrors", [])
+            if not all(error.get("code") == DUPLICATE_KEY_ERROR for error in write_errors):
+                self._requeue(batch, e)
+                return 0
+        except Exception as e:
+            self._requeue(batch, e)
+            return 0
+        self.stats["flushed"] += len(batch)
+        return len(batch)
+
+    def _requeue(self, batch: dict, error: Exception):
+        self.stats["flush_errors"] += 1
+        logger.warning("Failed to flush %s watch events: %s", len(batch), error)
+        # Put the batch back unless a newer event arrived meanwhile, within max_size
+        dropped = 0
+        for key, document in batch.items():
+            if key in self._pending:
+                continue
+            if len(self._pending) >= self.max_size:
+                dropped += 1
+                continue
+            self._pending[key] = document
+        if dropped:
+            self.stats["dropped"] += dropped
+            logger.warning("Watch event buffer full, dropped %s events that failed to flush", dropped)
+
+    async def close(self):
+        """Stop the background flusher and write whatever is pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _ensure_flusher(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+write_buffer = WriteBuffer(
+    max_size=settings.watch_event_buffer_size,
+    flush_interval=settings.watch_event_flush_interval,
+)
+
+registry.counter(
+    "watch_event_buffer_total", "Watch-event write buffer activity", ("event",)
+).set_function(lambda: {(event,): count for event, count in write_buffer.stats.items()})
+registry.gauge("watch_event_buffer_depth", "Watch events waiting to be flushed").set_function(
+    lambda: len(write_buffer)
+)
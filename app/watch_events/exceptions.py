@@ -0,0 +1,15 @@
+class WatchEventRejectedException(Exception):
+    """
+    Watch event write rejected by admission control
+    """
+    def __init__(self, message, status_code=503, retry_after=1, degradable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.degradable = degradable
+
+
+class WriteBufferFullException(Exception):
+    """
+    Watch event write buffer is full
+    """
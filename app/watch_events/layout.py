@@ -0,0 +1,198 @@
+"""
+Storage layout for watch events.
+
+The "flat" layout keeps every event in the single `watch_events`
+collection. The "monthly" layout partitions events into one collection per
+calendar month (`watch_events_YYYYMM`, by `created_at`) so that range scans,
+resume lookups and retention only touch the buckets they need, and old data
+is dropped a whole collection at a time instead of with a huge delete.
+
+In the monthly layout, `watch_event_latest` points every (user, video) at the
+newest bucket holding its events, so a resume lookup for a video the user
+never watched costs one query instead of one per bucket.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from app import config
+
+settings = config.get_settings()
+
+COLLECTION_NAME = "watch_events"
+BUCKET_PREFIX = f"{COLLECTION_NAME}_"
+RESUME_INDEX = [("user_id", 1), ("host_id", 1), ("created_at", -1)]
+BUCKET_CACHE_SECONDS = 60
+LATEST_COLLECTION = "watch_event_latest"
+LATEST_MEMO_SIZE = 100000
+
+_indexed = set()
+_bucket_cache = {"names": None, "expires": 0.0}
+# (user_id, host_id) -> newest bucket this worker has recorded, see record_latest
+_latest = OrderedDict()
+
+
+def is_bucketed() -> bool:
+    return settings.watch_event_layout == "monthly"
+
+
+def bucket_name(created_at: datetime) -> str:
+    """Monthly bucket collection name for a timestamp"""
+    return f"{BUCKET_PREFIX}{created_at.year:04d}{created_at.month:02d}"
+
+
+def bucket_month(name: str):
+    """(year, month) for a bucket collection name, None for anything else"""
+    suffix = name[len(BUCKET_PREFIX):]
+    if not name.startswith(BUCKET_PREFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    year, month = int(suffix[:4]), int(suffix[4:])
+    if not 1 <= month <= 12:
+        return None
+    return year, month
+
+
+def collection_for(db, created_at: datetime = None):
+    """Collection a new event belongs to"""
+    if not is_bucketed():
+        return db[COLLECTION_NAME]
+    name = bucket_name(created_at or datetime.utcnow())
+    names = _bucket_cache["names"]
+    if names is not None and name not in names:
+        # A new month: list it right away rather than after the cache expires
+        _bucket_cache["names"] = sorted(names + [name], reverse=True)
+    return db[name]
+
+
+async def list_buckets(db, refresh: bool = False):
+    """Existing bucket collection names, newest first"""
+    now = time.monotonic()
+    if refresh or _bucket_cache["names"] is None or _bucket_cache["expires"] < now:
+        names = await db.list_collection_names()
+        buckets = [name for name in names if bucket_month(name) is not None]
+        _bucket_cache["names"] = sorted(buckets, reverse=True)
+        _bucket_cache["expires"] = now + BUCKET_CACHE_SECONDS
+    return _bucket_cache["names"]
+
+
+async def collections_for_range(db, start: datetime = None, end: datetime = None):
+    """Collections that can hold events created between start and end, newest first"""
+    if not is_bucketed():
+        return [db[COLLECTION_NAME]]
+    existing = await list_buckets(db)
+    current = bucket_name(datetime.utcnow())
+    if current not in existing:
+        # Another worker may have opened this month's bucket since the listing
+        existing = [current] + existing
+    if start is None and end is None:
+        return [db[name] for name in existing]
+    lower = (start.year, start.month) if start else (0, 0)
+    upper = (end.year, end.month) if end else (9999, 12)
+    return [db[name] for name in existing if lower <= bucket_month(name) <= upper]
+
+
+async def resume_collections(db, host_id: str, user_id: str):
+    """Buckets searched (newest first) when looking up a resume position
+
+    Starts at the bucket recorded in watch_event_latest; none are searched
+    when the user never watched the video.
+    """
+    if not is_bucketed():
+        return [db[COLLECTION_NAME]]
+    latest = await db[LATEST_COLLECTION].find_one({"user_id": user_id, "host_id": host_id})
+    if latest is None:
+        return []
+    newest = latest["bucket"]
+    older = [name for name in await list_buckets(db) if name < newest]
+    return [db[name] for name in ([newest] + older)[:settings.watch_event_bucket_lookback]]
+
+
+async def record_latest(db, documents):
+    """Point each document's (user, video) at its bucket in watch_event_latest
+
+    Called before the documents are inserted, so a pointer never lags its
+    events; this worker skips pointers it already wrote.
+    """
+    newest = {}
+    for document in documents:
+        key = (document["user_id"], document["host_id"])
+        name = bucket_name(document.get("created_at") or datetime.utcnow())
+        if name > newest.get(key, ""):
+            newest[key] = name
+    pending = {key: name for key, name in newest.items() if _latest.get(key, "") < name}
+    if not pending:
+        return
+    collection = db[LATEST_COLLECTION]
+    if LATEST_COLLECTION not in _indexed:
+        await collection.create_index([("user_id", 1), ("host_id", 1)], unique=True)
+        _indexed.add(LATEST_COLLECTION)
+    await asyncio.gather(*(
+        collection.update({"user_id": user_id, "host_id": host_id}, {"$max": {"bucket": name}}, upsert=True)
+        for (user_id, host_id), name in pending.items()
+    ))
+    for key, name in pending.items():
+        _latest[key] = name
+        _latest.move_to_end(key)
+    while len(_latest) > LATEST_MEMO_SIZE:
+        _latest.popitem(last=False)
+
+
+async def ensure_indexes(collection):
+    """Create the resume-lookup and time-range indexes once per collection"""
+    if collection.name in _indexed:
+        return
+    await collection.create_index(RESUME_INDEX)
+    await collection.create_index([("created_at", 1)])
+    _indexed.add(collection.name)
+
+
+async def insert_documents(db, documents, ordered: bool = True):
+    """Insert event documents, routing each to its bucket"""
+    grouped = {}
+    for document in documents:
+        collection = collection_for(db, document.get("created_at"))
+        grouped.setdefault(collection.name, []).append(document)
+    inserted_ids = []
+    first_error = None
+    if is_bucketed():
+        await record_latest(db, documents)
+    for name, docs in grouped.items():
+        collection = db[name]
+        try:
+            await ensure_indexes(collection)
+            ids = await collection.insert_many(docs, ordered=ordered)
+        except Exception as e:
+            if ordered:
+                raise
+            # Unordered inserts still try every bucket before reporting
+            first_error = first_error or e
+            continue
+        inserted_ids += ids
+    if first_error is not None:
+        raise first_error
+    return inserted_ids
+
+
+async def drop_before(db, cutoff: datetime) -> dict:
+    """Retention: remove every event created before cutoff"""
+    if not is_bucketed():
+        deleted = await db[COLLECTION_NAME].delete({"created_at": {"$lt": cutoff}}, many=True)
+        return {"dropped_collections": [], "deleted": deleted}
+    dropped = []
+    deleted = 0
+    cutoff_month = (cutoff.year, cutoff.month)
+    for name in await list_buckets(db, refresh=True):
+        month = bucket_month(name)
+        if month < cutoff_month:
+            await db.drop_collection(name)
+            _indexed.discard(name)
+            dropped.append(name)
+        elif month == cutoff_month:
+            # The boundary month is only partially expired
+            deleted += await db[name].delete({"created_at": {"$lt": cutoff}}, many=True)
+    # Pointers into dropped buckets would only cost a wasted lookup
+    await db[LATEST_COLLECTION].delete({"bucket": {"$lt": bucket_name(cutoff)}}, many=True)
+    _latest.clear()
+    _bucket_cache["names"] = None
+    return {"dropped_collections": dropped, "deleted": deleted}
@@ -0,0 +1,89 @@
+"""
+Move watch events between the flat and monthly bucketed layouts.
+
+Usage:
+    python -m app.watch_events.migrate --to monthly
+    python -m app.watch_events.migrate --to flat --drop-source
+
+Documents keep their `_id`, so an interrupted migration can simply be run
+again: already copied documents are skipped as duplicates. Switch
+WATCH_EVENT_LAYOUT once the copy has finished.
+"""
+import argparse
+import asyncio
+import time
+
+from pymongo.errors import BulkWriteError
+
+from app.db import get_storage
+
+from . import layout
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+async def _copy_batch(db, target: str, documents) -> int:
+    grouped = {}
+    for document in documents:
+        if target == "monthly":
+            name = layout.bucket_name(document["created_at"])
+        else:
+            name = layout.COLLECTION_NAME
+        grouped.setdefault(name, []).append(document)
+    copied = 0
+    if target == "monthly":
+        await layout.record_latest(db, documents)
+    for name, docs in grouped.items():
+        collection = db[name]
+        await layout.ensure_indexes(collection)
+        try:
+            copied += len(await collection.insert_many(docs, ordered=False))
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if not all(error.get("code") == DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            copied += e.details.get("nInserted", 0)
+    return copied
+
+
+async def migrate(target: str, batch_size: int = 5000, drop_source: bool = False) -> dict:
+    """Copy every watch event into the target layout ("monthly" or "flat")"""
+    db = get_storage()
+    if target == "monthly":
+        sources = [layout.COLLECTION_NAME]
+    else:
+        sources = await layout.list_buckets(db, refresh=True)
+
+    started = time.perf_counter()
+    scanned = 0
+    copied = 0
+    for source in sources:
+        async for batch in db[source].iterate({}, sort=[("_id", 1)], batch_size=batch_size):
+            copied += await _copy_batch(db, target, batch)
+            scanned += len(batch)
+            print(f"{source}: {scanned} scanned, {copied} copied")
+        if drop_source:
+            await db.drop_collection(source)
+
+    return {
+        "target": target,
+        "sources": sources,
+        "scanned": scanned,
+        "copied": copied,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate watch events between storage layouts")
+    parser.add_argument("--to", dest="target", choices=["monthly", "flat"], required=True)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-source", action="store_true",
+                        help="drop the source collection(s) after copying")
+    args = parser.parse_args()
+    report = asyncio.run(migrate(args.target, args.batch_size, args.drop_source))
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
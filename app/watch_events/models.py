@@ -1,12 +1,22 @@
+import logging
 import uuid
 from datetime import datetime
 from typing import Optional
+from bson import ObjectId
 from pydantic import Field
 from app.models.base import BaseMongoModel, PyObjectId
-from app.db import get_database
+from app.db import get_storage
+
+from . import layout
+from .buffer import write_buffer
+from .exceptions import WriteBufferFullException
+
+logger = logging.getLogger(__name__)
 
 
 class WatchEvent(BaseMongoModel):
+    collection_name = layout.COLLECTION_NAME
+
     host_id: str = Field(...)
     event_id: str = Field(default_factory=lambda: str(uuid.uuid1()))
     user_id: str = Field(...)
@@ -41,47 +51,52 @@ class WatchEvent(BaseMongoModel):
         """Get resume time for a video"""
         try:
             resume_time = 0
-            db = get_database()
-            
-            print(f"Looking for watch events for host_id: {host_id}, user_id: {user_id}")
+            db = get_storage()
             
-            # Get the most recent watch event for this video and user
-            watch_event = await db.watch_events.find_one(
-                {"host_id": host_id, "user_id": user_id},
-                sort=[("created_at", -1)]  # Most recent first
-            )
-            
-            print(f"Found watch event: {watch_event is not None}")
+            # Get the most recent watch event for this video and user,
+            # walking monthly buckets newest first when partitioned
+            watch_event = None
+            for collection in await layout.resume_collections(db, host_id, user_id):
+                watch_event = await collection.find_one(
+                    {"host_id": host_id, "user_id": user_id},
+                    sort=[("created_at", -1)]  # Most recent first
+                )
+                if watch_event:
+                    break
+            # A buffered (not yet flushed) event may be older than one that
+            # was admitted and inserted directly after it
+            buffered = write_buffer.peek(host_id, user_id)
+            if buffered is not None and (watch_event is None or buffered["created_at"] > watch_event["created_at"]):
+                watch_event = dict(buffered)
             
             if watch_event:
-                # Convert ObjectId to string for Pydantic model
-                watch_event['id'] = str(watch_event['_id'])
+                # Convert ObjectId to string for Pydantic model; a buffered
+                # document still holds the PyObjectId, whose str() is not hex
+                watch_event['id'] = str(ObjectId(watch_event['_id']))
                 del watch_event['_id']
                 obj = cls(**watch_event)
                 
                 # If video is not complete, resume from where they left off
                 if not obj.complete and not obj.completed:
                     resume_time = obj.end_time
-                    print(f"Video not complete, resume time set to: {resume_time}")
-                else:
-                    print(f"Video is complete, resume time: 0")
-            else:
-                print(f"No watch events found for this video/user combination")
+            logger.debug("Resume time for %s: %s (event found: %s)", host_id, resume_time, watch_event is not None)
             
             return resume_time
-        except Exception as e:
-            print(f"Error in get_resume_time: {e}")
+        except Exception:
+            logger.exception("Error in get_resume_time")
             return 0
 
     @classmethod
     async def create_watch_event(cls, host_id: str, user_id: str, path: str, 
                                 start_time: float, end_time: float, duration: float, 
-                                complete: bool = False):
-        """Create a new watch event"""
+                                complete: bool = False, buffered: bool = False):
+        """Create a new watch event
+
+        With buffered=True the event is coalesced into the write buffer
+        instead of being inserted right away.
+        """
         try:
-            db = get_database()
-            
-            print(f"Creating watch event - host_id: {host_id}, user_id: {user_id}, end_time: {end_time}")
+            db = get_storage()
             
             watch_event_data = {
                 "host_id": host_id,
@@ -96,13 +111,53 @@ class WatchEvent(BaseMongoModel):
             
             watch_event = cls(**watch_event_data)
             
-            # Save to database
-            result = await db.watch_events.insert_one(watch_event.to_mongo())
-            watch_event.id = result.inserted_id
+            if buffered:
+                if not write_buffer.add(watch_event.to_mongo()):
+                    raise WriteBufferFullException("Watch event write buffer is full")
+                return watch_event
             
-            print(f"Watch event created with ID: {result.inserted_id}")
+            # Save to database
+            collection = layout.collection_for(db, watch_event.created_at)
+            await layout.ensure_indexes(collection)
+            if layout.is_bucketed():
+                await layout.record_latest(db, [watch_event.to_mongo()])
+            watch_event.id = await collection.insert(watch_event.to_mongo())
             
             return watch_event
-        except Exception as e:
-            print(f"Error creating watch event: {e}")
-            raise e
+        except Exception:
+            logger.exception("Error creating watch event")
+            raise
+
+    @classmethod
+    async def find_in_range(cls, start: datetime = None, end: datetime = None,
+                            user_id: str = None, host_id: str = None, limit: int = 1000):
+        """Get watch events created between start and end, newest first"""
+        db = get_storage()
+        query = {}
+        if start is not None or end is not None:
+            query["created_at"] = {}
+            if start is not None:
+                query["created_at"]["$gte"] = start
+            if end is not None:
+                query["created_at"]["$lt"] = end
+        if user_id is not None:
+            query["user_id"] = user_id
+        if host_id is not None:
+            query["host_id"] = host_id
+
+        events = []
+        for collection in await layout.collections_for_range(db, start, end):
+            documents = await collection.find_many(query, sort=[("created_at", -1)], limit=limit - len(events))
+            for event_data in documents:
+                event_data['id'] = str(event_data['_id'])
+                del event_data['_id']
+                events.append(cls(**event_data))
+            if len(events) >= limit:
+                break
+        return events
+
+    @classmethod
+    async def purge_before(cls, cutoff: datetime):
+        """Retention: delete all watch events created before cutoff"""
+        db = get_storage()
+        return await layout.drop_before(db, cutoff)
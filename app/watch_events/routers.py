@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Request, HTTPException
+import logging
 
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.users.dependencies import require_admin
+
+from .admission import admission_controller, PRIORITY_HIGH, PRIORITY_LOW
+from .buffer import write_buffer
+from .exceptions import WatchEventRejectedException, WriteBufferFullException
 from .models import WatchEvent
 from .schemas import WatchEventSchema
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix='/watch-events',
     tags=["Watch Events"]
@@ -18,31 +28,62 @@ async def api_watch_event_view(
     if not request.user.is_authenticated:
         raise HTTPException(status_code=401, detail={"error": "Authentication required"})
     
-    print(f"Creating watch event for user: {request.user.user_id}")
-    
     cleaned_data = watch_event.model_dump()
     data = cleaned_data.copy()
     data.update({
         "user_id": request.user.user_id  # Use user_id instead of username
     })
     
+    event_kwargs = dict(
+        host_id=data['host_id'],
+        user_id=data['user_id'],
+        path=data['path'],
+        start_time=data['start_time'],
+        end_time=data['end_time'],
+        duration=data['duration'],
+        complete=data.get('complete', False)
+    )
+    # Completion events are worth waiting for, progress heartbeats are not
+    priority = PRIORITY_HIGH if event_kwargs['complete'] else PRIORITY_LOW
+    
     try:
-        await WatchEvent.create_watch_event(
-            host_id=data['host_id'],
-            user_id=data['user_id'],
-            path=data['path'],
-            start_time=data['start_time'],
-            end_time=data['end_time'],
-            duration=data['duration'],
-            complete=data.get('complete', False)
-        )
-        print(f"Watch event created successfully for video: {data['host_id']}")
+        async with admission_controller.admit(priority):
+            await WatchEvent.create_watch_event(**event_kwargs)
         return {"message": "Watch event recorded successfully"}
+    except WatchEventRejectedException as e:
+        if e.degradable:
+            try:
+                await WatchEvent.create_watch_event(buffered=True, **event_kwargs)
+                return JSONResponse(status_code=202, content={"message": "Watch event queued"})
+            except WriteBufferFullException:
+                admission_controller.mark_shed()
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        print(f"Error creating watch event: {e}")
+        logger.warning("Error creating watch event: %s", e)
         raise HTTPException(status_code=400, detail={"error": f"Error recording watch event: {str(e)}"})
 
 
+@router.get(
+    "/api/watch-events/admission",
+    summary="Watch Event Admission Stats",
+    description="Admit, shed and buffer counters for the watch-event write path",
+    dependencies=[Depends(require_admin)]
+)
+async def api_watch_event_admission_view(request: Request):
+    return {
+        "admission": admission_controller.get_stats(),
+        "buffer": {
+            **write_buffer.stats,
+            "depth": len(write_buffer),
+            "max_size": write_buffer.max_size
+        }
+    }
+
+
 @router.get("/api/watch-events/{host_id}/resume", summary="Get Resume Time", description="Get the resume time for a video")
 async def api_watch_event_resume_view(
     request: Request, 
@@ -50,20 +91,16 @@ async def api_watch_event_resume_view(
 ):
     # Check authentication using session
     if not request.user.is_authenticated:
-        print(f"User not authenticated for resume request")
         raise HTTPException(status_code=401, detail={"error": "Authentication required"})
     
-    print(f"Getting resume time for video: {host_id}, user: {request.user.user_id}")
-    
     user_id = request.user.user_id  # Use user_id instead of username
     try:
         resume_time = await WatchEvent.get_resume_time(host_id, user_id)
-        print(f"Resume time for {host_id}: {resume_time}")
         
         return {
             "host_id": host_id,
             "resume_time": resume_time
         }
     except Exception as e:
-        print(f"Error getting resume time: {e}")
+        logger.exception("Error getting resume time")
         raise HTTPException(status_code=500, detail={"error": f"Error getting resume time: {str(e)}"})
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Cold-start report: import time, startup phases and first-request latency.
+
+Every run starts a fresh interpreter, the way an autoscaled worker does:
+
+    import     python -X importtime -c "import app.main", summed per top-level
+               package by self time, so heavy dependencies stand out
+    startup    imports app.main, runs the lifespan startup and serves a first
+               HTML page and a first JSON request through the ASGI transport;
+               ready_ms is wall time from process spawn to startup complete
+
+The report gives medians over --runs. The memory storage backend is used
+unless --uri points at MongoDB (then connection warm-up is included).
+
+Usage:
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --uri mongodb://localhost:27017 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import asyncio, json, time
+import httpx
+from app import main
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.time()
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            timings = {}
+            for name, path in (("first_page_ms", "/"), ("first_api_ms", "/videos/api/videos")):
+                started = time.perf_counter()
+                await client.get(path)
+                timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    print(json.dumps({**main.STARTUP_REPORT, **timings, "ready_at": ready}))
+
+asyncio.run(run())
+"""
+
+
+def child_environment(args) -> dict:
+    environment = dict(os.environ)
+    environment.setdefault("SECRET_KEY", "benchmark")
+    for name in ("ALGOLIA_APP_ID", "ALGOLIA_API_KEY", "ALGOLIA_INDEX_NAME"):
+        environment.setdefault(name, "")
+    environment["LOG_LEVEL"] = "WARNING"
+    environment["PYTHONPATH"] = str(ROOT)
+    if args.uri:
+        environment["STORAGE_BACKEND"] = "mongo"
+        environment["MONGODB_URI"] = args.uri
+        environment["MONGODB_DATABASE"] = args.database
+    else:
+        environment["STORAGE_BACKEND"] = "memory"
+    return environment
+
+
+def import_profile(environment) -> dict:
+    """Self time per top-level package, and app.main's cumulative time, in ms"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=environment, capture_output=True, text=True, check=True
+    )
+    packages = defaultdict(float)
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if name == "app.main":
+            total = int(cumulative_us) / 1000
+    return {"total_ms": total, "packages": packages}
+
+
+def startup_profile(environment) -> dict:
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=environment, capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["ready_ms"] = round((report.pop("ready_at") - spawned) * 1000, 1)
+    return report
+
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def main(args):
+    environment = child_environment(args)
+    imports = [import_profile(environment) for _ in range(args.runs)]
+    startups = [startup_profile(environment) for _ in range(args.runs)]
+
+    packages = defaultdict(list)
+    for run in imports:
+        for package, milliseconds in run["packages"].items():
+            packages[package].append(milliseconds)
+    heaviest = sorted(((median(values), package) for package, values in packages.items()), reverse=True)
+
+    phases = sorted({phase for run in startups for phase in run["phases"]})
+    report = {
+        "runs": args.runs,
+        "storage": environment["STORAGE_BACKEND"],
+        "import": {
+            "app_main_ms": median(run["total_ms"] for run in imports),
+            "packages_self_ms": {package: milliseconds for milliseconds, package in heaviest[:args.top]},
+        },
+        "startup": {
+            "import_ms": median(run["import_ms"] for run in startups),
+            "startup_ms": median(run["startup_ms"] for run in startups),
+            "phases_ms": {phase: median(run["phases"].get(phase) for run in startups) for phase in phases},
+            "ready_ms": median(run["ready_ms"] for run in startups),
+            "first_page_ms": median(run["first_page_ms"] for run in startups),
+            "first_api_ms": median(run["first_api_ms"] for run in startups),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages listed in the import breakdown")
+    parser.add_argument("--uri", help="MongoDB URI; the memory backend is used when omitted")
+    parser.add_argument("--database", default="video_membership_bench_cold_start")
+    main(parser.parse_args())
@@ -0,0 +1,444 @@
+"""
+Load test: seed a scratch database, then drive a mixed workload.
+
+`seed` fills a scratch database on a local mongod with users, videos with
+titles drawn from a fixed vocabulary, large playlists and watch events
+spread over several months, through the same layout code the app uses.
+`run` boots the app in-process against that database (startup hooks
+included, so the search indexes are built as in production) or targets a
+running server with --base-url. `run --storage memory` needs no mongod: it
+boots the app on the in-memory storage backend and seeds it in-process
+first, with the same dataset options as `seed`. Virtual users log in, then loop over a
+weighted mix of operations:
+
+    browse     GET  /videos/api/videos
+    detail     GET  /videos/api/videos/{host_id}        (with the session's resume lookup)
+    heartbeat  POST /watch-events/api/watch-events      (15 s of progress, then complete)
+    search     GET  /api/search?q=
+    suggest    GET  /api/search/suggest?q=
+    login      POST /auth/login
+
+Popular videos are picked far more often than the long tail. The report is
+JSON: throughput plus count, errors, status codes and latency percentiles
+per operation. In-process runs share one CPU between client and app; use
+--base-url against uvicorn for absolute numbers.
+
+Usage:
+    python benchmarks/load_test.py seed --uri mongodb://localhost:27017 --videos 100000 --events 2000000
+    python benchmarks/load_test.py run --uri mongodb://localhost:27017 --duration 60 --concurrency 50
+    python benchmarks/load_test.py run --base-url http://localhost:8000 --mix heartbeat=80,detail=20
+    python benchmarks/load_test.py run --storage memory --videos 20000 --events 200000 --duration 30
+    python benchmarks/load_test.py drop --uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import motor.motor_asyncio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+META_ID = "load_test"
+PASSWORD = "bench-password-1"
+OPERATIONS = ("browse", "detail", "heartbeat", "search", "suggest", "login")
+DEFAULT_MIX = "browse=20,detail=30,heartbeat=35,search=5,suggest=8,login=2"
+HEARTBEAT_SECONDS = 15.0
+
+
+def vocabulary(size: int = 3000, seed: int = 7):
+    """Deterministic pronounceable words, shared by seeding and querying"""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def skewed(rng, count: int) -> int:
+    """Index in [0, count) where low indexes are much more likely (popular items)"""
+    return min(int(count * rng.random() ** 3), count - 1)
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p90_ms": round(pick(0.90), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def host_id(number: int) -> str:
+    return f"bench{number:06d}"
+
+
+def user_email(number: int) -> str:
+    return f"bench-{number}@example.com"
+
+
+# Seeding
+
+async def insert_batches(collection, documents, batch_size: int, label: str):
+    batch = []
+    written = 0
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await collection.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+            print(f"seeded {written} {label}", file=sys.stderr)
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+async def seed(args):
+    from app.storage.mongo import MongoStorage
+
+    client = motor.motor_asyncio.AsyncIOMotorClient(args.uri)
+    await client.drop_database(args.database)
+    report = await fill(MongoStorage(client[args.database]), args)
+    print(json.dumps(report, indent=2))
+
+
+async def fill(db, args) -> dict:
+    """Seed `db`, through the storage API the app uses (layout and state expect it)"""
+    from app.indexing import state
+    from app.users import security
+    from app.watch_events import layout
+
+    rng = random.Random(args.seed)
+    words = vocabulary()
+    now = datetime.utcnow()
+    timings = {}
+
+    # One argon2 hash serves every user: same password, and hashing a
+    # thousand times would dominate seeding
+    password_hash = security.generate_hash(PASSWORD)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(args.users)]
+    started = time.perf_counter()
+    await insert_batches(db.users, (
+        {
+            "email": user_email(number),
+            "user_id": user_ids[number],
+            "username": f"bench{number}",
+            "password": password_hash,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for number in range(args.users)
+    ), args.batch_size, "users")
+    timings["users"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await insert_batches(db.videos, (
+        {
+            "host_id": host_id(number),
+            "db_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "host_service": "youtube",
+            "title": " ".join(rng.choices(words, k=rng.randint(2, 6))).title(),
+            "url": f"https://www.youtube.com/watch?v={host_id(number)}",
+            "user_id": user_ids[rng.randrange(args.users)],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for number in range(args.videos)
+    ), args.batch_size, "videos")
+    timings["videos"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await insert_batches(db.playlists, (
+        {
+            "db_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": user_ids[rng.randrange(args.users)],
+            "title": " ".join(rng.choices(words, k=rng.randint(1, 4))).title(),
+            "host_ids": [host_id(skewed(rng, args.videos)) for _ in range(rng.randint(1, args.playlist_size))],
+            "updated": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for _ in range(args.playlists)
+    ), max(args.batch_size // 100, 1), "playlists")
+    timings["playlists"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    span = timedelta(days=30 * args.months).total_seconds()
+    batch = []
+    written = 0
+    for _ in range(args.events):
+        created_at = now - timedelta(seconds=rng.random() * span)
+        duration = rng.choice([120.0, 300.0, 600.0, 1800.0])
+        end_time = rng.random() * duration
+        batch.append({
+            "host_id": host_id(skewed(rng, args.videos)),
+            "event_id": str(uuid.uuid1()),
+            "user_id": user_ids[skewed(rng, args.users)],
+            "path": "/videos/bench",
+            "start_time": max(0.0, end_time - HEARTBEAT_SECONDS),
+            "end_time": end_time,
+            "duration": duration,
+            "complete": end_time > duration * 0.95,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        if len(batch) >= args.batch_size:
+            await layout.insert_documents(db, batch, ordered=False)
+            written += len(batch)
+            batch = []
+            print(f"seeded {written}/{args.events} watch events", file=sys.stderr)
+    if batch:
+        await layout.insert_documents(db, batch, ordered=False)
+    timings["watch_events"] = time.perf_counter() - started
+
+    # Only the indexes the app creates itself, so results match production
+    await state.ensure_indexes(db)
+    meta = {
+        "users": args.users,
+        "videos": args.videos,
+        "playlists": args.playlists,
+        "events": args.events,
+        "seeded_at": now,
+    }
+    await db.bench_meta.update({"_id": META_ID}, {"$set": meta}, upsert=True)
+    return {**meta, "seeded_at": now.isoformat(), "seconds": {k: round(v, 2) for k, v in timings.items()}}
+
+
+# Workload
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.recording = False
+
+    def record(self, operation: str, status, seconds: float):
+        if not self.recording:
+            return
+        self.latencies.setdefault(operation, []).append(seconds)
+        statuses = self.statuses.setdefault(operation, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status == "error" or status >= 400:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def report(self, seconds: float) -> dict:
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "seconds": round(seconds, 2),
+            "requests": total,
+            "requests_per_second": round(total / seconds, 1) if seconds else 0,
+            "operations": {
+                operation: {
+                    "count": len(samples),
+                    "errors": self.errors.get(operation, 0),
+                    "requests_per_second": round(len(samples) / seconds, 1) if seconds else 0,
+                    "status": self.statuses[operation],
+                    **percentiles(samples),
+                }
+                for operation, samples in sorted(self.latencies.items())
+            },
+        }
+
+
+class VirtualUser:
+    def __init__(self, client, recorder: Recorder, meta: dict, words, rng):
+        self.client = client
+        self.recorder = recorder
+        self.meta = meta
+        self.words = words
+        self.rng = rng
+        self.email = user_email(skewed(rng, meta["users"]))
+        self.watching = None  # [host_id, position, duration]
+
+    async def request(self, operation: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = "error"
+        self.recorder.record(operation, status, time.perf_counter() - started)
+
+    def pick_video(self) -> str:
+        return host_id(skewed(self.rng, self.meta["videos"]))
+
+    def pick_query(self) -> str:
+        return self.rng.choice(self.words[:500])
+
+    async def login(self):
+        await self.request("login", "POST", "/auth/login", data={"email": self.email, "password": PASSWORD})
+
+    async def browse(self):
+        await self.request("browse", "GET", "/videos/api/videos")
+
+    async def detail(self):
+        await self.request("detail", "GET", f"/videos/api/videos/{self.pick_video()}")
+
+    async def heartbeat(self):
+        if self.watching is None:
+            self.watching = [self.pick_video(), 0.0, self.rng.choice([120.0, 300.0, 600.0, 1800.0])]
+        video, position, duration = self.watching
+        end_time = min(position + HEARTBEAT_SECONDS, duration)
+        complete = end_time >= duration
+        await self.request("heartbeat", "POST", "/watch-events/api/watch-events", json={
+            "host_id": video,
+            "start_time": position,
+            "end_time": end_time,
+            "duration": duration,
+            "complete": complete,
+            "path": f"/videos/{video}",
+        })
+        self.watching = None if complete else [video, end_time, duration]
+
+    async def search(self):
+        await self.request("search", "GET", "/api/search", params={"q": self.pick_query()})
+
+    async def suggest(self):
+        query = self.pick_query()
+        await self.request("suggest", "GET", "/api/search/suggest",
+                           params={"q": query[:self.rng.randint(1, len(query))]})
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def load_app(args):
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.environ["MONGODB_URI"] = args.uri
+    os.environ["MONGODB_DATABASE"] = args.database
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from app.main import app
+    return app
+
+
+async def run(args):
+    if args.storage == "memory":
+        if args.base_url:
+            raise SystemExit("--storage memory boots the app in-process; it cannot be combined with --base-url")
+        load_app(args)
+        from app.db import get_storage
+
+        # Seeded before startup so the search indexes are built over the data
+        print(json.dumps(await fill(get_storage(), args), indent=2), file=sys.stderr)
+        meta = await get_storage().bench_meta.find_one({"_id": META_ID})
+    else:
+        database = motor.motor_asyncio.AsyncIOMotorClient(args.uri)[args.database]
+        meta = await database.bench_meta.find_one({"_id": META_ID})
+        if meta is None:
+            raise SystemExit(f"{args.database} is not seeded; run `seed` first")
+    weights = parse_mix(args.mix)
+    operations, weight_values = list(weights), list(weights.values())
+    words = vocabulary()
+    recorder = Recorder()
+
+    lifespan = contextlib.AsyncExitStack()
+    if args.base_url:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+        base_url = args.base_url
+    else:
+        app = load_app(args)
+        # ASGITransport does not send lifespan events; run startup/shutdown here
+        await lifespan.enter_async_context(app.router.lifespan_context(app))
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://bench"
+
+    deadline = None
+    stopped = asyncio.Event()
+
+    async def virtual_user(number: int):
+        rng = random.Random(args.seed + number)
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+            user = VirtualUser(client, recorder, meta, words, rng)
+            await user.login()
+            while not stopped.is_set():
+                operation = rng.choices(operations, weight_values)[0]
+                await getattr(user, operation)()
+                # In-process requests on the memory backend may never suspend;
+                # yield so the clock and the other users get to run
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms) if args.think_ms else 0)
+
+    async def clock():
+        nonlocal deadline
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stopped.set()
+        deadline = time.perf_counter() - started
+
+    async with lifespan:
+        await asyncio.gather(clock(), *(virtual_user(number) for number in range(args.concurrency)))
+    report = {
+        "target": args.base_url or "in-process",
+        "concurrency": args.concurrency,
+        "think_ms": args.think_ms,
+        "mix": weights,
+        "dataset": {key: meta[key] for key in ("users", "videos", "playlists", "events")},
+        **recorder.report(deadline),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+async def drop(args):
+    await motor.motor_asyncio.AsyncIOMotorClient(args.uri).drop_database(args.database)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("seed", "run", "drop"):
+        command = commands.add_parser(name)
+        command.add_argument("--uri", default="mongodb://localhost:27017")
+        command.add_argument("--database", default="video_membership_bench_load")
+        command.add_argument("--seed", type=int, default=42)
+    # Dataset options; `run` uses them with --storage memory
+    for name in ("seed", "run"):
+        command = commands.choices[name]
+        command.add_argument("--users", type=int, default=10_000)
+        command.add_argument("--videos", type=int, default=100_000)
+        command.add_argument("--playlists", type=int, default=5_000)
+        command.add_argument("--playlist-size", type=int, default=1_000, help="largest playlist")
+        command.add_argument("--events", type=int, default=2_000_000)
+        command.add_argument("--months", type=int, default=6)
+        command.add_argument("--batch-size", type=int, default=10_000)
+    run_parser = commands.choices["run"]
+    run_parser.add_argument("--storage", choices=("mongo", "memory"), default="mongo",
+                            help="memory: seed and run on the in-memory backend, no mongod needed")
+    run_parser.add_argument("--base-url", help="drive a running server instead of booting the app in-process")
+    run_parser.add_argument("--duration", type=float, default=60)
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds run before recording")
+    run_parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    run_parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's requests")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,...")
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    asyncio.run({"seed": seed, "run": run, "drop": drop}[args.command](args))
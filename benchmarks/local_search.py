@@ -0,0 +1,115 @@
+"""
+Query latency of the in-process search backend.
+
+Builds a LocalSearchIndex over synthetic video/playlist titles and times
+exact, multi-word, prefix (search-as-you-type) and typo queries.
+
+Usage:
+    python benchmarks/local_search.py --documents 100000
+"""
+import argparse
+import itertools
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.local import LocalSearchIndex  # noqa: E402
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        length = rng.randint(3, 10)
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(length)))
+    return sorted(words)
+
+
+def make_records(count, vocabulary, rng):
+    # Zipf-like word popularity, like real titles
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for number in range(count):
+        title = " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(2, 8)))
+        if number % 5 == 0:
+            yield {"objectID": f"playlist-{number}", "objectType": "Playlist", "title": title,
+                   "path": f"/playlists/playlist-{number}"}
+        else:
+            yield {"objectID": f"video-{number}", "objectType": "Video", "title": title,
+                   "path": f"/videos/video-{number}"}
+
+
+def typo(word, rng):
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def make_queries(kind, count, vocabulary, rng):
+    common = vocabulary[:500]
+    long_words = [word for word in common if len(word) >= 5]
+    queries = []
+    for _ in range(count):
+        word = rng.choice(common)
+        if kind == "exact":
+            queries.append(word)
+        elif kind == "multi_word":
+            queries.append(f"{word} {rng.choice(common)}")
+        elif kind == "prefix":
+            queries.append(word[:max(1, len(word) // 2)])
+        elif kind == "typo":
+            queries.append(typo(rng.choice(long_words), rng))
+    return queries
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return {"p50_ms": round(pick(0.50), 3), "p95_ms": round(pick(0.95), 3), "p99_ms": round(pick(0.99), 3)}
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    rng.shuffle(vocabulary)
+    index = LocalSearchIndex()
+
+    records = list(make_records(args.documents, vocabulary, rng))
+    started = time.perf_counter()
+    for position in range(0, len(records), 1000):
+        index.save_objects(records[position:position + 1000])
+    build_seconds = time.perf_counter() - started
+    del records
+
+    report = {
+        "documents": len(index),
+        "vocabulary": args.vocabulary,
+        "build_seconds": round(build_seconds, 2),
+        "queries": {},
+    }
+    for kind in ("exact", "multi_word", "prefix", "typo"):
+        samples = []
+        hits = 0
+        for query in make_queries(kind, args.queries, vocabulary, rng):
+            started = time.perf_counter()
+            results = index.search(query)
+            samples.append(time.perf_counter() - started)
+            hits += results["nbHits"] > 0
+        report["queries"][kind] = {**percentiles(samples), "with_hits": hits}
+
+    started = time.perf_counter()
+    for record in make_records(args.queries, vocabulary, rng):
+        index.save_objects([record])
+    report["incremental_update_us"] = round((time.perf_counter() - started) / args.queries * 1e6, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
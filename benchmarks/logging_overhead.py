@@ -0,0 +1,145 @@
+"""
+Request throughput with logging on and off.
+
+Drives a small FastAPI app in-process (through httpx's ASGI transport) whose
+endpoint logs four lines per request, like the watch-event resume path
+used to print. Modes:
+
+    print  - print() to the output stream (the old behaviour)
+    off    - logger.debug with the default INFO level (debug chatter off)
+    sync   - logger.info through a plain StreamHandler, JSON lines
+    queue  - logger.info through app.logging_config (queue + JSON lines)
+
+Usage:
+    python benchmarks/logging_overhead.py --requests 5000
+    python benchmarks/logging_overhead.py --write-delay-us 50  # slow stdout pipe
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.logging_config import (  # noqa: E402
+    JsonFormatter,
+    RequestIdFilter,
+    RequestIdMiddleware,
+    configure_logging,
+    shutdown_logging
+)
+
+logger = logging.getLogger("benchmark")
+
+
+class SlowStream:
+    """File wrapper whose writes block, like stdout piped to a busy log collector"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def make_app(mode: str):
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/resume/{host_id}")
+    async def resume(host_id: str):
+        if mode == "print":
+            print(f"Getting resume time for video: {host_id}, user: user-1")
+            print(f"Looking for watch events for host_id: {host_id}, user_id: user-1")
+            print("Found watch event: True")
+            print(f"Resume time for {host_id}: 42.0")
+        elif mode == "off":
+            for _ in range(4):
+                logger.debug("Resume time for %s: %s", host_id, 42.0)
+        else:
+            for _ in range(4):
+                logger.info("Resume time for %s: %s", host_id, 42.0)
+        return {"host_id": host_id, "resume_time": 42.0}
+
+    return app
+
+
+def setup(mode: str, stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode == "queue":
+        configure_logging("INFO", "json", stream=stream)
+    elif mode == "sync":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RequestIdFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        root.setLevel(logging.INFO)
+    # One line per request from the client side would double the volume
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def drive(app, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        counter = iter(range(requests))
+
+        async def worker():
+            for number in counter:
+                response = await client.get(f"/resume/video-{number}")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def main(args):
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "write_delay_us": args.write_delay_us,
+        "modes": {},
+    }
+    # Warm up imports and code paths so the first mode is not penalized
+    asyncio.run(drive(make_app("off"), 200, args.concurrency))
+    for mode in args.modes:
+        with open(args.output, "w") as output:
+            stream = SlowStream(output, args.write_delay_us / 1e6) if args.write_delay_us else output
+            setup(mode, stream)
+            redirect = contextlib.redirect_stdout(stream) if mode == "print" else contextlib.nullcontext()
+            with redirect:
+                seconds = asyncio.run(drive(make_app(mode), args.requests, args.concurrency))
+            shutdown_logging()
+        report["modes"][mode] = {
+            "seconds": round(seconds, 3),
+            "requests_per_second": round(args.requests / seconds, 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", default="/tmp/logging_overhead.log",
+                        help="where log lines go")
+    parser.add_argument("--write-delay-us", type=float, default=0,
+                        help="block every write this long, to simulate a slow log pipe")
+    parser.add_argument("--modes", nargs="+", default=["off", "print", "sync", "queue"])
+    main(parser.parse_args())
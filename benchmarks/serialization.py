@@ -0,0 +1,243 @@
+"""
+Microbenchmarks for the model layer and serialization.
+
+Times the per-document steps of the list endpoints and the index pipeline
+on synthetic video documents shaped the way the storage layer returns them:
+
+    construct      Video(**document) after the router's _id/datetime fixups
+    model_dump     Video.model_dump() (forced exclude_none, id stringified)
+    to_mongo       Video.to_mongo(), the second dump done for writes
+    object_id      PyObjectId validation of a hex string
+    index_schema   VideoIndexSchema(**document).model_dump(), as the pipeline does
+    json           jsonable_encoder + json.dumps of dumped videos, as FastAPI responds
+    list_endpoint  the whole /videos/api/videos conversion loop plus JSON encoding
+
+Every case runs at each batch size; the report gives the median microseconds
+per document over --repeat runs, and how many warnings (e.g. pydantic
+serializer warnings) each document raised, since emitting those is part of
+the cost. Save a report as a baseline and compare later runs against it;
+--compare exits with status 1 when a case got slower than the threshold
+allows.
+
+Usage:
+    python benchmarks/serialization.py --save /tmp/serialization-baseline.json
+    python benchmarks/serialization.py --compare /tmp/serialization-baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pydantic  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.indexing.schemas import VideoIndexSchema  # noqa: E402
+from app.models.base import PyObjectId  # noqa: E402
+from app.videos.models import Video  # noqa: E402
+
+MIN_DOCUMENTS = 2000  # documents processed per timed run, so tiny batches stay measurable
+
+
+def make_documents(count: int, rng) -> list:
+    """Video documents as find_many returns them: ObjectId _id, datetime fields"""
+    created = datetime(2024, 1, 1)
+    documents = []
+    for number in range(count):
+        host_id = "".join(rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
+                          for _ in range(11))
+        at = created + timedelta(seconds=rng.randrange(10_000_000))
+        documents.append({
+            "_id": ObjectId(),
+            "host_id": host_id,
+            "db_id": f"00000000-0000-1000-8000-{number:012d}",
+            "host_service": "youtube",
+            "title": f"Video {number} about {rng.choice(['python', 'fastapi', 'mongodb', 'cooking'])}",
+            "url": f"https://www.youtube.com/watch?v={host_id}",
+            "user_id": f"00000000-0000-1000-8000-{rng.randrange(1000):012d}",
+            "created_at": at,
+            "updated_at": at,
+        })
+    return documents
+
+
+def router_fixups(video_data: dict) -> dict:
+    """The _id and datetime conversion api_video_list_view does by hand"""
+    if '_id' in video_data:
+        video_data['id'] = str(video_data['_id'])
+        del video_data['_id']
+    for field in ['created_at', 'updated_at']:
+        if field in video_data and hasattr(video_data[field], 'isoformat'):
+            video_data[field] = video_data[field].isoformat()
+    return video_data
+
+
+def encode(payload) -> bytes:
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+
+object_id_adapter = TypeAdapter(PyObjectId)
+
+
+def case_construct(batch):
+    for document in batch:
+        Video(**router_fixups(dict(document)))
+
+
+def case_model_dump(batch):
+    for video in batch:
+        video.model_dump()
+
+
+def case_to_mongo(batch):
+    for video in batch:
+        video.to_mongo()
+
+
+def case_object_id(batch):
+    for hex_id in batch:
+        object_id_adapter.validate_python(hex_id)
+
+
+def case_index_schema(batch):
+    for document in batch:
+        VideoIndexSchema(**document).model_dump()
+
+
+def case_json(batch):
+    encode({"videos": batch, "count": len(batch)})
+
+
+def case_list_endpoint(batch):
+    videos = [Video(**router_fixups(dict(document))).model_dump() for document in batch]
+    encode({"videos": videos, "count": len(videos)})
+
+
+# name -> (inputs built from the raw documents, function timed over a batch)
+CASES = {
+    "construct": (lambda documents: documents, case_construct),
+    "model_dump": (lambda documents: [Video(**router_fixups(dict(d))) for d in documents], case_model_dump),
+    "to_mongo": (lambda documents: [Video(**router_fixups(dict(d))) for d in documents], case_to_mongo),
+    "object_id": (lambda documents: [str(d["_id"]) for d in documents], case_object_id),
+    "index_schema": (lambda documents: [{"host_id": d["host_id"], "title": d["title"]} for d in documents],
+                     case_index_schema),
+    "json": (lambda documents: [Video(**router_fixups(dict(d))).model_dump() for d in documents], case_json),
+    "list_endpoint": (lambda documents: documents, case_list_endpoint),
+}
+
+
+def measure(function, inputs, batch_size: int, repeat: int) -> dict:
+    """Median and best microseconds per document over repeat runs
+
+    Warnings are recorded instead of printed, still paying for creating them.
+    """
+    batches = [inputs[start:start + batch_size] for start in range(0, len(inputs), batch_size)]
+    batches = [batch for batch in batches if len(batch) == batch_size]
+    loops = max(1, MIN_DOCUMENTS // batch_size)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for batch in batches[:loops]:
+            function(batch)  # warm up
+    samples = []
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        for run in range(repeat):
+            chosen = [batches[(run * loops + loop) % len(batches)] for loop in range(loops)]
+            started = time.perf_counter()
+            for batch in chosen:
+                function(batch)
+            samples.append((time.perf_counter() - started) / (loops * batch_size) * 1e6)
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "best_us": round(min(samples), 3),
+        "warnings_per_document": round(len(caught) / (repeat * loops * batch_size), 2),
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> dict:
+    """Per case and batch size change against a saved report; change is current/baseline - 1"""
+    rows = []
+    for case, sizes in report["results"].items():
+        for size, current in sizes.items():
+            before = baseline.get("results", {}).get(case, {}).get(size)
+            if before is None:
+                continue
+            change = current["median_us"] / before["median_us"] - 1
+            rows.append({
+                "case": case,
+                "batch_size": int(size),
+                "baseline_us": before["median_us"],
+                "current_us": current["median_us"],
+                "change": round(change, 3),
+                "regressed": change > threshold,
+            })
+    environment_changed = {
+        key: [baseline.get("environment", {}).get(key), value]
+        for key, value in report["environment"].items()
+        if baseline.get("environment", {}).get(key) != value
+    }
+    return {
+        "baseline": baseline.get("created_at"),
+        "threshold": threshold,
+        "environment_changed": environment_changed,
+        "regressions": sum(row["regressed"] for row in rows),
+        "rows": rows,
+    }
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    largest = max(args.batch_sizes)
+    documents = make_documents(max(largest, args.documents), rng)
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pydantic": pydantic.VERSION,
+            "machine": platform.machine(),
+        },
+        "repeat": args.repeat,
+        "results": {},
+    }
+    for case in args.cases:
+        build, function = CASES[case]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            inputs = build(documents)
+        report["results"][case] = {
+            str(size): measure(function, inputs, size, args.repeat) for size in args.batch_sizes
+        }
+
+    status = 0
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        report["comparison"] = compare(report, baseline, args.threshold)
+        status = 1 if report["comparison"]["regressions"] else 0
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.save:
+        Path(args.save).write_text(output)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 10, 100, 1000])
+    parser.add_argument("--documents", type=int, default=5000, help="distinct synthetic documents")
+    parser.add_argument("--repeat", type=int, default=15, help="timed runs per case and batch size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write the report here, to use as a baseline later")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown of the median counted as a regression")
+    sys.exit(main(parser.parse_args()))
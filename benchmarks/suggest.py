@@ -0,0 +1,93 @@
+"""
+Latency of the autocomplete (suggest) index.
+
+Builds a SuggestIndex over synthetic titles with Zipf-like popularity and
+times prefixes of one to eight characters, plus incremental edits and a
+popularity refresh that re-scores the most popular records.
+
+Usage:
+    python benchmarks/suggest.py --documents 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.indexing.suggest import SuggestIndex  # noqa: E402
+from local_search import make_records, make_vocabulary, percentiles  # noqa: E402
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    rng.shuffle(vocabulary)
+    index = SuggestIndex(capacity=10)
+
+    records = list(make_records(args.documents, vocabulary, rng))
+    scores = [int(rng.paretovariate(1.2)) for _ in records]
+    started = time.perf_counter()
+    for record, score in zip(records, scores):
+        index.save(record, score=score)
+    build_seconds = time.perf_counter() - started
+
+    report = {
+        "documents": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "prefixes": {},
+    }
+    common = vocabulary[:2000]
+    for length in (1, 2, 3, 4, 5, 6, 8):
+        samples = []
+        hits = 0
+        for _ in range(args.queries):
+            word = rng.choice(common)
+            started = time.perf_counter()
+            results = index.suggest(word[:length])
+            samples.append(time.perf_counter() - started)
+            hits += bool(results)
+        report["prefixes"][length] = {**percentiles(samples), "with_hits": hits}
+
+    samples = []
+    for _ in range(args.queries):
+        record = dict(rng.choice(records), title=" ".join(rng.sample(common, 3)))
+        started = time.perf_counter()
+        index.save(record)
+        samples.append(time.perf_counter() - started)
+    report["edit"] = percentiles(samples)
+
+    # A refresh re-scores records, the popular ones (in most top-K lists) included
+    popular = sorted(range(len(records)), key=lambda number: -scores[number])[:args.queries]
+    started = time.perf_counter()
+    for number in popular:
+        index.save(records[number], score=scores[number] + rng.randint(-1, 1))
+    rescore_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    asyncio.run(index.refill())
+    refill_seconds = time.perf_counter() - started
+    samples = []
+    for _ in range(args.queries):
+        word = rng.choice(common)
+        started = time.perf_counter()
+        index.suggest(word[:rng.randint(1, 3)])
+        samples.append(time.perf_counter() - started)
+    report["rescore"] = {
+        "records": len(popular),
+        "ms": round(rescore_seconds * 1000, 2),
+        "refill_ms": round(refill_seconds * 1000, 2),
+    }
+    report["after_rescore"] = percentiles(samples)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,223 @@
+"""
+Compare the flat and monthly bucketed watch-event layouts.
+
+Seeds the same synthetic events into both layouts in a scratch database
+and times the three access patterns the layout is meant to help with:
+resume lookups, time-range scans and retention drops. Every step goes
+through app.watch_events.layout on the app's storage API, with
+WATCH_EVENT_LAYOUT switched per layout, so the monthly numbers include
+the watch_event_latest pointer and the bucket lookback the app uses.
+
+Resume lookups are timed for pairs that have events ("watched") and for
+random pairs ("random"), which on a large user base mostly have none.
+
+Usage:
+    python benchmarks/watch_event_layouts.py --uri mongodb://localhost:27017 --events 10000000
+
+The scratch database is dropped at the end unless --keep is passed.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import motor.motor_asyncio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.storage.mongo import MongoStorage  # noqa: E402
+from app.watch_events import layout  # noqa: E402
+
+LAYOUTS = ("flat", "monthly")
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+@contextlib.contextmanager
+def using(name: str):
+    """Run layout code as if WATCH_EVENT_LAYOUT were name"""
+    previous = layout.settings.watch_event_layout
+    layout.settings.watch_event_layout = name
+    try:
+        yield
+    finally:
+        layout.settings.watch_event_layout = previous
+
+
+def make_events(count, users, videos, now, months):
+    span = timedelta(days=30 * months).total_seconds()
+    for _ in range(count):
+        created_at = now - timedelta(seconds=random.random() * span)
+        duration = random.choice([120.0, 300.0, 600.0, 1800.0])
+        end_time = random.random() * duration
+        yield {
+            "host_id": f"video-{random.randrange(videos)}",
+            "event_id": str(uuid.uuid1()),
+            "user_id": f"user-{random.randrange(users)}",
+            "path": "/videos/bench",
+            "start_time": max(0.0, end_time - 15),
+            "end_time": end_time,
+            "duration": duration,
+            "complete": False,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+async def seed(db, args, now, watched):
+    """Insert every event in both layouts; keeps a sample of seeded pairs in watched"""
+    timings = dict.fromkeys(LAYOUTS, 0.0)
+    batch = []
+    seen = 0
+
+    async def write(batch):
+        for name in LAYOUTS:
+            with using(name):
+                started = time.perf_counter()
+                await layout.insert_documents(db, [dict(doc) for doc in batch], ordered=False)
+                timings[name] += time.perf_counter() - started
+
+    written = 0
+    for event in make_events(args.events, args.users, args.videos, now, args.months):
+        # Reservoir sample of (host_id, user_id) pairs that have events
+        seen += 1
+        if len(watched) < args.queries:
+            watched.append((event["host_id"], event["user_id"]))
+        elif random.randrange(seen) < args.queries:
+            watched[random.randrange(args.queries)] = (event["host_id"], event["user_id"])
+        batch.append(event)
+        if len(batch) >= args.batch_size:
+            await write(batch)
+            written += len(batch)
+            batch = []
+            if written % (args.batch_size * 20) == 0:
+                print(f"seeded {written}/{args.events}", file=sys.stderr)
+    if batch:
+        await write(batch)
+    return {name: round(seconds, 2) for name, seconds in timings.items()}
+
+
+async def resume_lookup(db, host_id, user_id):
+    """The lookup WatchEvent.get_resume_time does, minus the write buffer"""
+    for collection in await layout.resume_collections(db, host_id, user_id):
+        found = await collection.find_one({"host_id": host_id, "user_id": user_id}, sort=[("created_at", -1)])
+        if found:
+            return found
+    return None
+
+
+async def bench_resume(db, args, watched):
+    pairs = {
+        "watched": watched,
+        "random": [
+            (f"video-{random.randrange(args.videos)}", f"user-{random.randrange(args.users)}")
+            for _ in range(args.queries)
+        ],
+    }
+    report = {}
+    for name in LAYOUTS:
+        with using(name):
+            report[name] = {}
+            for kind, sample in pairs.items():
+                samples, found = [], 0
+                for host_id, user_id in sample:
+                    started = time.perf_counter()
+                    found += await resume_lookup(db, host_id, user_id) is not None
+                    samples.append(time.perf_counter() - started)
+                report[name][kind] = {"found": found, **percentiles(samples)}
+    return report
+
+
+async def bench_range(db, now, days=30):
+    start = now - timedelta(days=days)
+    query = {"created_at": {"$gte": start}}
+    report = {"days": days}
+    for name in LAYOUTS:
+        with using(name):
+            started = time.perf_counter()
+            count = 0
+            for collection in await layout.collections_for_range(db, start=start):
+                count += await collection.count(query)
+            report[name] = {"count": count, "ms": round((time.perf_counter() - started) * 1000, 2)}
+    return report
+
+
+async def bench_retention(db, months):
+    with using("monthly"):
+        buckets = await layout.list_buckets(db, refresh=True)
+    oldest = buckets[-months:] if months else []
+    if not oldest:
+        return {}
+    # First day of the month after the newest dropped bucket
+    year, month = layout.bucket_month(oldest[0])
+    cutoff = datetime(year + month // 12, month % 12 + 1, 1)
+    report = {"cutoff": cutoff.isoformat()}
+    for name in LAYOUTS:
+        with using(name):
+            started = time.perf_counter()
+            result = await layout.drop_before(db, cutoff)
+            report[name] = {
+                "deleted": result["deleted"],
+                "dropped_collections": len(result["dropped_collections"]),
+                "ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+    return report
+
+
+async def run(db, args) -> dict:
+    now = datetime.utcnow()
+    random.seed(args.seed)
+    watched = []
+    return {
+        "events": args.events,
+        "months": args.months,
+        "seed_seconds": await seed(db, args, now, watched),
+        "resume_lookup": await bench_resume(db, args, watched),
+        "range_scan": await bench_range(db, now),
+        "retention": await bench_retention(db, args.retention_months),
+    }
+
+
+async def main(args):
+    client = motor.motor_asyncio.AsyncIOMotorClient(args.uri)
+    await client.drop_database(args.database)
+    try:
+        report = await run(MongoStorage(client[args.database]), args)
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="video_membership_bench_layouts")
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--videos", type=int, default=20_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--retention-months", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    asyncio.run(main(parser.parse_args()))
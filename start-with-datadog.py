@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Script to start the FastAPI application with Datadog monitoring.
+
+Pass --reload for a single auto-reloading development server.
 """
 import os
 import sys
@@ -58,12 +60,16 @@ def start_application():
     """Start the FastAPI application with Datadog tracing."""
     print("🚀 Starting FastAPI application with Datadog monitoring...")
     
+    if '--reload' in sys.argv:
+        # Development: one auto-reloading process
+        command = ['uvicorn', 'app.main:app', '--reload', '--host', '0.0.0.0', '--port', '8000']
+    else:
+        # gunicorn with one uvicorn worker per available CPU, see app/serve.py
+        command = [sys.executable, '-m', 'app.serve']
+    
     try:
         # Start with ddtrace-run
-        subprocess.run([
-            'ddtrace-run', 'uvicorn', 'app.main:app', 
-            '--reload', '--host', '0.0.0.0', '--port', '8000'
-        ], cwd=Path(__file__).parent)
+        subprocess.run(['ddtrace-run', *command], cwd=Path(__file__).parent)
     except KeyboardInterrupt:
         print("\n👋 Application stopped")
     except Exception as e:
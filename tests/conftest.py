@@ -0,0 +1,11 @@
+import os
+
+# Settings are read at import time; run against in-process backends only
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ALGOLIA_APP_ID", "")
+os.environ.setdefault("ALGOLIA_API_KEY", "")
+os.environ.setdefault("ALGOLIA_INDEX_NAME", "test")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("INVALIDATION_TRANSPORT", "local")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
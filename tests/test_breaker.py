@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.indexing import breaker as breaker_module
+from app.indexing.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.indexing.exceptions import CircuitOpenException
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(breaker_module, "time", clock)
+    return clock
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("backend down")
+
+
+def call(breaker, func, timeout=None):
+    return asyncio.run(breaker.call(func, timeout=timeout))
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            call(breaker, fail)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10)
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    assert call(breaker, succeed) == "ok"
+    # A success resets the count, so two more failures keep it closed
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(breaker, fail)
+    assert breaker.state == CLOSED
+
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    assert breaker.state == OPEN
+    assert breaker.stats["opened"] == 1
+
+
+def test_open_breaker_rejects_without_calling(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    trip(breaker)
+    calls = []
+
+    async def tracked():
+        calls.append(1)
+
+    with pytest.raises(CircuitOpenException):
+        call(breaker, tracked)
+    assert calls == []
+    assert breaker.stats["rejected"] == 1
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    trip(breaker)
+    clock.now += 9.9
+    assert breaker.state == OPEN
+    clock.now += 0.1
+    assert breaker.state == HALF_OPEN
+
+    assert call(breaker, succeed) == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["consecutive_failures"] == 0
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+    trip(breaker)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    assert breaker.state == OPEN
+    assert breaker.stats["opened"] == 2
+    # The reset timeout starts over from the failed probe
+    clock.now += 5
+    assert breaker.state == OPEN
+
+
+def test_half_open_limits_concurrent_probes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10, half_open_max_calls=1)
+    trip(breaker)
+    clock.now += 10
+
+    async def probes():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.create_task(breaker.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenException):
+            await breaker.call(succeed)
+        release.set()
+        return await probe
+
+    assert asyncio.run(probes()) == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_timeout_counts_as_failure(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            call(breaker, hang, timeout=0.01)
+    assert breaker.stats["timeouts"] == 2
+    assert breaker.state == OPEN
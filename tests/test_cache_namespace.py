@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.cache import base
+from app.cache.base import Namespace
+from app.cache.memory import MemoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.ns = 1
+
+    def monotonic(self):
+        return self.now
+
+    def time_ns(self):
+        self.ns += 1
+        return self.ns
+
+
+class BrokenCache(MemoryCache):
+    async def get(self, key):
+        raise ConnectionError("cache down")
+
+    async def set(self, key, value, ttl=None):
+        raise ConnectionError("cache down")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(base, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(monkeypatch, clock):
+    cache = MemoryCache()
+    monkeypatch.setattr(base, "_cache", cache)
+    return cache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_bump_hides_every_entry_of_the_namespace(cache):
+    space = Namespace("videos", ttl=60)
+    other = Namespace("users", ttl=60)
+    run(space.set("a", 1))
+    run(other.set("a", 2))
+
+    run(space.bump())
+    assert run(space.get("a")) is None
+    assert run(other.get("a")) == 2
+
+
+def test_another_workers_bump_is_seen_after_the_version_ttl(cache, clock, monkeypatch):
+    monkeypatch.setattr(base.settings, "cache_version_ttl", 5)
+    space = Namespace("videos", ttl=60)
+    elsewhere = Namespace("videos", ttl=60)  # the same namespace in another worker
+    run(space.set("a", 1))
+    assert run(elsewhere.get("a")) == 1
+
+    run(space.bump())
+    assert run(elsewhere.get("a")) == 1  # still on the version it read
+    clock.now += 5
+    assert run(elsewhere.get("a")) is None
+
+
+def test_an_evicted_version_never_brings_old_entries_back(cache):
+    space = Namespace("videos", ttl=60)
+    run(space.set("a", 1))
+    run(cache.delete(space.version_key))
+
+    space.forget_version()
+    assert run(space.get("a")) is None
+    run(space.set("a", 2))
+    assert run(space.get("a")) == 2
+
+
+def test_get_or_load_caches_values_but_not_none(cache):
+    space = Namespace("videos", ttl=60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"title": "x"}
+
+    async def missing():
+        loads.append(1)
+        return None
+
+    assert run(space.get_or_load("a", load)) == {"title": "x"}
+    assert run(space.get_or_load("a", load)) == {"title": "x"}
+    assert run(space.get_or_load("b", missing)) is None
+    assert run(space.get_or_load("b", missing)) is None
+    assert len(loads) == 3
+
+
+def test_concurrent_misses_share_one_load(cache):
+    space = Namespace("videos", ttl=60)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return [1, 2]
+
+    async def scenario():
+        return await asyncio.gather(*(space.get_or_load("a", load) for _ in range(5)))
+
+    assert run(scenario()) == [[1, 2]] * 5
+    assert len(loads) == 1
+
+
+def test_cache_failures_count_as_misses(monkeypatch, clock):
+    monkeypatch.setattr(base, "_cache", BrokenCache())
+    space = Namespace("videos", ttl=60)
+
+    async def load():
+        return 1
+
+    assert run(space.get("a")) is None
+    run(space.set("a", 1))
+    assert run(space.get_or_load("a", load)) == 1
+    assert space.stats["errors"] == 4
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.cache import base
+from app.cache.bus import EVERYTHING, InvalidationBus, Transport
+from app.cache.memory import LocalTransport, MemoryCache
+
+
+class FlakyTransport(Transport):
+    """Fails the first `failures` publishes, then records what was sent"""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.sent = []
+
+    async def publish(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("transport down")
+        self.sent += messages
+
+    async def receive(self):
+        await asyncio.Event().wait()
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(base, "_cache", MemoryCache())
+    monkeypatch.setattr(base, "_namespaces", {})
+    monkeypatch.setattr(LocalTransport, "_queues", set())
+
+
+def recorder(calls):
+    async def handler(keys, remote):
+        calls.append((keys, remote))
+    return handler
+
+
+def test_publish_evicts_here_at_once_and_reaches_other_workers():
+    space = base.namespace("videos", ttl=60)
+    here, there = InvalidationBus(retry_interval=0.01), InvalidationBus(retry_interval=0.01)
+    here_calls, there_calls = [], []
+    here.subscribe("videos", recorder(here_calls))
+    there.subscribe("videos", recorder(there_calls))
+
+    async def scenario():
+        here.start(LocalTransport())
+        there.start(LocalTransport())
+        await asyncio.sleep(0)
+        await space.set("a", 1)
+        await here.publish("videos", ["a"])
+        evicted = await space.get("a") is None
+        await asyncio.sleep(0.05)
+        await here.close()
+        await there.close()
+        return evicted
+
+    assert asyncio.run(scenario())
+    assert here_calls == [(["a"], False)]
+    assert there_calls == [(["a"], True)]
+    assert there.stats["received"] == 1
+
+
+def test_publish_does_not_wait_for_a_failing_transport():
+    bus = InvalidationBus(retry_interval=0.01)
+    transport = FlakyTransport(failures=2)
+
+    async def scenario():
+        bus.start(transport)
+        await bus.publish("videos", ["a"])
+        queued = len(bus._outbox)
+        await asyncio.sleep(0.1)
+        await bus.close()
+        return queued
+
+    assert asyncio.run(scenario()) == 1
+    assert [message["keys"] for message in transport.sent] == [["a"]]
+    assert bus.stats["publish_failed"] == 2
+    assert bus.stats["published"] == 1
+
+
+def test_outbox_overflow_collapses_to_whole_topics():
+    bus = InvalidationBus(outbox_size=3, retry_interval=60)
+    transport = FlakyTransport(failures=10)
+
+    async def scenario():
+        bus.start(transport)
+        for key in ("a", "b", "c"):
+            await bus.publish("videos", [key])
+        await bus.publish("users", ["u1"])
+        outbox = list(bus._outbox)
+        await bus.close()
+        return outbox
+
+    outbox = asyncio.run(scenario())
+    assert [(message["topic"], message["keys"]) for message in outbox] == [
+        ("videos", None), ("users", ["u1"]),
+    ]
+    assert bus.stats["lost"] == 1
+    # close() makes a last attempt, then drops what is left
+    assert transport.sent == []
+    assert bus._outbox == []
+
+
+def test_possible_loss_invalidates_every_namespace():
+    videos = base.namespace("videos", ttl=60)
+    users = base.namespace("users", ttl=60)
+    bus = InvalidationBus()
+    calls = []
+    bus.subscribe("search", recorder(calls))
+
+    async def scenario():
+        await videos.set("a", 1)
+        await users.set("b", 2)
+        await bus._dispatch({"topic": EVERYTHING, "keys": None, "origin": None}, remote=True)
+        return await videos.get("a"), await users.get("b")
+
+    assert asyncio.run(scenario()) == (None, None)
+    assert calls == [(None, True)]
+    assert bus.stats["lost"] == 1
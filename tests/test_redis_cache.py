@@ -0,0 +1,206 @@
+import asyncio
+import fnmatch
+
+import pytest
+
+from app.cache.base import decode
+from app.cache.bus import EVERYTHING
+from app.cache.redis import RedisCache, RedisStreamTransport, _stream_id
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """The part of redis.asyncio.Redis the cache and transport use, in dicts"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, px)
+        self.streams = {}  # name -> [(entry id, fields)]
+        self.max_deleted = {}  # name -> id of the newest trimmed entry
+        self.pipelines = 0
+        self.sequence = 0
+        self.fail_reads = 0
+
+    def pipeline(self, transaction=True):
+        self.pipelines += 1
+        return FakePipeline(self)
+
+    async def get(self, key):
+        entry = self.data.get(key)
+        return entry[0] if entry else None
+
+    async def mget(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = (value, px)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match="*", count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def xadd(self, name, fields, maxlen=None, approximate=False):
+        self.sequence += 1
+        entry_id = f"{self.sequence}-0".encode()
+        entries = self.streams.setdefault(name, [])
+        entries.append((entry_id, {key.encode(): value for key, value in fields.items()}))
+        while maxlen is not None and len(entries) > maxlen:
+            self.max_deleted[name] = entries.pop(0)[0]
+        return entry_id
+
+    async def xrevrange(self, name, count=None):
+        return list(reversed(self.streams.get(name, [])))[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise ConnectionError("connection lost")
+        found = []
+        for name, last_id in streams.items():
+            entries = [entry for entry in self.streams.get(name, []) if _stream_id(entry[0]) > _stream_id(last_id)]
+            if entries:
+                found.append((name.encode(), entries[:count]))
+        if not found:
+            await asyncio.sleep(0.001)
+        return found
+
+    async def xinfo_stream(self, name):
+        if name not in self.streams:
+            raise Exception("no such key")
+        entries = self.streams[name]
+        return {
+            b"length": len(entries),
+            b"max-deleted-entry-id": self.max_deleted.get(name, b"0-0"),
+            b"first-entry": entries[0] if entries else None,
+        }
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def cache():
+    cache = RedisCache("redis://localhost", prefix="app:")
+    cache._client = FakeRedis()
+    return cache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_set_many_stores_every_value_in_one_pipeline(cache):
+    run(cache.set_many({"a": {"n": 1}, "b": [1, 2]}, ttl=30))
+
+    assert cache._client.pipelines == 1
+    assert {key: decode(value) for key, (value, _) in cache._client.data.items()} == {"app:a": {"n": 1}, "app:b": [1, 2]}
+    assert {px for _, px in cache._client.data.values()} == {30000}
+    assert run(cache.get_many(["a", "b", "missing"])) == {"a": {"n": 1}, "b": [1, 2]}
+
+
+def test_add_only_stores_absent_keys(cache):
+    assert run(cache.add("a", 1))
+    assert not run(cache.add("a", 2))
+    assert run(cache.get("a")) == 1
+
+
+def test_clear_keeps_other_applications_keys(cache):
+    run(cache.set_many({"a": 1, "b": 2}))
+    cache._client.data["other:a"] = (b"", None)
+
+    run(cache.clear())
+    assert list(cache._client.data) == ["other:a"]
+
+
+def transport(server, max_length=100):
+    transport = RedisStreamTransport("redis://localhost", stream="app:invalidations", max_length=max_length, block=0.01)
+    transport._client = transport._publisher = server
+    return transport
+
+
+def message(key):
+    return {"topic": "videos", "keys": [key], "origin": "w1"}
+
+
+def test_stream_delivers_to_every_started_transport():
+    server = FakeRedis()
+    writer, reader = transport(server), transport(server)
+
+    async def scenario():
+        await writer.start()
+        await reader.start()
+        await writer.publish([message("a"), message("b")])
+        return await reader.receive(), await reader.receive()
+
+    assert run(scenario()) == ([message("a"), message("b")], [])
+    assert server.pipelines == 1
+
+
+def test_start_skips_what_was_published_before():
+    server = FakeRedis()
+    writer, reader = transport(server), transport(server)
+
+    async def scenario():
+        await writer.publish([message("old")])
+        await reader.start()
+        await writer.publish([message("new")])
+        return await reader.receive()
+
+    assert run(scenario()) == [message("new")]
+
+
+def test_entries_trimmed_while_disconnected_are_reported_as_loss():
+    server = FakeRedis()
+    writer, reader = transport(server, max_length=2), transport(server, max_length=2)
+
+    async def scenario():
+        await reader.start()
+        await writer.publish([message("a")])
+        assert await reader.receive() == [message("a")]
+        server.fail_reads = 1
+        with pytest.raises(ConnectionError):
+            await reader.receive()
+        await writer.publish([message("b"), message("c"), message("d")])
+        return await reader.receive()
+
+    lost, *rest = run(scenario())
+    assert lost["topic"] == EVERYTHING
+    assert rest == [message("c"), message("d")]
+
+
+def test_a_reconnect_without_trimming_loses_nothing():
+    server = FakeRedis()
+    writer, reader = transport(server), transport(server)
+
+    async def scenario():
+        await reader.start()
+        server.fail_reads = 1
+        with pytest.raises(ConnectionError):
+            await reader.receive()
+        await writer.publish([message("a")])
+        return await reader.receive()
+
+    assert run(scenario()) == [message("a")]
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.cache.base import get_cache
+from app.indexing import breaker as breaker_module
+from app.indexing import client
+from app.indexing.breaker import CLOSED, OPEN, CircuitBreaker
+from app.indexing.cache import QueryCache
+from app.indexing.local import LocalSearchIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeTask:
+    def __init__(self, error=None):
+        self.error = error
+
+    def wait(self):
+        if self.error is not None:
+            raise self.error
+
+
+class FakeIndex:
+    """Stand-in for an Algolia index: "up", "down" or "slow" """
+
+    def __init__(self):
+        self.mode = "up"
+        self.searches = 0
+
+    async def search_async(self, query):
+        self.searches += 1
+        if self.mode == "down":
+            raise ConnectionError("search backend down")
+        if self.mode == "slow":
+            await asyncio.sleep(1)
+        return {"hits": [{"objectID": f"remote:{query}"}], "nbHits": 1}
+
+    def save_objects(self, records):
+        return FakeTask(ConnectionError("indexing backend down") if self.mode == "down" else None)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    index = FakeIndex()
+    clock = FakeClock()
+    monkeypatch.setattr(breaker_module, "time", clock)
+    monkeypatch.setattr(client, "get_search_backend", lambda: "algolia")
+    monkeypatch.setattr(client, "get_index", lambda: index)
+    monkeypatch.setattr(client, "search_breaker", CircuitBreaker("search", failure_threshold=2, reset_timeout=10))
+    monkeypatch.setattr(client, "index_breaker", CircuitBreaker("index", failure_threshold=2, reset_timeout=10))
+    monkeypatch.setattr(client, "search_cache", QueryCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(client, "local_index", LocalSearchIndex())
+    monkeypatch.setattr(client.settings, "search_timeout", 0.05)
+    asyncio.run(get_cache().clear())
+    index.clock = clock
+    return index
+
+
+def search(query):
+    return asyncio.run(client.search_index(query))
+
+
+def hit_ids(results):
+    return [hit["objectID"] for hit in results["hits"]]
+
+
+def test_results_come_from_backend_and_are_cached(backend):
+    assert hit_ids(search("Cats")) == ["remote:cats"]
+    assert hit_ids(search("  cats ")) == ["remote:cats"]
+    assert backend.searches == 1
+
+
+def test_open_breaker_serves_local_index_without_calling_backend(backend):
+    client.local_index.save_objects([{"objectID": "v1", "objectType": "Video", "title": "Dogs at play"}])
+    client.local_index.ready = True
+    backend.mode = "down"
+
+    for query in ("dogs", "dogs play"):
+        assert hit_ids(search(query)) == ["v1"]
+    assert client.search_breaker.state == OPEN
+
+    searches = backend.searches
+    assert hit_ids(search("dogs at")) == ["v1"]
+    assert backend.searches == searches
+    assert client.search_breaker.stats["rejected"] == 1
+
+
+def test_timeouts_fall_back_and_trip_the_breaker(backend):
+    backend.mode = "slow"
+    for query in ("a", "b"):
+        assert search(query) == {"hits": [], "nbHits": 0}
+    assert client.search_breaker.stats["timeouts"] == 2
+    assert client.search_breaker.state == OPEN
+
+
+def test_expired_results_are_served_while_backend_is_down(backend, monkeypatch):
+    monkeypatch.setattr(client, "search_cache", QueryCache(maxsize=100, ttl=0))
+    assert hit_ids(search("birds")) == ["remote:birds"]
+    asyncio.run(get_cache().clear())
+
+    backend.mode = "down"
+    assert hit_ids(search("birds")) == ["remote:birds"]
+    assert backend.searches == 2
+
+
+def test_breaker_recovers_after_reset_timeout(backend):
+    backend.mode = "down"
+    for query in ("x", "y"):
+        search(query)
+    assert client.search_breaker.state == OPEN
+
+    backend.mode = "up"
+    backend.clock.now += 10
+    assert hit_ids(search("z")) == ["remote:z"]
+    assert client.search_breaker.state == CLOSED
+
+
+def test_failing_uploads_do_not_open_the_search_breaker(backend):
+    backend.mode = "down"
+    upload = client._save_records(backend)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            asyncio.run(upload([{"objectID": "v1"}]))
+    assert client.index_breaker.state == OPEN
+    assert client.search_breaker.state == CLOSED
+
+    backend.mode = "up"
+    assert hit_ids(search("fish")) == ["remote:fish"]
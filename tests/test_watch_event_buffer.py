@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db as db_module
+from app.storage.memory import MemoryStorage
+from app.watch_events import buffer as buffer_module
+from app.watch_events import models
+from app.watch_events.admission import PRIORITY_HIGH, PRIORITY_LOW, AdmissionController
+from app.watch_events.buffer import WriteBuffer
+from app.watch_events.exceptions import WatchEventRejectedException
+from app.watch_events.models import WatchEvent
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = MemoryStorage()
+    monkeypatch.setattr(db_module, "_storage", storage)
+    return storage
+
+
+def event(user_id="u1", host_id="h1", end_time=10.0, created_at=None):
+    return {
+        "user_id": user_id,
+        "host_id": host_id,
+        "end_time": end_time,
+        "created_at": created_at or datetime.utcnow(),
+    }
+
+
+def buffered(buffer, *documents):
+    """Add documents inside a running loop (add starts the flusher), then stop the flusher"""
+    async def add():
+        added = [buffer.add(document) for document in documents]
+        buffer._task.cancel()
+        buffer._task = None
+        return added
+
+    return asyncio.run(add())
+
+
+def test_buffer_keeps_latest_event_per_user_and_video():
+    buffer = WriteBuffer(max_size=10, flush_interval=60)
+    buffered(buffer, event(end_time=10), event(end_time=25), event(host_id="h2"))
+
+    assert len(buffer) == 2
+    assert buffer.peek("h1", "u1")["end_time"] == 25
+    assert buffer.stats["coalesced"] == 1
+
+
+def test_full_buffer_rejects_new_keys_but_still_coalesces():
+    buffer = WriteBuffer(max_size=1, flush_interval=60)
+    assert buffered(buffer, event(), event(host_id="h2"), event(end_time=30)) == [True, False, True]
+    assert buffer.peek("h1", "u1")["end_time"] == 30
+
+
+def test_flush_writes_pending_events(storage):
+    buffer = WriteBuffer(max_size=10, flush_interval=60)
+    buffered(buffer, event(), event(host_id="h2"))
+
+    assert asyncio.run(buffer.flush()) == 2
+    assert len(buffer) == 0
+    assert len(storage["watch_events"]) == 2
+
+
+def test_failed_flush_requeues_within_max_size(storage, monkeypatch):
+    buffer = WriteBuffer(max_size=2, flush_interval=60)
+
+    async def fail(db, documents, ordered=True):
+        # Events taken while the flush is in flight win over the failed batch
+        buffer._pending[("u1", "h1")] = event(host_id="h1", end_time=99)
+        buffer._pending[("u1", "h3")] = event(host_id="h3")
+        raise ConnectionError("storage down")
+
+    monkeypatch.setattr(buffer_module.layout, "insert_documents", fail)
+    buffered(buffer, event(host_id="h1"), event(host_id="h2"))
+
+    assert asyncio.run(buffer.flush()) == 0
+    assert sorted(host_id for _, host_id in buffer._pending) == ["h1", "h3"]
+    assert buffer.peek("h1", "u1")["end_time"] == 99
+    assert buffer.stats["dropped"] == 1  # h2: the buffer was full again
+    assert buffer.stats["flush_errors"] == 1
+
+
+def test_busy_write_path_degrades_heartbeats_and_sheds_on_full_queue():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05, retry_after=3)
+
+    async def scenario():
+        outcomes = []
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit(PRIORITY_HIGH):
+                await release.wait()
+
+        async def attempt(priority):
+            try:
+                async with controller.admit(priority):
+                    outcomes.append((priority, "admitted"))
+            except WatchEventRejectedException as e:
+                outcomes.append((priority, e.status_code, e.degradable))
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        await attempt(PRIORITY_LOW)
+        waiter = asyncio.create_task(attempt(PRIORITY_HIGH))
+        await asyncio.sleep(0)
+        await attempt(PRIORITY_HIGH)
+        await waiter
+        release.set()
+        await holder
+        await attempt(PRIORITY_LOW)
+        return outcomes
+
+    assert asyncio.run(scenario()) == [
+        (PRIORITY_LOW, 429, True),
+        (PRIORITY_HIGH, 503, False),  # queue full
+        (PRIORITY_HIGH, 503, False),  # timed out waiting
+        (PRIORITY_LOW, "admitted"),
+    ]
+    assert controller.stats["timed_out"] == 1
+    assert controller.stats["shed"] == 2
+    assert controller.get_stats()["in_flight"] == 0
+
+
+def test_resume_uses_the_newer_of_buffered_and_stored_events(storage, monkeypatch):
+    buffer = WriteBuffer(max_size=10, flush_interval=60)
+    monkeypatch.setattr(models, "write_buffer", buffer)
+
+    async def scenario():
+        positions = []
+        await WatchEvent.create_watch_event("h1", "u1", "/videos/h1", 0, 10, 100, buffered=True)
+        positions.append(await WatchEvent.get_resume_time("h1", "u1"))
+        # Admitted directly while the older heartbeat is still buffered
+        await WatchEvent.create_watch_event("h1", "u1", "/videos/h1", 10, 40, 100)
+        positions.append(await WatchEvent.get_resume_time("h1", "u1"))
+        await WatchEvent.create_watch_event("h1", "u1", "/videos/h1", 40, 55, 100, buffered=True)
+        positions.append(await WatchEvent.get_resume_time("h1", "u1"))
+        await buffer.close()
+        positions.append(await WatchEvent.get_resume_time("h1", "u1"))
+        return positions
+
+    assert asyncio.run(scenario()) == [10, 40, 55, 55]
+
+
+def test_stored_event_wins_over_older_buffered_one(storage, monkeypatch):
+    buffer = WriteBuffer(max_size=10, flush_interval=60)
+    monkeypatch.setattr(models, "write_buffer", buffer)
+    now = datetime.utcnow()
+    buffered(buffer, {
+        **WatchEvent(host_id="h1", user_id="u1", path="/", start_time=0, end_time=5, duration=100).to_mongo(),
+        "created_at": now - timedelta(seconds=30),
+    })
+    asyncio.run(storage["watch_events"].insert({
+        "host_id": "h1", "user_id": "u1", "path": "/", "start_time": 5, "end_time": 20,
+        "duration": 100, "complete": False, "created_at": now, "updated_at": now,
+    }))
+
+    assert asyncio.run(WatchEvent.get_resume_time("h1", "u1")) == 20
@@ -0,0 +1,118 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+
+import pytest
+
+from app.storage.memory import MemoryStorage
+from app.watch_events import layout
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(layout.settings, "watch_event_layout", "monthly")
+    monkeypatch.setattr(layout, "_indexed", set())
+    monkeypatch.setattr(layout, "_bucket_cache", {"names": None, "expires": 0.0})
+    monkeypatch.setattr(layout, "_latest", OrderedDict())
+    return MemoryStorage()
+
+
+def event(created_at, user_id="u1", host_id="h1"):
+    return {"user_id": user_id, "host_id": host_id, "end_time": 10.0, "created_at": created_at}
+
+
+def insert(db, *documents):
+    return asyncio.run(layout.insert_documents(db, list(documents)))
+
+
+def names(collections):
+    return [collection.name for collection in collections]
+
+
+def test_events_are_routed_to_their_month_and_the_latest_pointer_follows(db):
+    insert(db, event(datetime(2024, 1, 15)), event(datetime(2024, 3, 2)), event(datetime(2024, 2, 1)))
+
+    assert len(db["watch_events_202401"]) == 1
+    assert len(db["watch_events_202402"]) == 1
+    assert len(db["watch_events_202403"]) == 1
+    latest = asyncio.run(db[layout.LATEST_COLLECTION].find_many({}))
+    assert [pointer["bucket"] for pointer in latest] == ["watch_events_202403"]
+
+
+def test_latest_pointer_never_moves_back(db):
+    insert(db, event(datetime(2024, 3, 2)))
+    layout._latest.clear()  # as in another worker
+    insert(db, event(datetime(2024, 1, 15)))
+
+    pointer = asyncio.run(db[layout.LATEST_COLLECTION].find_one({"user_id": "u1", "host_id": "h1"}))
+    assert pointer["bucket"] == "watch_events_202403"
+
+
+def test_resume_starts_at_the_latest_bucket(db):
+    insert(db, event(datetime(2024, 1, 15)), event(datetime(2024, 2, 1), host_id="h2"))
+
+    assert names(asyncio.run(layout.resume_collections(db, "h1", "u1"))) == ["watch_events_202401"]
+    assert names(asyncio.run(layout.resume_collections(db, "h2", "u1"))) == [
+        "watch_events_202402", "watch_events_202401",
+    ]
+
+
+def test_resume_for_an_unwatched_video_searches_nothing(db):
+    insert(db, event(datetime(2024, 1, 15)))
+
+    assert asyncio.run(layout.resume_collections(db, "h1", "u2")) == []
+
+
+def test_resume_lookback_caps_the_buckets_searched(db, monkeypatch):
+    monkeypatch.setattr(layout.settings, "watch_event_bucket_lookback", 2)
+    insert(db, *(event(datetime(2023, month, 1)) for month in range(1, 7)))
+
+    assert names(asyncio.run(layout.resume_collections(db, "h1", "u1"))) == [
+        "watch_events_202306", "watch_events_202305",
+    ]
+
+
+def test_a_new_month_is_listed_without_waiting_for_the_cache(db):
+    insert(db, event(datetime(2024, 1, 15)))
+    assert asyncio.run(layout.list_buckets(db)) == ["watch_events_202401"]
+
+    insert(db, event(datetime(2024, 2, 1), host_id="h2"))
+    assert asyncio.run(layout.list_buckets(db)) == ["watch_events_202402", "watch_events_202401"]
+
+
+def test_range_only_touches_overlapping_buckets(db):
+    insert(db, *(event(datetime(2024, month, 10)) for month in (1, 2, 3, 4)))
+    current = layout.bucket_name(datetime.utcnow())
+
+    in_range = names(asyncio.run(layout.collections_for_range(db, datetime(2024, 2, 20), datetime(2024, 3, 5))))
+    assert in_range == ["watch_events_202403", "watch_events_202402"]
+    # The current month's bucket may have been opened by another worker
+    assert names(asyncio.run(layout.collections_for_range(db)))[0] == current
+
+
+def test_drop_before_drops_whole_months_and_their_pointers(db):
+    insert(
+        db,
+        event(datetime(2024, 1, 15), host_id="h1"),
+        event(datetime(2024, 2, 1), host_id="h2"),
+        event(datetime(2024, 2, 20), host_id="h2"),
+        event(datetime(2024, 3, 2), host_id="h3"),
+    )
+
+    result = asyncio.run(layout.drop_before(db, datetime(2024, 2, 10)))
+
+    assert result == {"dropped_collections": ["watch_events_202401"], "deleted": 1}
+    assert asyncio.run(layout.list_buckets(db)) == ["watch_events_202403", "watch_events_202402"]
+    assert len(db["watch_events_202402"]) == 1
+    assert asyncio.run(layout.resume_collections(db, "h1", "u1")) == []
+
+
+def test_flat_layout_uses_one_collection(db, monkeypatch):
+    monkeypatch.setattr(layout.settings, "watch_event_layout", "flat")
+    insert(db, event(datetime(2024, 1, 15)), event(datetime(2024, 3, 2), host_id="h2"))
+
+    assert asyncio.run(db.list_collection_names()) == ["watch_events"]
+    assert names(asyncio.run(layout.resume_collections(db, "h9", "u1"))) == ["watch_events"]
+
+    result = asyncio.run(layout.drop_before(db, datetime(2024, 2, 1)))
+    assert result == {"dropped_collections": [], "deleted": 1}